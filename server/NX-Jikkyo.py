@@ -232,6 +232,10 @@ def main(
         ## マイグレーション処理はメインサーバープロセスのみが実行するため、サブサーバープロセスでは少しだけ待ってからスタートアップに進む
         time.sleep(5)
 
+    # permessage-deflate 圧縮の設定を調整した WebSocket プロトコル実装をインポートする
+    ## 圧縮の統計情報をロガーで出力するため、ロガーの初期化後にインポートする必要がある
+    from app.utils.websocket_protocol import NXJikkyoWebSocketProtocol
+
     # Uvicorn の設定
     server_config = uvicorn.Config(
         # 起動するアプリケーション
@@ -250,6 +254,10 @@ def main(
         interface = 'asgi3',
         # HTTP プロトコルの実装として httptools を選択
         http = 'httptools',
+        # WebSocket プロトコルの実装として、permessage-deflate 圧縮の設定を調整した websockets ベースの実装を選択
+        ws = NXJikkyoWebSocketProtocol,
+        # WebSocket の permessage-deflate 圧縮を有効にするか
+        ws_per_message_deflate = CONFIG.WEBSOCKET_PER_MESSAGE_DEFLATE,
         # イベントループの実装として uvloop を選択
         loop = 'uvloop',
         # ストリーミング配信中にサーバーシャットダウンを要求された際、強制的に接続を切断するまでの秒数
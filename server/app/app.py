@@ -1,9 +1,6 @@
 
 import asyncio
-import json
 import mimetypes
-import random
-import time
 import uuid
 from collections.abc import Awaitable, Callable
 from datetime import datetime, timedelta
@@ -18,12 +15,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from ndgr_client import NDGRClient
-from pydantic import TypeAdapter
 from rich.rule import Rule
 from rich.style import Style
 from starlette.middleware.base import BaseHTTPMiddleware
 from tortoise import timezone
-from tortoise.backends.base.client import TransactionalDBClient
 
 from app import logging
 from app.config import CONFIG
@@ -32,32 +27,36 @@ from app.constants import (
     DATABASE_CONFIG,
     LOGS_DIR,
     MASTER_CHANNEL_INFOS,
-    REDIS_CHANNEL_THREAD_COMMENTS_PREFIX,
     REDIS_CLIENT,
-    REDIS_KEY_CHANNEL_INFOS_CACHE,
-    REDIS_KEY_JIKKYO_FORCE_COUNT,
     REDIS_KEY_VIEWER_COUNT,
     VERSION,
 )
 from app.models.comment import (
     Channel,
-    ChannelResponse,
     Comment,
     CommentCounter,
     Thread,
 )
 from app.routers import (
     channels,
+    internal,
     niconico,
     threads,
     websocket,
 )
-from app.routers.websocket import ConvertToXMLCompatibleCommentResponse
-from app.utils.comment_counter_cache import UpdateThreadCommentCounterCache
-from app.utils.transaction import (
-    IsDatabaseConnectionUnavailableError,
-    RunTransactionWithReconnectRetry,
+from app.utils.comment_counter_cache import (
+    GetThreadCommentCounterCache,
+    RestoreThreadCommentCounterCache,
+    UpdateThreadCommentCounterCache,
+    WriteBackThreadCommentCounters,
 )
+from app.utils.comment_write_behind import (
+    GetCommentWriteBehindDeadLetterThreadIds,
+    RunCommentWriteBehindFlusher,
+)
+from app.utils.thread_archive import GetArchivedThreadIds
+from app.utils.thread_cache import GetActiveThread, PublishThreadCacheInvalidation
+from app.utils.transaction import IsDatabaseConnectionUnavailableError
 
 
 # FastAPI を初期化
@@ -78,6 +77,7 @@ app.include_router(channels.router)
 app.include_router(threads.router)
 app.include_router(websocket.router)
 app.include_router(niconico.router)
+app.include_router(internal.router)
 
 # CORS の設定
 ## 開発環境では全てのオリジンからのリクエストを許可
@@ -255,9 +255,6 @@ if CONFIG.SPECIFIED_SERVER_PORT == CONFIG.SERVER_PORT:
         # W杯が終了したらここから 992 を削除する必要がある（削除しなくてもいいが無限にリトライが発生してあんまりよくない）
         NICOLIVE_JIKKYO_CHANNELS = [1, 2, 4, 5, 6, 7, 8, 9, 101, 211, 992]
 
-        # 現在アクティブなスレッドの情報を保存する辞書
-        active_threads: dict[int, Thread] = {}
-
         # バックグラウンドタスクの参照を保持する
         background_tasks: list[asyncio.Task[None]] = []
 
@@ -286,107 +283,39 @@ if CONFIG.SPECIFIED_SERVER_PORT == CONFIG.SERVER_PORT:
                             await ndgr_client.print(str(ndgr_comment))
                             await ndgr_client.print(Rule(characters='-', style=Style(color='#E33157')))
 
-                            # 現在のサーバー時刻 (UNIX タイムスタンプ)
-                            current_time = time.time()
-
-                            # 現在のサーバー時刻 (datetime)
-                            current_time_datetime = timezone.now()
-
-                            # 現在アクティブなスレッドの情報が保存されていないか、放送が終了している場合は、
-                            # 現在アクティブなスレッドの情報を取得し、active_threads に保存する
-                            if channel_id_int not in active_threads or active_threads[channel_id_int].end_at < current_time_datetime:
-                                thread = await Thread.filter(
-                                    channel_id = channel_id_int,
-                                    start_at__lte = current_time_datetime,
-                                    end_at__gte = current_time_datetime,
-                                ).first()
-                                if not thread:
-                                    # 今日のスレッドが作成中などの理由でまだスレッドが取得できる状態にないことが原因と思われる
-                                    ## このコメントは飛ばし、スレッドが取得できるようになったコメントから保存する
-                                    logging.error(f'StreamNicoliveComments [{channel_id}]: Active thread not found.')
-                                    continue
-                                active_threads[channel_id_int] = thread
-                                logging.info(f'StreamNicoliveComments [{channel_id}]: Active thread has been updated.')
-
                             # 現在アクティブなスレッドの情報を取得
-                            active_thread = active_threads[channel_id_int]
+                            ## WebSocket API と同じスレッド情報のキャッシュから取得するため、通常は DB に問い合わせない
+                            active_thread = await GetActiveThread(channel_id_int)
+                            if not active_thread:
+                                # 今日のスレッドが作成中などの理由でまだスレッドが取得できる状態にないことが原因と思われる
+                                ## このコメントは飛ばし、スレッドが取得できるようになったコメントから保存する
+                                logging.error(f'StreamNicoliveComments [{channel_id}]: Active thread not found.')
+                                continue
 
                             try:
 
                                 # 受信したコメントデータを XML 互換コメント形式に変換
                                 xml_compatible_comment = NDGRClient.convertToXMLCompatibleComment(ndgr_comment)
 
-                                async def CreateCommentInTransaction(connection: TransactionalDBClient) -> Comment:
-
-                                    # 採番テーブルに記録されたコメ番をインクリメント
-                                    await connection.execute_query(
-                                        'UPDATE comment_counters SET max_no = max_no + 1 WHERE thread_id = %s',
-                                        [active_thread.id]
-                                    )
-                                    # インクリメント後のコメ番を取得
-                                    ## 採番テーブルを使うことでコメ番の重複を防いでいる
-                                    new_no_result = await connection.execute_query_dict(
-                                        'SELECT max_no FROM comment_counters WHERE thread_id = %s',
-                                        [active_thread.id]
-                                    )
-                                    new_no = new_no_result[0]['max_no']
-
-                                    # vpos はスレッドの放送開始時刻から起算した秒 1/100 秒 (10ミリ秒) 単位のタイムスタンプ
-                                    ## NX-Jikkyo 側でのスレッド放送開始時刻と、NDGR メッセージサーバーから受信したコメント投稿時刻の差分から算出する
-                                    vpos = int((ndgr_comment.at.timestamp() - active_thread.start_at.timestamp()) * 100)
-
-                                    # 新しいコメントを作成
-                                    ## NDGR メッセージサーバーのコメ番はベストエフォートで一意性が保証されない上齟齬も出るため、当面 NX-Jikkyo 側に合わせている
-                                    ## vpos はニコニコ実況で運用されているがスレッド開始時刻が両者で異なるため、NX-Jikkyo 側で別途算出した値を入れる
-                                    ## 本家ニコニコ実況のリセット時刻が今の所わからないのもある
-                                    return await Comment.create(
-                                        thread_id = active_thread.id,  # NX-Jikkyo 側のスレッド ID を入れる
-                                        no = new_no,  # NX-Jikkyo 側で算出した値を入れる
-                                        vpos = vpos,  # NX-Jikkyo 側で算出した値を入れる
-                                        date = ndgr_comment.at,  # NX-Jikkyo 側では自動生成せず、NDGR メッセージサーバーから受信したコメント投稿時刻を入れる
-                                        mail = xml_compatible_comment.mail,
-                                        user_id = f'nicolive:{xml_compatible_comment.user_id}',
-                                        premium = True if xml_compatible_comment.premium == 1 else False,
-                                        anonymity = True if xml_compatible_comment.anonymity == 1 else False,
-                                        content = xml_compatible_comment.content,
-                                    )
-
-                                # コメントを DB に登録
-                                ## DB 接続断時にトランザクション開始の自動リトライと壊れた TransactionWrapper の修復を行う
-                                comment = await RunTransactionWithReconnectRetry(
-                                    operation = CreateCommentInTransaction,
-                                    operation_name = f'StreamNicoliveComments [{channel_id}]',
-                                )
-
-                                # スレッドごとの最新コメ番 Redis キャッシュを更新する
-                                ## Redis EVAL はマイクロ秒レベルなので毎コメント実行しても問題ない
-                                ## キャッシュ更新失敗はコメント取り込みに影響させず握りつぶす
-                                try:
-                                    await UpdateThreadCommentCounterCache(active_thread.id, comment.no)
-                                except Exception as ex:
-                                    logging.warning(
-                                        f'StreamNicoliveComments [{channel_id}]: Failed to update thread comment counter cache.',
-                                        exc_info = ex,
-                                    )
-
-                                # ニコ生 XML 互換コメント形式に変換した上で、Redis Pub/Sub でコメントを送信
-                                ## この段階ではまだ yourpost フラグを設定してはならない
-                                ## yourpost フラグはコメントセッション WebSocket 側で設定しないと、意図しないコメントに yourpost フラグが付与されてしまう
-                                await REDIS_CLIENT.publish(
-                                    channel = f'{REDIS_CHANNEL_THREAD_COMMENTS_PREFIX}:{active_thread.id}',
-                                    message = json.dumps(ConvertToXMLCompatibleCommentResponse(comment), ensure_ascii=False),
+                                # vpos はスレッドの放送開始時刻から起算した秒 1/100 秒 (10ミリ秒) 単位のタイムスタンプ
+                                ## NX-Jikkyo 側でのスレッド放送開始時刻と、NDGR メッセージサーバーから受信したコメント投稿時刻の差分から算出する
+                                vpos = int((ndgr_comment.at.timestamp() - active_thread.start_at.timestamp()) * 100)
+
+                                # コメントを DB に登録し、Redis Pub/Sub で配信する
+                                ## コメ番の採番・DB への保存・Redis Pub/Sub への配信・実況勢いの記録はすべてスレッドごとの書き込みキューに任せる
+                                ## NX-Jikkyo 上で投稿されたコメントと同じ経路を通すことで、採番方式にかかわらずコメ番が重複しないようにしている
+                                ## NDGR メッセージサーバーのコメ番はベストエフォートで一意性が保証されない上齟齬も出るため、当面 NX-Jikkyo 側に合わせている
+                                ## vpos はニコニコ実況で運用されているがスレッド開始時刻が両者で異なるため、NX-Jikkyo 側で別途算出した値を入れる
+                                await websocket.GetThreadCommentWriter(active_thread.id, channel_id).postComment(
+                                    vpos = vpos,  # NX-Jikkyo 側で算出した値を入れる
+                                    mail = xml_compatible_comment.mail,
+                                    user_id = f'nicolive:{xml_compatible_comment.user_id}',
+                                    anonymity = True if xml_compatible_comment.anonymity == 1 else False,
+                                    content = xml_compatible_comment.content,
+                                    premium = True if xml_compatible_comment.premium == 1 else False,
+                                    date = ndgr_comment.at,  # NX-Jikkyo 側では自動生成せず、NDGR メッセージサーバーから受信したコメント投稿時刻を入れる
                                 )
 
-                                # 実況勢いカウント用の Redis ソート済みセット型にエントリを追加
-                                ## スコア (UNIX タイムスタンプ) が現在時刻から 60 秒以内の範囲のエントリの数が実況勢いとなる
-                                await REDIS_CLIENT.zadd(f'{REDIS_KEY_JIKKYO_FORCE_COUNT}:{channel_id}', {f'comment:{comment.id}': current_time})
-
-                                # 1/10 の確率で現在時刻から 60 秒以上前のエントリを削除
-                                ## 毎回削除する必要はないが (古いエントリが残ったままでもカウントする上では影響しない) 、
-                                ## メモリ上に古いエントリが残りすぎないように、定期的に削除する
-                                if random.random() < 0.1:
-                                    await REDIS_CLIENT.zremrangebyscore(f'{REDIS_KEY_JIKKYO_FORCE_COUNT}:{channel_id}', 0, current_time - 60)
-
                                 # ニコニコ実況からのコメントのインポート完了
                                 logging.info(f'StreamNicoliveComments [{channel_id}]: User {xml_compatible_comment.user_id} posted a comment.')
 
@@ -424,12 +353,8 @@ if CONFIG.SPECIFIED_SERVER_PORT == CONFIG.SERVER_PORT:
     # 10秒に1回、現在のチャンネル情報を DB から取得し、Redis にキャッシュとして格納する
     async def CacheChannelResponses():
 
-        # 最新のチャンネル情報を取得
-        channel_responses = await channels.GetChannelResponses()
-
-        # キャッシュを更新
-        ## このキャッシュは次回の実行で上書きされるまで永続する
-        await REDIS_CLIENT.set(REDIS_KEY_CHANNEL_INFOS_CACHE, TypeAdapter(list[ChannelResponse]).dump_json(channel_responses).decode('utf-8'))
+        # 最新のチャンネル情報を取得し、キャッシュとリビジョンを更新
+        await channels.UpdateChannelResponsesCache()
         logging.info('Channel responses cache has been updated.')
 
         # startup イベントハンドラが完了するまでメインスレッドを待機させる
@@ -467,7 +392,24 @@ if CONFIG.SPECIFIED_SERVER_PORT == CONFIG.SERVER_PORT:
                 )
                 comment_counter_map[thread.id] = synchronized_comment_count
 
-            # Redis 側のキャッシュも同じ値に揃える
+            # Redis 採番モードでは Redis 側のカウンタが正なので、キャッシュを DB の値で上書き (巻き戻し) してはならない
+            ## 書き戻し前の最新値が Redis 側にしか存在しない可能性があるため、キャッシュが欠損しているスレッドは
+            ## DB (採番テーブルと comments テーブルの大きい方) から復元する
+            ## キャッシュ → 採番テーブル方向の反映は WriteBackCommentCounters が GREATEST() で行う
+            if CONFIG.COMMENT_NO_ALLOCATOR == 'Redis':
+                try:
+                    if await GetThreadCommentCounterCache(thread.id) is None:
+                        await RestoreThreadCommentCounterCache(thread.id)
+                except Exception as ex:
+                    logging.warning(
+                        f'SyncCommentCounters: Failed to restore thread comment counter cache. thread_id: {thread.id}',
+                        exc_info = ex,
+                    )
+
+            # Redis 側のキャッシュを採番テーブルの値以上に揃える
+            ## 単調増加でしか更新しないため、Redis 採番モードでも Redis 側のカウンタを巻き戻すことはない
+            ## Redis の再起動で AOF の末尾が失われた場合や、MySQL 採番モードから切り替えた直後など、
+            ## キャッシュが存在していても採番テーブルより小さい場合があり、そのまま採番すると重複したコメ番を払い出してしまう
             ## ランタイムでキャッシュ更新に失敗しても、この同期処理で最終的に回復できる
             try:
                 await UpdateThreadCommentCounterCache(thread.id, synchronized_comment_count)
@@ -487,10 +429,33 @@ if CONFIG.SPECIFIED_SERVER_PORT == CONFIG.SERVER_PORT:
         await asyncio.sleep(0.1)
 
 
+    # Redis 採番モードのみ、5秒に1回 Redis 上で採番したコメ番を採番テーブルへ書き戻す
+    async def WriteBackCommentCounters():
+
+        try:
+            written_back_count = await WriteBackThreadCommentCounters()
+        except Exception as ex:
+            # 書き戻せなかったスレッドは次回の実行で再度書き戻される
+            logging.error('WriteBackCommentCounters: Failed to write back comment counters:', exc_info = ex)
+            return
+        if written_back_count > 0:
+            logging.debug(f'WriteBackCommentCounters: {written_back_count} comment counters have been written back.')
+
+
     # 1時間に1回、明日分の全実況チャンネルのスレッド予定が DB に登録されているかを確認し、もしなければ登録する
     # スレッドは同じ実況チャンネル内では絶対に放送時間が被ってはならないし、基本放送時間は 04:00 〜 翌朝 04:00 の 24 時間
     async def RegisterThreads():
 
+        # 新しく登録したスレッドの最新コメ番キャッシュを事前に作成しておく
+        ## スレッドの切り替え直後に、全ての視聴セッションの統計情報の送信やコメント投稿が
+        ## キャッシュの欠落による DB へのフォールバックに一斉に流れ込まないようにする
+        async def PrewarmCommentCounterCache(thread_id: int) -> None:
+            try:
+                await UpdateThreadCommentCounterCache(thread_id, 0)
+            except Exception as ex:
+                # Redis の瞬断でスレッドの登録を止めない (キャッシュがなくても DB から復元される)
+                logging.warning(f'RegisterThreads: Failed to prewarm thread comment counter cache. thread_id: {thread_id}', exc_info = ex)
+
         # 今日と明日用のスレッドが登録されているかを確認し、もしなければ登録する
         channels = await Channel.all()
         for channel in channels:
@@ -519,6 +484,7 @@ if CONFIG.SPECIFIED_SERVER_PORT == CONFIG.SERVER_PORT:
                     description = 'NX-Jikkyo は、放送中のテレビ番組や起きているイベントに対して、みんなでコメントをし盛り上がりを共有する、リアルタイムコミュニケーションサービスです。'
                 )
                 await CommentCounter.create(thread_id=thread.id, max_no=0)
+                await PrewarmCommentCounterCache(thread.id)
                 logging.info(f'Thread for {channel.name} on {today.strftime("%Y-%m-%d")} has been registered.')
 
             # 明日の日付を取得
@@ -540,6 +506,7 @@ if CONFIG.SPECIFIED_SERVER_PORT == CONFIG.SERVER_PORT:
                     description = 'NX-Jikkyo は、放送中のテレビ番組や起きているイベントに対して、みんなでコメントをし盛り上がりを共有する、リアルタイムコミュニケーションサービスです。'
                 )
                 await CommentCounter.create(thread_id=thread.id, max_no=0)
+                await PrewarmCommentCounterCache(thread.id)
                 logging.info(f'Thread for {channel.name} on {tomorrow.strftime("%Y-%m-%d")} has been registered.')
 
             # もし現在時刻が 04:00 以前であれば、今日のスレッドを作成
@@ -560,19 +527,72 @@ if CONFIG.SPECIFIED_SERVER_PORT == CONFIG.SERVER_PORT:
                         description = 'NX-Jikkyo は、放送中のテレビ番組や起きているイベントに対して、みんなでコメントをし盛り上がりを共有する、リアルタイムコミュニケーションサービスです。'
                     )
                     await CommentCounter.create(thread_id=thread.id, max_no=0)
+                    await PrewarmCommentCounterCache(thread.id)
                     logging.info(f'Thread for {channel.name} from {now.strftime("%Y-%m-%d %H:%M:%S")} to {start_time_today.strftime("%Y-%m-%d %H:%M:%S")} has been registered.')
 
         logging.info('Thread registration has been completed.')
 
+        # 全サーバープロセスのスレッド情報のキャッシュに、登録したスレッドを読み込み直させる
+        ## 登録したスレッドがなくても、Pub/Sub の再接続中に通知を取りこぼしたサーバープロセスのために毎回通知する
+        try:
+            await PublishThreadCacheInvalidation()
+        except Exception as ex:
+            logging.warning('RegisterThreads: Failed to publish thread cache invalidation:', exc_info = ex)
+
         # startup イベントハンドラが完了するまでメインスレッドを待機させる
         ## ここで待機しないと、なぜかタイミング次第ではタスクの完了前にタスクが破棄されてしまうことがある
         ## 必ず発生するわけではないが、一度起きると次の日のスレッドがずっと作成されない致命的な問題になる
         ## おそらくイベントループ関連の稀な症状を引いてしまっているみたいだが、とりあえずこれで直る
         await asyncio.sleep(0.1)
 
+    # 1時間に1回、終了したスレッドのうちまだアーカイブされていないものを、圧縮済みのスレッドアーカイブとして書き出す
+    ## アーカイブが作成されたスレッドは、スレッド取得 API で DB を参照せずにファイルから直接配信される
+    async def ArchiveEndedThreads():
+
+        # 終了直後のスレッドや、write-behind モードで DB への保存が追いついていないスレッドは、
+        # コメントが欠けたアーカイブを作成しないよう、アーカイブしてよい終了日時の上限より前に終了したスレッドのみをアーカイブする
+        archivable_before = await threads.GetThreadArchivableBefore()
+
+        # DB に保存できずに退避したコメントを含むスレッドは、コメントが書き戻されるまでアーカイブしない
+        dead_letter_thread_ids = await GetCommentWriteBehindDeadLetterThreadIds()
+
+        # 一度に大量のスレッドをアーカイブすると DB 負荷が高まるため、終了日時が新しい順に 1 回あたりの件数を制限する
+        ## 新しいスレッドほど閲覧される頻度が高いため、先にアーカイブする
+        ## 制限を超えた分は次回以降の実行で順次アーカイブされる
+        ## 全ての終了済みスレッドを毎回走査しないよう、直近 threads.THREAD_ARCHIVE_WINDOW の間に終了したスレッドのみを対象にする
+        ## それより前に終了したスレッドは、アーカイブがなくてもスレッド取得 API で DB から取得したコメントが返される
+        max_archive_count = 30
+        archived_thread_ids = await GetArchivedThreadIds()
+        unarchived_threads = [
+            thread for thread in await Thread.filter(
+                end_at__lte = archivable_before,
+                end_at__gte = timezone.now() - threads.THREAD_ARCHIVE_WINDOW,
+            ).order_by('-end_at')
+            if thread.id not in archived_thread_ids and thread.id not in dead_letter_thread_ids
+        ][:max_archive_count]
+
+        archived_count = 0
+        for thread in unarchived_threads:
+            try:
+                await threads.ArchiveThread(thread)
+                archived_count += 1
+            except Exception as ex:
+                # アーカイブできなかったスレッドは次回の実行で再度アーカイブされる
+                logging.error(f'ArchiveEndedThreads: Failed to archive thread {thread.id}:', exc_info = ex)
+        if archived_count > 0:
+            logging.info(f'ArchiveEndedThreads: {archived_count} threads have been archived.')
+        if len(dead_letter_thread_ids) > 0:
+            logging.warning(
+                f'ArchiveEndedThreads: Threads {sorted(dead_letter_thread_ids)} are not archived '
+                'because they have comments in the write-behind dead letter stream.'
+            )
+
     # APScheduler を初期化
     scheduler = AsyncIOScheduler()
 
+    # write-behind モードの書き込みタスクの参照を保持する
+    comment_write_behind_flusher_tasks: list[asyncio.Task[None]] = []
+
     # サーバー起動時に APScheduler のジョブを登録
     @app.on_event('startup')
     async def StartScheduler():
@@ -581,6 +601,12 @@ if CONFIG.SPECIFIED_SERVER_PORT == CONFIG.SERVER_PORT:
         # 初回起動時に実行する処理群
         await RegisterMasterChannels()
         await ResetViewerCount()
+
+        # write-behind モードでは、Redis Stream に溜まったコメントを DB に保存する書き込みタスクを開始する
+        ## 前回のプロセスで DB への保存が確定しなかったコメントも、起動直後にこのタスクが再処理する
+        if CONFIG.COMMENT_WRITE_BEHIND is True:
+            comment_write_behind_flusher_tasks.append(asyncio.create_task(RunCommentWriteBehindFlusher()))
+
         await StartStreamNicoliveComments()
 
         # 各定期実行ジョブを登録
@@ -605,6 +631,21 @@ if CONFIG.SPECIFIED_SERVER_PORT == CONFIG.SERVER_PORT:
             id = 'register_threads',
             replace_existing = True,
         )
+        scheduler.add_job(
+            ArchiveEndedThreads,
+            'interval',
+            hours = 1,  # 1時間ごとに実行
+            id = 'archive_ended_threads',
+            replace_existing = True,
+        )
+        if CONFIG.COMMENT_NO_ALLOCATOR == 'Redis':
+            scheduler.add_job(
+                WriteBackCommentCounters,
+                'interval',
+                seconds = 5,  # 5秒ごとに実行
+                id = 'write_back_comment_counters',
+                replace_existing = True,
+            )
 
         # ジョブを起動時に一度実行
         await CacheChannelResponses()
@@ -620,3 +661,12 @@ if CONFIG.SPECIFIED_SERVER_PORT == CONFIG.SERVER_PORT:
     async def StopScheduler():
         """ APScheduler を停止する """
         scheduler.shutdown()
+
+        # write-behind モードの書き込みタスクを停止する
+        ## 書き込み途中で停止しても、DB への保存が確定していないコメントは次回起動時に再処理される
+        for comment_write_behind_flusher_task in comment_write_behind_flusher_tasks:
+            comment_write_behind_flusher_task.cancel()
+
+        # Redis 採番モードでは、まだ書き戻していないコメ番を採番テーブルへ書き戻してから終了する
+        if CONFIG.COMMENT_NO_ALLOCATOR == 'Redis':
+            await WriteBackCommentCounters()
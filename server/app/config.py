@@ -2,6 +2,7 @@
 from pathlib import Path
 from typing import Literal
 
+from pydantic import model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -24,6 +25,29 @@ class Config(BaseSettings):
     SPECIFIED_SERVER_PORT: int = 5610  # 実際は .env 内の環境変数としては存在せず、便宜上の値
     SUB_SERVER_PROCESS_COUNT: int = 0
 
+    # コメント投稿
+    ## コメ番の採番方式 (MySQL: 採番テーブルをトランザクション内で更新する / Redis: Redis 上のカウンタで採番し、採番テーブルへは非同期で書き戻す)
+    COMMENT_NO_ALLOCATOR: Literal['MySQL', 'Redis'] = 'MySQL'
+    ## DB への保存を待たずにコメントを配信し、Redis Stream 経由で後から DB にまとめて保存するかどうか (COMMENT_NO_ALLOCATOR=Redis が必須)
+    COMMENT_WRITE_BEHIND: bool = False
+    ## コメントセッションでコメントを送信する前に、後続のコメントを待ってまとめて送信する時間 (ミリ秒 / 0 で無効)
+    COMMENT_SEND_COALESCE_WINDOW_MS: int = 0
+    ## コメント遅延を計測するためにサンプリングするコメントの割合 (0.0 〜 1.0 / 0 で無効)
+    ## 有効にすると、サンプリングしたコメントは計測用の接頭辞を付けて Redis Pub/Sub で配信される
+    COMMENT_TRACE_SAMPLE_RATE: float = 0.0
+
+    # WebSocket
+    ## WebSocket の permessage-deflate 圧縮を有効にするかどうか
+    WEBSOCKET_PER_MESSAGE_DEFLATE: bool = True
+    ## permessage-deflate 圧縮でサーバーが使う LZ77 スライド窓のサイズ (ビット数 / 9 〜 15 / zlib の raw deflate は 8 を受け付けない)
+    WEBSOCKET_DEFLATE_WINDOW_BITS: int = 12
+    ## permessage-deflate 圧縮でサーバーが使う zlib の memLevel (1 〜 9)
+    WEBSOCKET_DEFLATE_MEM_LEVEL: int = 5
+    ## permessage-deflate 圧縮の圧縮レベル (1 〜 9)
+    WEBSOCKET_DEFLATE_COMPRESSION_LEVEL: int = 6
+    ## permessage-deflate 圧縮で、直前までのメッセージを辞書として次のメッセージの圧縮に使う (コンテキスト引き継ぎ) かどうか
+    WEBSOCKET_DEFLATE_CONTEXT_TAKEOVER: bool = True
+
     # データベース接続
     MYSQL_USER: str
     MYSQL_PASSWORD: str
@@ -33,6 +57,30 @@ class Config(BaseSettings):
     NICONICO_OAUTH_CLIENT_ID: str
     NICONICO_OAUTH_CLIENT_SECRET: str
 
+    @model_validator(mode='after')
+    def validateCommentWriteBehind(self) -> 'Config':
+        # write-behind モードでは DB への保存前にコメ番を確定させる必要があるため、採番テーブルでは採番できない
+        if self.COMMENT_WRITE_BEHIND is True and self.COMMENT_NO_ALLOCATOR != 'Redis':
+            raise ValueError('COMMENT_WRITE_BEHIND requires COMMENT_NO_ALLOCATOR=Redis.')
+        return self
+
+    @model_validator(mode='after')
+    def validateCommentTraceSampleRate(self) -> 'Config':
+        if not (0.0 <= self.COMMENT_TRACE_SAMPLE_RATE <= 1.0):
+            raise ValueError('COMMENT_TRACE_SAMPLE_RATE must be between 0.0 and 1.0.')
+        return self
+
+    @model_validator(mode='after')
+    def validateWebSocketDeflate(self) -> 'Config':
+        # 範囲外の値は接続のたびに permessage-deflate のネゴシエーションで例外になるため、起動時に検出する
+        if not (9 <= self.WEBSOCKET_DEFLATE_WINDOW_BITS <= 15):
+            raise ValueError('WEBSOCKET_DEFLATE_WINDOW_BITS must be between 9 and 15.')
+        if not (1 <= self.WEBSOCKET_DEFLATE_MEM_LEVEL <= 9):
+            raise ValueError('WEBSOCKET_DEFLATE_MEM_LEVEL must be between 1 and 9.')
+        if not (1 <= self.WEBSOCKET_DEFLATE_COMPRESSION_LEVEL <= 9):
+            raise ValueError('WEBSOCKET_DEFLATE_COMPRESSION_LEVEL must be between 1 and 9.')
+        return self
+
 
 # ref: https://github.com/pydantic/pydantic/blob/main/docs/visual_studio_code.md#basesettings-and-ignoring-pylancepyright-errors
 CONFIG = Config.model_validate({})
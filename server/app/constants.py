@@ -5,9 +5,9 @@ from typing import Any
 from zoneinfo import ZoneInfo
 
 import httpx
-from redis.asyncio.client import Redis
 
 from app.config import CONFIG
+from app.utils.redis_metrics import InstrumentedRedis
 
 
 # バージョン
@@ -25,6 +25,8 @@ CLIENT_DIR = BASE_DIR.parent / 'client/dist'
 
 # データディレクトリ
 DATA_DIR = BASE_DIR / 'data'
+## 終了したスレッドの情報と全コメントを圧縮済みの JSON として保存するサブディレクトリ
+THREAD_ARCHIVES_DIR = DATA_DIR / 'thread_archives'
 
 # ログディレクトリ
 LOGS_DIR = BASE_DIR / 'logs'
@@ -179,17 +181,40 @@ HTTPX_CLIENT = lambda: httpx.AsyncClient(
 )
 
 # Redis クライアント
-REDIS_CLIENT = Redis.from_url('redis://nx-jikkyo-redis', encoding='utf-8', decode_responses=True)
+## コマンドの応答時間を /api/v1/metrics で確認できるよう、応答時間を記録する Redis クライアントを使う
+REDIS_CLIENT = InstrumentedRedis.from_url('redis://nx-jikkyo-redis', encoding='utf-8', decode_responses=True)
+# 事前圧縮したレスポンスなどのバイナリを読み書きするための、値をデコードしない Redis クライアント
+REDIS_CLIENT_BINARY = InstrumentedRedis.from_url('redis://nx-jikkyo-redis')
 # Redis 上でスレッドに投稿されたコメントを Pub/Sub するチャンネルの Prefix
 REDIS_CHANNEL_THREAD_COMMENTS_PREFIX = 'nx-jikkyo:thread_comments'
+# Redis 上でスレッド情報キャッシュの再読み込みを全サーバープロセスに通知するチャンネル
+REDIS_CHANNEL_THREAD_CACHE_INVALIDATION = 'nx-jikkyo:thread_cache_invalidation'
+# Redis 上でチャンネル情報キャッシュの更新を全サーバープロセスに通知するチャンネル
+REDIS_CHANNEL_CHANNEL_INFOS_UPDATED = 'nx-jikkyo:channel_infos_updated'
+# Redis 上でスレッドアーカイブの無効化を全サーバープロセスに通知するチャンネル
+REDIS_CHANNEL_THREAD_ARCHIVE_INVALIDATION = 'nx-jikkyo:thread_archive_invalidation'
 # Redis 上のチャンネル情報キャッシュのキー
 REDIS_KEY_CHANNEL_INFOS_CACHE = 'nx-jikkyo:channel_infos_cache'
+# Redis 上のチャンネル情報キャッシュのリビジョン・ETag・スレッドごとの統計情報のキー
+REDIS_KEY_CHANNEL_INFOS_META = 'nx-jikkyo:channel_infos_meta'
+# Redis 上の過去のリビジョンのチャンネル情報キャッシュのリビジョン・ETag・スレッドごとの統計情報を保持する Hash のキー
+REDIS_KEY_CHANNEL_INFOS_HISTORY = 'nx-jikkyo:channel_infos_history'
+# Redis 上のチャンネル情報 JSON・XML を事前圧縮したものを保持する Hash のキー
+REDIS_KEY_CHANNEL_INFOS_ENCODED_CACHE = 'nx-jikkyo:channel_infos_encoded_cache'
 # Redis 上の実況勢いカウントのキー
 REDIS_KEY_JIKKYO_FORCE_COUNT = 'nx-jikkyo:jikkyo_force_counts'
 # Redis 上の同時接続数カウントのキー
 REDIS_KEY_VIEWER_COUNT = 'nx-jikkyo:viewer_counts'
 # Redis 上のスレッドごとの最新コメ番キャッシュのキー
 REDIS_KEY_THREAD_COMMENT_COUNTER = 'nx-jikkyo:thread_comment_counters'
+# Redis 上で採番したが、まだ MySQL の採番テーブルへ書き戻していないスレッド ID の集合のキー
+REDIS_KEY_THREAD_COMMENT_COUNTER_DIRTY_THREADS = 'nx-jikkyo:thread_comment_counters_dirty'
+# Redis 上で write-behind モードの DB 書き込み待ちのコメントを保持する Stream のキー
+REDIS_KEY_COMMENT_WRITE_BEHIND_STREAM = 'nx-jikkyo:comment_write_behind'
+# Redis 上で write-behind モードの DB 書き込みタスクが保存できなかったコメントを退避する Stream のキー
+REDIS_KEY_COMMENT_WRITE_BEHIND_DEAD_LETTER_STREAM = 'nx-jikkyo:comment_write_behind_dead_letter'
+# write-behind モードの DB 書き込みタスクが使う Consumer Group の名前
+REDIS_COMMENT_WRITE_BEHIND_CONSUMER_GROUP = 'nx-jikkyo:comment_write_behind_flusher'
 
 # マスタデータとして扱う実況チャンネル情報
 ## app.py の RegisterMasterChannels() で channels テーブルへ反映するソースオブジェクト
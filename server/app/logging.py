@@ -10,6 +10,7 @@ from typing import Any, cast
 
 from app.config import CONFIG
 from app.constants import LOGGING_CONFIG
+from app.utils.metrics import METRICS, MetricFamily, MetricSample
 
 
 class NonBlockingQueueHandler(QueueHandler):
@@ -38,6 +39,10 @@ class NonBlockingQueueHandler(QueueHandler):
         self._dropped_info_debug_count = 0
         # 高優先度ログ (WARNING / ERROR) のドロップ件数を保持する
         self._dropped_warning_error_count = 0
+        # プロセス起動からのドロップ件数の累計を保持する
+        ## 上記の件数は集約警告を出すたびにリセットされるため、メトリクスとして出力する累計は別に保持する
+        self.dropped_info_debug_total = 0
+        self.dropped_warning_error_total = 0
         # 直近でドロップ集計を通知した時刻を保持する
         self._last_drop_report_time = time.monotonic()
         # 複数スレッドからの件数更新を安全にするためのロック
@@ -76,8 +81,10 @@ class NonBlockingQueueHandler(QueueHandler):
         with self._drop_count_lock:
             if record.levelno >= logging.WARNING:
                 self._dropped_warning_error_count += 1
+                self.dropped_warning_error_total += 1
             else:
                 self._dropped_info_debug_count += 1
+                self.dropped_info_debug_total += 1
         # 一定間隔で集約警告を出す
         self._emit_drop_summary_if_needed()
 
@@ -197,6 +204,29 @@ atexit.register(ShutdownAsyncLogging, active_queue_listener)
 logger = logging.getLogger('uvicorn')
 
 
+def CollectLoggingMetrics() -> list[MetricFamily]:
+    """
+    非同期ログのキューが飽和してドロップしたログの件数をメトリクスとして取得する
+
+    Returns:
+        list[MetricFamily]: ログレベルごとのドロップ件数の累計のメトリクス
+    """
+
+    family = MetricFamily(
+        name = 'nx_jikkyo_log_records_dropped_total',
+        type = 'counter',
+        help = 'Number of log records dropped by NonBlockingQueueHandler because the logging queue was full.',
+    )
+    for handler in logger.handlers:
+        if isinstance(handler, NonBlockingQueueHandler):
+            family.samples.append(MetricSample(name=family.name, labels={'level': 'info_debug'}, value=handler.dropped_info_debug_total))
+            family.samples.append(MetricSample(name=family.name, labels={'level': 'warning_error'}, value=handler.dropped_warning_error_total))
+    return [family]
+
+
+METRICS.addCollector(CollectLoggingMetrics)
+
+
 def debug(message: Any, *args: Any, exc_info: BaseException | bool | None = None) -> None:
     """
     デバッグログを出力する (スクリプトパス・行番号を出力しない)
@@ -140,6 +140,25 @@ class ThreadResponse(BaseModel):
     viewers: int | None
     comments: int
 
+class ChannelThreadCountersResponse(BaseModel):
+    """
+    チャンネル情報の差分で返す、スレッドの統計情報のレスポンスの Pydantic モデル
+    """
+    id: int
+    jikkyo_force: int | None
+    viewers: int | None
+    comments: int
+
+class ChannelsPatchResponse(BaseModel):
+    """
+    指定されたリビジョンからのチャンネル情報の差分のレスポンスの Pydantic モデル
+    reset が True の場合は差分を返せないため、channels に最新のチャンネル情報リストがそのまま格納される
+    """
+    revision: int
+    reset: bool
+    threads: list[ChannelThreadCountersResponse]
+    channels: list[ChannelResponse] | None = None
+
 class ThreadWithoutStatisticsResponse(BaseModel):
     """
     実況勢い・コメント数などを含まない軽量なスレッド情報のレスポンスの Pydantic モデル
@@ -181,6 +200,15 @@ class CommentResponse(BaseModel):
     anonymity: bool
     content: str
 
+class ThreadCommentsResponse(BaseModel):
+    """
+    スレッド内のコメントを分割して取得した結果のレスポンスの Pydantic モデル
+    next_from_id が null でなければ、その値を from_id に指定して次のコメントを取得できる
+    """
+    thread_id: int
+    comments: list[CommentResponse]
+    next_from_id: int | None
+
 
 class XMLCompatibleCommentResponse(TypedDict):
     """
@@ -1,13 +1,14 @@
 
 import asyncio
 import base64
-import gzip
+import hashlib
+import json
 import time
 import xml.etree.ElementTree as ET
+from dataclasses import dataclass
 from typing import Annotated, Literal, cast
 from zoneinfo import ZoneInfo
 
-from async_lru import alru_cache
 from fastapi import (
     APIRouter,
     HTTPException,
@@ -23,17 +24,31 @@ from tortoise import connections, timezone
 
 from app import logging, schemas
 from app.constants import (
+    JST,
+    REDIS_CHANNEL_CHANNEL_INFOS_UPDATED,
     REDIS_CLIENT,
+    REDIS_CLIENT_BINARY,
     REDIS_KEY_CHANNEL_INFOS_CACHE,
+    REDIS_KEY_CHANNEL_INFOS_ENCODED_CACHE,
+    REDIS_KEY_CHANNEL_INFOS_HISTORY,
+    REDIS_KEY_CHANNEL_INFOS_META,
     REDIS_KEY_JIKKYO_FORCE_COUNT,
     REDIS_KEY_VIEWER_COUNT,
 )
 from app.models.comment import (
     ChannelResponse,
+    ChannelsPatchResponse,
+    ChannelThreadCountersResponse,
     ThreadResponse,
     ThreadWithoutStatisticsResponse,
 )
+from app.utils.content_negotiation import (
+    CompressContent,
+    IsETagMatched,
+    SelectContentEncoding,
+)
 from app.utils.Jikkyo import Jikkyo
+from app.utils.pubsub_hub import REDIS_PUBSUB_HUB
 from app.utils.TVer import GetNowAndNextProgramInfos
 
 
@@ -43,53 +58,108 @@ router = APIRouter(
     prefix = '/api/v1',
 )
 
-CHANNEL_RESPONSES_JSON_GZIP_CACHE_LOCK = asyncio.Lock()
-CHANNEL_RESPONSES_JSON_GZIP_SOURCE: str | None = None
-CHANNEL_RESPONSES_JSON_GZIP_BYTES: bytes | None = None
+# チャンネル情報リストの TypeAdapter
+## 使うたびに TypeAdapter を生成するとスキーマの構築が毎回走るため、1 つだけ生成して使い回す
+CHANNEL_RESPONSES_ADAPTER = TypeAdapter(list[ChannelResponse])
+
+# 差分取得 (?since=) に応じるために Redis に保持しておく過去のリビジョンの数
+## チャンネル情報キャッシュは 10 秒ごとに更新されるため、直近 10 分間のリビジョンからの差分を返せる
+CHANNEL_INFOS_HISTORY_SIZE = 60
 
+# チャンネル情報キャッシュのリビジョンを返す HTTP レスポンスヘッダーの名前
+CHANNEL_INFOS_REVISION_HEADER = 'X-Channels-Revision'
 
-async def GetGzipCompressedChannelResponsesJSON(channel_responses_json: str) -> bytes:
+
+@dataclass(frozen=True, slots=True)
+class ChannelInfosMeta:
     """
-    チャンネル情報 JSON を gzip 圧縮して返す
+    あるリビジョンのチャンネル情報キャッシュに付随する情報
 
-    Args:
-        channel_responses_json (str): Redis から取得したチャンネル情報 JSON
+    Attributes:
+        revision (int): チャンネル情報キャッシュの内容が変わるたびに 1 ずつ増えるリビジョン
+        etag (str): チャンネル情報 JSON の ETag (引用符を含まない)
+        structure_hash (str): 統計情報 (実況勢い・同時接続数・コメント数) 以外の内容のハッシュ値
+        counters (dict[int, tuple[int | None, int | None, int]]): スレッド ID と (実況勢い, 同時接続数, コメント数) の対応表
+    """
 
-    Returns:
-        bytes: gzip 圧縮済みのチャンネル情報 JSON
-    """
-
-    global CHANNEL_RESPONSES_JSON_GZIP_SOURCE
-    global CHANNEL_RESPONSES_JSON_GZIP_BYTES
-
-    # 10秒キャッシュ由来の同じ JSON は圧縮結果も同じなので、各ワーカー内で再利用する
-    ## KonomiTV のポーリング数が多い時間帯に、リクエストごとに gzip 圧縮を走らせないための局所キャッシュ
-    if (
-        CHANNEL_RESPONSES_JSON_GZIP_SOURCE == channel_responses_json
-        and CHANNEL_RESPONSES_JSON_GZIP_BYTES is not None
-    ):
-        return CHANNEL_RESPONSES_JSON_GZIP_BYTES
-
-    async with CHANNEL_RESPONSES_JSON_GZIP_CACHE_LOCK:
-        # ロック待ち中に別リクエストが圧縮済みキャッシュを更新していれば、それをそのまま返す
-        if (
-            CHANNEL_RESPONSES_JSON_GZIP_SOURCE == channel_responses_json
-            and CHANNEL_RESPONSES_JSON_GZIP_BYTES is not None
-        ):
-            return CHANNEL_RESPONSES_JSON_GZIP_BYTES
-
-        # 圧縮率より CPU 削減を優先し、最高速寄りの level 1 で圧縮する
-        ## 元データは10秒ごとに変化し、ピーク時は同じ内容を大量配信するため、軽い圧縮でも帯域削減効果が大きい
-        channel_responses_json_gzip = gzip.compress(
-            channel_responses_json.encode('utf-8'),
-            compresslevel = 1,
-            mtime = 0,
+    revision: int
+    etag: str
+    structure_hash: str
+    counters: dict[int, tuple[int | None, int | None, int]]
+
+    def toJSON(self) -> str:
+        """
+        Redis に保存するための JSON 文字列に変換する
+
+        Returns:
+            str: JSON 文字列
+        """
+
+        return json.dumps({
+            'revision': self.revision,
+            'etag': self.etag,
+            'structure_hash': self.structure_hash,
+            'counters': {str(thread_id): list(counters) for thread_id, counters in self.counters.items()},
+        }, separators=(',', ':'))
+
+    @staticmethod
+    def fromJSON(raw_json: str) -> 'ChannelInfosMeta':
+        """
+        Redis に保存された JSON 文字列から復元する
+
+        Args:
+            raw_json (str): JSON 文字列
+
+        Returns:
+            ChannelInfosMeta: 復元した情報
+        """
+
+        data = json.loads(raw_json)
+        return ChannelInfosMeta(
+            revision = int(data['revision']),
+            etag = str(data['etag']),
+            structure_hash = str(data['structure_hash']),
+            counters = {int(thread_id): (counters[0], counters[1], counters[2]) for thread_id, counters in data['counters'].items()},
         )
-        CHANNEL_RESPONSES_JSON_GZIP_SOURCE = channel_responses_json
-        CHANNEL_RESPONSES_JSON_GZIP_BYTES = channel_responses_json_gzip
-        return channel_responses_json_gzip
 
 
+@dataclass(frozen=True, slots=True)
+class ChannelResponsesSnapshot:
+    """
+    Redis から同時に取得した、チャンネル情報 JSON とそのリビジョン・事前圧縮済みのレスポンスなどの組
+    サーバープロセス内で丸ごと差し替えて使うため、生成後に内容を変更してはならない
+
+    Attributes:
+        json (str): チャンネル情報 JSON
+        channel_responses (list[ChannelResponse]): チャンネル情報 JSON を検証・変換したチャンネル情報リスト
+        meta (ChannelInfosMeta | None): チャンネル情報 JSON に対応するリビジョンなどの情報 (スケジューラーが作成したキャッシュでない場合は None)
+        json_encodings (dict[str, bytes]): 圧縮形式とチャンネル情報 JSON のレスポンス本文の対応表 ('identity' は無圧縮)
+        xml_encodings (dict[str, bytes]): 圧縮形式と namami・旧ニコニコ実況互換用のチャンネル情報 XML のレスポンス本文の対応表 ('identity' は無圧縮)
+    """
+
+    json: str
+    channel_responses: list[ChannelResponse]
+    meta: ChannelInfosMeta | None
+    json_encodings: dict[str, bytes]
+    xml_encodings: dict[str, bytes]
+
+
+# メインサーバープロセスで、最後に Redis に保存したチャンネル情報 JSON とそのリビジョン
+__last_channel_responses_json: bytes | None = None
+__last_channel_infos_revision: int | None = None
+# メインサーバープロセスで、最後に Redis に保存した事前圧縮済みのチャンネル情報 JSON・XML (Redis 上の Hash のフィールドと値の対応表)
+__last_channel_responses_encodings: dict[str, bytes] = {}
+
+# チャンネル情報キャッシュの更新通知を取りこぼした場合に備え、スナップショットを Redis から読み込み直すまでの最大の時間 (秒)
+CHANNEL_RESPONSES_SNAPSHOT_MAX_AGE_SECONDS = 30.0
+# フェイルセーフで DB から直接作成したスナップショットを読み込み直すまでの時間 (秒)
+## スケジューラーが動作していない間は更新通知が届かないため、従来の一時キャッシュと同じ間隔で読み込み直す
+CHANNEL_RESPONSES_SNAPSHOT_FAILSAFE_MAX_AGE_SECONDS = 10.0
+
+# リビジョンと、そのリビジョンのチャンネル情報キャッシュに付随する情報の対応表
+## 過去のリビジョンの情報は変更されないため、一度 Redis から取得したものはサーバープロセス内で使い回す
+__channel_infos_meta_history: dict[int, ChannelInfosMeta] = {}
+
 async def GetChannelResponses(full: bool = False) -> list[ChannelResponse]:
     """
     データベースから最新のチャンネル情報リストを取得する
@@ -124,35 +194,33 @@ async def GetChannelResponses(full: bool = False) -> list[ChannelResponse]:
     if not full:
         query += ' AND t.start_at >= DATE_SUB(NOW(), INTERVAL 4 DAY)'
     query += ' ORDER BY c.id ASC, t.start_at ASC'
-    channels = await connections.get('default').execute_query_dict(query)
+    rows = await connections.get('default').execute_query_dict(query)
 
     # 現在放送中・次の放送予定の番組情報を取得
     program_infos = await GetNowAndNextProgramInfos()
 
-    channel_responses: list[ChannelResponse] = []
-    current_channel_id: int | None = None
-    current_channel_name: str | None = None
-    threads: list[ThreadResponse] = []
-    for row in channels:
-        if current_channel_id != row['id']:
-            if current_channel_id is not None:
-                channel_responses.append(ChannelResponse(
-                    id = f'jk{current_channel_id}',
-                    name = cast(str, current_channel_name),
-                    program_present = program_infos.get(f'jk{current_channel_id}', (None, None))[0],
-                    program_following = program_infos.get(f'jk{current_channel_id}', (None, None))[1],
-                    threads = threads,
-                ))
-            current_channel_id = cast(int, row['id'])
-            current_channel_name = cast(str, row['name'])
-            threads = []
+    # 取得した行を 1 回走査するだけで、チャンネルごとのスレッド情報と放送中のスレッドを持つチャンネルをまとめて求める
+    ## 実況勢い・同時接続数はこの時点では取得せず、放送中のスレッドのみ後から 1 回のパイプラインでまとめて埋める
+    ## 行の値はすべて DB から取得した確定済みの値なので、Pydantic の検証は省略して model_construct() で組み立てる
+    now = timezone.now()
+    channel_names: dict[int, str] = {}
+    threads_by_channel_id: dict[int, list[ThreadResponse]] = {}
+    active_threads_by_channel_id: dict[int, ThreadResponse] = {}
+    for row in rows:
+        channel_id = cast(int, row['id'])
+        if channel_id not in channel_names:
+            channel_names[channel_id] = cast(str, row['name'])
+            threads_by_channel_id[channel_id] = []
+
+        # スレッドが 1 つもないチャンネルは、スレッド情報が NULL の行になる
+        if row['thread_id'] is None:
+            continue
 
         # タイムゾーン情報を付加した datetime に変換する
-        start_at = row['start_at'].replace(tzinfo=ZoneInfo('Asia/Tokyo'))
-        end_at = row['end_at'].replace(tzinfo=ZoneInfo('Asia/Tokyo'))
+        start_at = row['start_at'].replace(tzinfo=JST)
+        end_at = row['end_at'].replace(tzinfo=JST)
 
         # スレッドの現在のステータスを算出する
-        now = timezone.now()
         status: Literal['ACTIVE', 'UPCOMING', 'PAST']
         if start_at <= now <= end_at:
             status = 'ACTIVE'
@@ -161,119 +229,517 @@ async def GetChannelResponses(full: bool = False) -> list[ChannelResponse]:
         else:
             status = 'PAST'
 
-        # ステータスが ACTIVE (放送中) のスレッドのみ、当該チャンネルに対応する実況勢いカウントを取得
-        ## スコア (UNIX タイムスタンプ) が現在時刻から 60 秒以内の範囲のエントリの数が実況勢いとなる
-        if status == 'ACTIVE':
-            current_time = time.time()
-            jikkyo_force_count = await REDIS_CLIENT.zcount(f'{REDIS_KEY_JIKKYO_FORCE_COUNT}:jk{current_channel_id}', current_time - 60, current_time)
-        else:
-            jikkyo_force_count = None
-
-        # ステータスが ACTIVE (放送中) のスレッドのみ、当該チャンネルに対応する同時接続数カウントを取得
-        if status == 'ACTIVE':
-            viewer_count = int(await REDIS_CLIENT.hget(REDIS_KEY_VIEWER_COUNT, f'jk{current_channel_id}') or 0)
-        else:
-            viewer_count = None
-
-        description = cast(str, row['thread_description'])
-
-        # スレッド情報を追加
-        threads.append(ThreadResponse(
+        thread = ThreadResponse.model_construct(
             id = cast(int, row['thread_id']),
             start_at = start_at,
             end_at = end_at,
             duration = cast(int, row['duration']),
             title = cast(str, row['title']),
-            description = description,
+            description = cast(str, row['thread_description']),
             status = status,
-            jikkyo_force = jikkyo_force_count,
-            viewers = viewer_count,
+            jikkyo_force = None,
+            viewers = None,
             comments = cast(int, row['comments_count']),
-        ))
+        )
+        threads_by_channel_id[channel_id].append(thread)
+        if status == 'ACTIVE':
+            active_threads_by_channel_id[channel_id] = thread
+
+    # 放送中のスレッドの実況勢いカウント・同時接続数カウントを、全チャンネル分 1 回のパイプラインでまとめて取得する
+    ## 実況勢いは、スコア (UNIX タイムスタンプ) が現在時刻から 60 秒以内の範囲のエントリの数
+    if len(active_threads_by_channel_id) > 0:
+        active_channel_ids = list(active_threads_by_channel_id.keys())
+        current_time = time.time()
+        async with REDIS_CLIENT.pipeline(transaction=False) as pipeline:
+            for channel_id in active_channel_ids:
+                pipeline.zcount(f'{REDIS_KEY_JIKKYO_FORCE_COUNT}:jk{channel_id}', current_time - 60, current_time)
+            pipeline.hmget(REDIS_KEY_VIEWER_COUNT, [f'jk{channel_id}' for channel_id in active_channel_ids])
+            results = await pipeline.execute()
+        viewer_counts = results[-1]
+        for index, channel_id in enumerate(active_channel_ids):
+            thread = active_threads_by_channel_id[channel_id]
+            thread.jikkyo_force = int(results[index])
+            thread.viewers = int(viewer_counts[index] or 0)
+
+    # jk263 (BSJapanext) は jk200 (BS10) のエイリアスとして、jk263 自身の過去スレッドに jk200 のスレッドを加えたものを返す
+    ## 番組情報も jk200 のものを使う
+    if 200 in threads_by_channel_id:
+        threads_by_channel_id[263] = sorted(
+            threads_by_channel_id.get(263, []) + threads_by_channel_id[200],
+            key = lambda thread: thread.start_at,
+        )
+        channel_names[263] = 'BSJapanext'
 
-    if current_channel_id is not None:
-        channel_responses.append(ChannelResponse(
-            id = f'jk{current_channel_id}',
-            name = cast(str, current_channel_name),
-            program_present = program_infos.get(f'jk{current_channel_id}', (None, None))[0],
-            program_following = program_infos.get(f'jk{current_channel_id}', (None, None))[1],
-            threads = threads,
+    channel_responses: list[ChannelResponse] = []
+    for channel_id in sorted(threads_by_channel_id.keys()):
+        program_info_channel_id = 'jk200' if channel_id == 263 else f'jk{channel_id}'
+        program_present, program_following = program_infos.get(program_info_channel_id, (None, None))
+        channel_responses.append(ChannelResponse.model_construct(
+            id = f'jk{channel_id}',
+            name = channel_names[channel_id],
+            program_present = program_present,
+            program_following = program_following,
+            threads = threads_by_channel_id[channel_id],
         ))
 
-    # jk263 の情報を追加（jk200 のエイリアスとして扱う）
-    ## jk200 の ChannelResponse を探す
-    jk200_response = next((cr for cr in channel_responses if cr.id == 'jk200'), None)
-    ## jk263 の ChannelResponse を探す
-    jk263_response = next((cr for cr in channel_responses if cr.id == 'jk263'), None)
-
-    if jk200_response is not None:
-        # jk263 のレスポンスを作成（jk200 の情報を使用しつつ、チャンネル名は維持）
-        threads_jk263: list[ThreadResponse] = []
-        if jk263_response is not None:
-            # jk263 の既存スレッドを追加
-            threads_jk263.extend(jk263_response.threads)
-            # jk263 を channel_responses から削除（後で新しいものを追加するため）
-            channel_responses.remove(jk263_response)
-        # jk200 のスレッドを追加
-        threads_jk263.extend(jk200_response.threads)
-        # スレッドを開始時刻でソート
-        threads_jk263.sort(key=lambda x: x.start_at.timestamp())
-
-        channel_responses.append(ChannelResponse(
-            id = 'jk263',
-            name = 'BSJapanext',
-            program_present = program_infos.get('jk200', (None, None))[0],  # jk200 の番組情報を使用
-            program_following = program_infos.get('jk200', (None, None))[1],  # jk200 の番組情報を使用
-            threads = threads_jk263,
-        ))
+    return channel_responses
 
-    # チャンネルレスポンスを ID でソートし直す
-    channel_responses.sort(key=lambda x: int(x.id.replace('jk', '')))
 
-    return channel_responses
+def GetChannelResponsesETag(channel_responses_json: bytes | str) -> str:
+    """
+    チャンネル情報 JSON の内容から、引用符を含まない ETag の元になるハッシュ値を算出する
+
+    Args:
+        channel_responses_json (bytes | str): チャンネル情報 JSON
+
+    Returns:
+        str: ハッシュ値
+    """
+
+    if isinstance(channel_responses_json, str):
+        channel_responses_json = channel_responses_json.encode('utf-8')
+    return hashlib.sha256(channel_responses_json).hexdigest()[:16]
+
+
+def BuildChannelInfosMeta(channel_responses: list[ChannelResponse], channel_responses_json: bytes, revision: int) -> ChannelInfosMeta:
+    """
+    チャンネル情報リストから、リビジョン・ETag・スレッドごとの統計情報を組み立てる
+
+    Args:
+        channel_responses (list[ChannelResponse]): チャンネル情報リスト
+        channel_responses_json (bytes): チャンネル情報リストを変換した JSON
+        revision (int): リビジョン
+
+    Returns:
+        ChannelInfosMeta: リビジョン・ETag・スレッドごとの統計情報
+    """
+
+    # 統計情報以外の内容 (スレッドの追加やステータス・番組情報の変化など) が変わっていなければ、統計情報の差分だけで最新の状態を再現できる
+    ## jk263 のスレッドは jk200 と同じスレッドを含むが、スレッド ID が同じなら統計情報も同じなので 1 つにまとめてよい
+    counters: dict[int, tuple[int | None, int | None, int]] = {}
+    for channel_response in channel_responses:
+        for thread in channel_response.threads:
+            counters[thread.id] = (thread.jikkyo_force, thread.viewers, thread.comments)
+    structure_json = CHANNEL_RESPONSES_ADAPTER.dump_json(
+        channel_responses,
+        exclude = {'__all__': {'threads': {'__all__': {'jikkyo_force', 'viewers', 'comments'}}}},
+    )
+
+    return ChannelInfosMeta(
+        revision = revision,
+        etag = f'{revision}-{GetChannelResponsesETag(channel_responses_json)}',
+        structure_hash = hashlib.sha256(structure_json).hexdigest()[:16],
+        counters = counters,
+    )
+
+
+def BuildChannelResponsesXML(channel_responses: list[ChannelResponse]) -> bytes:
+    """
+    チャンネル情報リストを、namami・旧ニコニコ実況互換用のチャンネル情報 XML に変換する
+
+    Args:
+        channel_responses (list[ChannelResponse]): チャンネル情報リスト
+
+    Returns:
+        bytes: XML 形式のチャンネル情報リスト
+    """
+
+    root = ET.Element('channels', status='ok')
+
+    for channel in channel_responses:
+        channel_id_num = int(channel.id.replace('jk', ''))
+        if channel_id_num < 100:
+            channel_element = ET.SubElement(root, 'channel')
+        else:
+            channel_element = ET.SubElement(root, 'bs_channel')
+
+        ET.SubElement(channel_element, 'id').text = str(channel_id_num)
+        if channel_id_num < 100:
+            ET.SubElement(channel_element, 'no').text = str(channel_id_num)
+        ET.SubElement(channel_element, 'name').text = channel.name
+        ET.SubElement(channel_element, 'video').text = channel.id
+
+        # アクティブな最初のスレッドの情報のみを返す
+        # 通常アクティブなスレッドは1つだけのはずだが…
+        active_threads = [thread for thread in channel.threads if thread.status == 'ACTIVE']
+        if active_threads:
+            thread = active_threads[0]
+            thread_element = ET.SubElement(channel_element, 'thread')
+            ET.SubElement(thread_element, 'id').text = str(thread.id)
+            ET.SubElement(thread_element, 'last_res').text = ''  # 常に空文字列
+            ET.SubElement(thread_element, 'force').text = str(thread.jikkyo_force)
+            ET.SubElement(thread_element, 'viewers').text = str(thread.viewers)
+            ET.SubElement(thread_element, 'comments').text = str(thread.comments)
+
+    return ET.tostring(root, encoding='utf-8', method='xml')
+
+
+def BuildChannelResponsesEncodings(channel_responses: list[ChannelResponse], channel_responses_json: bytes) -> dict[str, bytes]:
+    """
+    チャンネル情報 JSON と XML を、利用できる全ての圧縮形式で事前圧縮する
+    圧縮率を優先した設定で圧縮するため、イベントループをブロックしないよう別スレッドで実行する
+
+    Args:
+        channel_responses (list[ChannelResponse]): チャンネル情報リスト
+        channel_responses_json (bytes): チャンネル情報リストを変換した JSON
+
+    Returns:
+        dict[str, bytes]: Redis 上の Hash のフィールド ('json:br' など) と値の対応表 (無圧縮の JSON は別のキーに保存するため含まない)
+    """
+
+    channel_responses_xml = BuildChannelResponsesXML(channel_responses)
+
+    encodings: dict[str, bytes] = {'xml:identity': channel_responses_xml}
+    for encoding, content in CompressContent(channel_responses_json).items():
+        encodings[f'json:{encoding}'] = content
+    for encoding, content in CompressContent(channel_responses_xml).items():
+        encodings[f'xml:{encoding}'] = content
+    return encodings
+
+
+async def UpdateChannelResponsesCache() -> None:
+    """
+    最新のチャンネル情報を DB から取得し、Redis 上のチャンネル情報キャッシュを更新する
+    内容が前回から変わっていればリビジョンを 1 つ進め、差分取得用に過去のリビジョンの統計情報も保存する
+    XML への変換と各圧縮形式での事前圧縮もここで 1 度だけ行い、各サーバープロセスは Redis から取得したものをそのまま返す
+    スケジューラーによりメインサーバープロセスで 10 秒ごとに実行される
+    """
 
+    global __last_channel_responses_json, __last_channel_infos_revision, __last_channel_responses_encodings
 
-@alru_cache(maxsize=1, ttl=10)
-async def GetRedisCachedChannelResponsesJSON() -> str:
+    # 最新のチャンネル情報を取得
+    channel_responses = await GetChannelResponses()
+    channel_responses_json = CHANNEL_RESPONSES_ADAPTER.dump_json(channel_responses)
+
+    # サーバーの再起動後は、Redis に保存されている最後のリビジョンから続けてリビジョンを進める
+    ## リビジョンは単調増加させる必要があるため、再起動のたびに 0 からやり直さない
+    if __last_channel_infos_revision is None:
+        cached_meta = await REDIS_CLIENT.get(REDIS_KEY_CHANNEL_INFOS_META)
+        __last_channel_infos_revision = ChannelInfosMeta.fromJSON(cached_meta).revision if cached_meta is not None else 0
+
+    # 内容が変わった場合のみリビジョンを進める
+    is_changed = channel_responses_json != __last_channel_responses_json
+    revision = __last_channel_infos_revision + 1 if is_changed is True else __last_channel_infos_revision
+    meta = BuildChannelInfosMeta(channel_responses, channel_responses_json, revision)
+    meta_json = meta.toJSON()
+
+    # 内容が変わった場合のみ XML への変換と事前圧縮をやり直す
+    if is_changed is True:
+        __last_channel_responses_encodings = await asyncio.to_thread(BuildChannelResponsesEncodings, channel_responses, channel_responses_json)
+
+    # チャンネル情報 JSON・リビジョンなどの情報・事前圧縮済みのレスポンスは、読み出し側で食い違わないよう 1 つのトランザクションでまとめて更新する
+    ## 事前圧縮済みのレスポンスはバイナリのため、値をデコードしない Redis クライアントで書き込む
+    ## 事前圧縮済みのレスポンスには対応する ETag を含め、読み出し側でチャンネル情報 JSON と同じリビジョンのものか確かめられるようにする
+    ## このキャッシュは次回の実行で上書きされるまで永続する
+    async with REDIS_CLIENT_BINARY.pipeline(transaction=True) as pipeline:
+        pipeline.set(REDIS_KEY_CHANNEL_INFOS_CACHE, channel_responses_json)
+        pipeline.set(REDIS_KEY_CHANNEL_INFOS_META, meta_json)
+        pipeline.delete(REDIS_KEY_CHANNEL_INFOS_ENCODED_CACHE)
+        pipeline.hset(REDIS_KEY_CHANNEL_INFOS_ENCODED_CACHE, mapping={'etag': meta.etag.encode('utf-8'), **__last_channel_responses_encodings})
+        if is_changed is True:
+            pipeline.hset(REDIS_KEY_CHANNEL_INFOS_HISTORY, str(revision), meta_json)
+            pipeline.hdel(REDIS_KEY_CHANNEL_INFOS_HISTORY, str(revision - CHANNEL_INFOS_HISTORY_SIZE))
+        # 更新が反映されると同時に、全サーバープロセスにスナップショットを読み込み直すよう通知する
+        pipeline.publish(REDIS_CHANNEL_CHANNEL_INFOS_UPDATED, str(revision))
+        await pipeline.execute()
+
+    __last_channel_responses_json = channel_responses_json
+    __last_channel_infos_revision = revision
+
+
+async def GetChannelInfosMetaByRevision(revision: int) -> ChannelInfosMeta | None:
     """
-    スケジューラーによって定期的に Redis にキャッシュされた、最新のチャンネル情報 JSON を取得する
-    /api/v1/channels の負荷軽減のため、実行結果は10秒間メモリ上にキャッシュされる (インメモリ -> Redis の多段キャッシュ構成)
+    過去のリビジョンのチャンネル情報キャッシュに付随する情報を取得する
+
+    Args:
+        revision (int): リビジョン
 
     Returns:
-        str: チャンネル情報 JSON
+        ChannelInfosMeta | None: リビジョンに対応する情報 (保持期間を過ぎたか、存在しないリビジョンの場合は None)
+    """
+
+    meta = __channel_infos_meta_history.get(revision)
+    if meta is not None:
+        return meta
+
+    cached_meta = await REDIS_CLIENT.hget(REDIS_KEY_CHANNEL_INFOS_HISTORY, str(revision))
+    if cached_meta is None:
+        return None
+    meta = ChannelInfosMeta.fromJSON(cached_meta)
+
+    # 保持期間を過ぎた古いリビジョンの情報から削除する
+    __channel_infos_meta_history[revision] = meta
+    for old_revision in [old_revision for old_revision in __channel_infos_meta_history if old_revision <= revision - CHANNEL_INFOS_HISTORY_SIZE]:
+        del __channel_infos_meta_history[old_revision]
+    return meta
+
+
+async def GetChannelResponsesJSON(full: bool = False) -> bytes:
+    """
+    データベースから最新のチャンネル情報リストを取得し、JSON のバイト列に変換する
+
+    Args:
+        full (bool, optional): チャンネルに紐づく全スレッドの情報を取得するかどうか。省略時は最新4日分のスレッドだけ取得する
+
+    Returns:
+        bytes: チャンネル情報 JSON
+    """
+
+    return CHANNEL_RESPONSES_ADAPTER.dump_json(await GetChannelResponses(full=full))
+
+
+async def LoadChannelResponsesSnapshot(current_snapshot: ChannelResponsesSnapshot | None) -> ChannelResponsesSnapshot:
+    """
+    スケジューラーによって定期的に Redis にキャッシュされた、最新のチャンネル情報 JSON とそのリビジョン・事前圧縮済みのレスポンスなどを取得する
+
+    Args:
+        current_snapshot (ChannelResponsesSnapshot | None): 現在使っているスナップショット (内容が同じなら検証・変換の結果を使い回す)
+
+    Returns:
+        ChannelResponsesSnapshot: チャンネル情報 JSON とそのリビジョン・事前圧縮済みのレスポンスなど
     """
 
     # Redis からキャッシュを取得
     ## キャッシュは app.py で定義のスケジューラーで10秒おきに定期更新されているので、基本常に新鮮なキャッシュが存在するはず
-    cached_channels = await REDIS_CLIENT.get(REDIS_KEY_CHANNEL_INFOS_CACHE)
+    ## チャンネル情報 JSON・リビジョンなどの情報・事前圧縮済みのレスポンスが食い違わないよう、1 つのトランザクションでまとめて取得する
+    async with REDIS_CLIENT_BINARY.pipeline(transaction=True) as pipeline:
+        pipeline.get(REDIS_KEY_CHANNEL_INFOS_CACHE)
+        pipeline.get(REDIS_KEY_CHANNEL_INFOS_META)
+        pipeline.hgetall(REDIS_KEY_CHANNEL_INFOS_ENCODED_CACHE)
+        cached_channels, cached_meta, cached_encodings = await pipeline.execute()
     if cached_channels is not None:
         # Redis キャッシュ破損時の検出は従来どおり残す
-        ## HTTP レスポンスは JSON 文字列を直接返すが、10秒に1回は Pydantic で検証して既存の失敗挙動を保つ
-        TypeAdapter(list[ChannelResponse]).validate_json(cached_channels)
-        return cached_channels
+        ## 内容が変わっていなければ、現在のスナップショットの検証・変換の結果をそのまま使う
+        if current_snapshot is not None and current_snapshot.json_encodings['identity'] == cached_channels:
+            channel_responses = current_snapshot.channel_responses
+        else:
+            channel_responses = CHANNEL_RESPONSES_ADAPTER.validate_json(cached_channels)
+
+        # フェイルセーフで作成された一時キャッシュなど、リビジョンなどの情報と内容が一致しない場合はリビジョンを使わない
+        meta = ChannelInfosMeta.fromJSON(cached_meta.decode('utf-8')) if cached_meta is not None else None
+        if meta is not None and meta.etag != f'{meta.revision}-{GetChannelResponsesETag(cached_channels)}':
+            meta = None
+
+        # 事前圧縮済みのレスポンスが同じリビジョンのものであれば、そのまま使う
+        if meta is not None and cached_encodings.get(b'etag') == meta.etag.encode('utf-8'):
+            json_encodings: dict[str, bytes] = {'identity': cached_channels}
+            xml_encodings: dict[str, bytes] = {}
+            for field, content in cached_encodings.items():
+                kind, _, encoding = field.decode('utf-8').partition(':')
+                if kind == 'json':
+                    json_encodings[encoding] = content
+                elif kind == 'xml':
+                    xml_encodings[encoding] = content
+            if 'identity' in xml_encodings:
+                return ChannelResponsesSnapshot(
+                    json = cached_channels.decode('utf-8'),
+                    channel_responses = channel_responses,
+                    meta = meta,
+                    json_encodings = json_encodings,
+                    xml_encodings = xml_encodings,
+                )
+
+        # 事前圧縮済みのレスポンスが使えない場合は、無圧縮のレスポンスだけをこのサーバープロセスで用意する
+        return ChannelResponsesSnapshot(
+            json = cached_channels.decode('utf-8'),
+            channel_responses = channel_responses,
+            meta = meta,
+            json_encodings = {'identity': cached_channels},
+            xml_encodings = {'identity': BuildChannelResponsesXML(channel_responses)},
+        )
 
     # 万が一キャッシュが存在しない場合のみ、直接取得し一時的にキャッシュしてから返す (フェイルセーフ)
     ## この時に作成される一時キャッシュの有効期限は10秒とし、万が一スケジューラーが動作していない場合でも最新のデータが返されることを保証する
     channel_responses = await GetChannelResponses()
-    cached_channels_json = TypeAdapter(list[ChannelResponse]).dump_json(channel_responses).decode('utf-8')
-    await REDIS_CLIENT.set(REDIS_KEY_CHANNEL_INFOS_CACHE, cached_channels_json, ex=10)
-    logging.warning('[GetRedisCachedChannelResponses] Channel responses cache is missing. Temporary cache is created.')
-    return cached_channels_json
+    channel_responses_json = CHANNEL_RESPONSES_ADAPTER.dump_json(channel_responses)
+    await REDIS_CLIENT_BINARY.set(REDIS_KEY_CHANNEL_INFOS_CACHE, channel_responses_json, ex=10)
+    logging.warning('[LoadChannelResponsesSnapshot] Channel responses cache is missing. Temporary cache is created.')
+    return ChannelResponsesSnapshot(
+        json = channel_responses_json.decode('utf-8'),
+        channel_responses = channel_responses,
+        meta = None,
+        json_encodings = {'identity': channel_responses_json},
+        xml_encodings = {'identity': BuildChannelResponsesXML(channel_responses)},
+    )
+
+
+class ChannelResponsesSnapshotCache:
+    """
+    サーバープロセスごとに、最新のチャンネル情報のスナップショットを保持するキャッシュ
+
+    有効期限付きのキャッシュでは、期限が切れるたびにその時点のリクエストが Redis からの取得と検証を待つことになり、
+    ポーリングが集中する時間帯にはそのたびにレイテンシが跳ね上がってしまう
+    メインサーバープロセスがチャンネル情報キャッシュを更新したら Redis Pub/Sub で全サーバープロセスに通知し、
+    各サーバープロセスはバックグラウンドで新しいスナップショットを読み込んで、読み込みが終わった時点で丸ごと差し替える
+    リクエストの処理では差し替え済みのスナップショットを参照するだけで、Redis への問い合わせや JSON の検証を待つことはない
+    """
+
+    def __init__(self) -> None:
+
+        # 現在のスナップショット (一度も読み込んでいなければ None)
+        self.snapshot: ChannelResponsesSnapshot | None = None
+        # スナップショットを最後に読み込んだ (または最新であることを確かめた) 時刻
+        self.loaded_at: float = 0.0
+        # スナップショットを読み込むタスク (複数の通知やリクエストから同時に要求されても 1 回だけ実行する)
+        self._load_task: asyncio.Task[None] | None = None
+        # 読み込み中に更新通知を受け取ったかどうか (読み込みが終わったらもう一度読み込み直す)
+        self._is_reload_requested = False
+
+        # 他のサーバープロセスからの通知を受け取れるよう、購読ハブにハンドラを登録する
+        ## 受信タスク自体は、イベントループ上で最初にスナップショットを取得する際に開始する
+        REDIS_PUBSUB_HUB.addHandler(REDIS_CHANNEL_CHANNEL_INFOS_UPDATED, self.invalidate)
+
+    async def get(self) -> ChannelResponsesSnapshot:
+        """
+        最新のチャンネル情報のスナップショットを取得する
+        一度読み込んだ後は待機せずに即座に返し、古くなっていればバックグラウンドで読み込み直す
+
+        Returns:
+            ChannelResponsesSnapshot: チャンネル情報のスナップショット
+        """
+
+        snapshot = self.snapshot
+        if snapshot is None:
+            # 他のサーバープロセスからの通知を受け取れるよう、購読ハブの受信タスクを開始する (開始済みなら何もしない)
+            REDIS_PUBSUB_HUB.start()
+            await self.reload()
+            assert self.snapshot is not None
+            return self.snapshot
+
+        # 更新通知を取りこぼした場合やフェイルセーフで作成したスナップショットは、一定時間ごとに読み込み直す
+        max_age = CHANNEL_RESPONSES_SNAPSHOT_MAX_AGE_SECONDS if snapshot.meta is not None else CHANNEL_RESPONSES_SNAPSHOT_FAILSAFE_MAX_AGE_SECONDS
+        if time.time() - self.loaded_at >= max_age:
+            self.invalidate()
+        return snapshot
+
+    async def reload(self) -> None:
+        """
+        スナップショットを Redis から読み込み直す
+        すでに読み込み中の場合は、その読み込みが終わるのを待つ
+        """
+
+        if self._load_task is None or self._load_task.done():
+            self._load_task = asyncio.create_task(self._load())
+        await asyncio.shield(self._load_task)
+
+    def invalidate(self, message: str = '') -> None:
+        """
+        RedisPubSubHub から通知を受け取り、スナップショットをバックグラウンドで読み込み直す
+        購読ハブの受信タスク内で同期的に呼び出されるため、await を伴う処理を行ってはならない
+
+        Args:
+            message (str, optional): 受信したメッセージ (更新後のリビジョン). Defaults to ''.
+        """
+
+        # 現在のスナップショットと同じリビジョンなら内容は変わっていないため、最新であることだけを記録する
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.meta is not None and message == str(snapshot.meta.revision):
+            self.loaded_at = time.time()
+            return
+
+        if self._load_task is None or self._load_task.done():
+            self._load_task = asyncio.create_task(self._load())
+        else:
+            self._is_reload_requested = True
+
+    async def _load(self) -> None:
+        """
+        スナップショットを Redis から読み込み、読み込みが終わった時点で丸ごと差し替える
+        """
+
+        while True:
+            self._is_reload_requested = False
+            loaded_at = time.time()
+            try:
+                snapshot = await LoadChannelResponsesSnapshot(self.snapshot)
+            except Exception as ex:
+                # 一度も読み込めていない場合は、呼び出し元にそのまま例外を送出する
+                if self.snapshot is None:
+                    raise
+                # 読み込み済みのスナップショットがある場合はそのまま使い続け、読み込み直しは次の通知か一定時間後まで控える
+                logging.warning('ChannelResponsesSnapshotCache: Failed to reload the channel responses snapshot. Keeping the cached snapshot.', exc_info = ex)
+                self.loaded_at = loaded_at
+                return
+
+            self.snapshot = snapshot
+            self.loaded_at = loaded_at
+
+            # 読み込み中に更新通知を受け取っていれば、もう一度読み込み直す
+            if self._is_reload_requested is False:
+                return
+
+
+# サーバープロセスごとに 1 つだけ存在するチャンネル情報のスナップショットのキャッシュ
+CHANNEL_RESPONSES_SNAPSHOT_CACHE = ChannelResponsesSnapshotCache()
+
+
+async def GetChannelResponsesSnapshot() -> ChannelResponsesSnapshot:
+    """
+    最新のチャンネル情報 JSON とそのリビジョン・事前圧縮済みのレスポンスなどのスナップショットを取得する
+
+    Returns:
+        ChannelResponsesSnapshot: チャンネル情報のスナップショット
+    """
+
+    return await CHANNEL_RESPONSES_SNAPSHOT_CACHE.get()
 
 
-@alru_cache(maxsize=1, ttl=10)
 async def GetRedisCachedChannelResponses() -> list[ChannelResponse]:
     """
     スケジューラーによって定期的に Redis にキャッシュされた、最新のチャンネル情報リストを取得する
-    /api/v1/channels の負荷軽減のため、実行結果は10秒間メモリ上にキャッシュされる (インメモリ -> Redis の多段キャッシュ構成)
+    返されるリストはスナップショットと共有されているため、内容を変更してはならない
 
     Returns:
         list[ChannelResponse]: チャンネル情報リスト
     """
 
-    # 内部処理では従来どおり Pydantic モデルとして扱えるよう、JSON キャッシュから復元する
-    cached_channels_json = await GetRedisCachedChannelResponsesJSON()
-    return TypeAdapter(list[ChannelResponse]).validate_json(cached_channels_json)
+    return (await GetChannelResponsesSnapshot()).channel_responses
+
+
+def CreateEncodedResponse(
+    request: Request,
+    encodings: dict[str, bytes],
+    media_type: str,
+    etag: str | None,
+    headers: dict[str, str],
+) -> Response:
+    """
+    事前圧縮済みのレスポンス本文から、クライアントの Accept-Encoding に応じたものを選んで HTTP レスポンスを生成する
+    ETag が指定されていれば、If-None-Match に応じて 304 を返す
+
+    Args:
+        request (Request): クライアントの HTTP リクエスト
+        encodings (dict[str, bytes]): 圧縮形式とレスポンス本文の対応表 ('identity' は必須)
+        media_type (str): レスポンスの Content-Type
+        etag (str | None): 無圧縮のレスポンス本文の ETag (引用符を含まない / ETag を付けない場合は None)
+        headers (dict[str, str]): レスポンスに追加するヘッダー
+
+    Returns:
+        Response: HTTP レスポンス
+    """
+
+    encoding = SelectContentEncoding(request.headers.get('Accept-Encoding', ''), encodings)
+
+    # Vary を付けておくことで、プロキシやブラウザが圧縮形式の違うレスポンスを混同しないようにする
+    headers = {**headers, 'Vary': 'Accept-Encoding'}
+
+    # 圧縮形式ごとに本文が異なるため、ETag も圧縮形式ごとに別の値にする
+    ## 前回から内容が変わっていなければ、本文を送らずに 304 を返す
+    if etag is not None:
+        etags = {
+            f'"{etag}"' if variant_encoding == 'identity' else f'"{etag}-{variant_encoding}"'
+            for variant_encoding in encodings
+        }
+        headers['ETag'] = f'"{etag}"' if encoding == 'identity' else f'"{etag}-{encoding}"'
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None and IsETagMatched(if_none_match, etags) is True:
+            return Response(status_code=304, headers=headers)
+
+    # 対応クライアントには事前圧縮済みのレスポンスを返し、TLS 書き込み量を減らす
+    ## KonomiTV の大量ポーリングはリクエスト数を減らせないため、同じ内容を軽く返す方向で負荷を下げる
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return Response(content=encodings[encoding], media_type=media_type, headers=headers)
 
 
 async def GetRedisCachedChannelResponsesJSONResponse(request: Request) -> Response:
@@ -287,71 +753,88 @@ async def GetRedisCachedChannelResponsesJSONResponse(request: Request) -> Respon
         Response: チャンネル情報 JSON の HTTP レスポンス
     """
 
-    cached_channels_json = await GetRedisCachedChannelResponsesJSON()
+    snapshot = await GetChannelResponsesSnapshot()
 
-    # gzip 対応クライアントには事前圧縮済みレスポンスを返し、TLS 書き込み量を減らす
-    ## KonomiTV の大量ポーリングはリクエスト数を減らせないため、同じ内容を軽く返す方向で負荷を下げる
-    accept_encoding = request.headers.get('Accept-Encoding', '').lower()
-    if 'gzip' in accept_encoding:
-        return Response(
-            content = await GetGzipCompressedChannelResponsesJSON(cached_channels_json),
-            media_type = 'application/json',
-            headers = {
-                'Content-Encoding': 'gzip',
-                'Vary': 'Accept-Encoding',
-            },
-        )
-
-    # gzip 非対応クライアントには従来と同じ JSON 本文をそのまま返す
-    ## Vary を付けておくことで、プロキシやブラウザが圧縮有無の違うレスポンスを混同しないようにする
-    return Response(
-        content = cached_channels_json,
+    # スケジューラーが作成したキャッシュであれば、リビジョンに基づく ETag を付けて条件付きリクエストに応じる
+    headers: dict[str, str] = {}
+    if snapshot.meta is not None:
+        headers[CHANNEL_INFOS_REVISION_HEADER] = str(snapshot.meta.revision)
+    return CreateEncodedResponse(
+        request = request,
+        encodings = snapshot.json_encodings,
         media_type = 'application/json',
-        headers = {'Vary': 'Accept-Encoding'},
+        etag = snapshot.meta.etag if snapshot.meta is not None else None,
+        headers = headers,
     )
 
 
-@alru_cache(maxsize=1, ttl=10)
-async def GetRedisCachedChannelResponsesXML() -> Response:
+async def GetRedisCachedChannelResponsesXMLResponse(request: Request) -> Response:
     """
-    スケジューラーによって定期的に Redis にキャッシュされた、最新のチャンネル情報リストを XML に変換したものを取得する
-    /api/v1/channels/xml の負荷軽減のため、実行結果は 10 秒間メモリ上にキャッシュされる (インメモリ -> Redis の多段キャッシュ構成)
+    Redis キャッシュ済みの namami・旧ニコニコ実況互換用のチャンネル情報 XML の HTTP レスポンスを生成する
+
+    Args:
+        request (Request): クライアントの HTTP リクエスト
 
     Returns:
-        Response: XML 形式のチャンネル情報リストのレスポンス
+        Response: XML 形式のチャンネル情報リストの HTTP レスポンス
     """
 
-    channels_response = await GetRedisCachedChannelResponses()
+    snapshot = await GetChannelResponsesSnapshot()
+    return CreateEncodedResponse(
+        request = request,
+        encodings = snapshot.xml_encodings,
+        media_type = 'application/xml; charset=UTF-8',
+        etag = f'{snapshot.meta.etag}-xml' if snapshot.meta is not None else None,
+        headers = {},
+    )
 
-    root = ET.Element('channels', status='ok')
 
-    for channel in channels_response:
-        channel_id_num = int(channel.id.replace('jk', ''))
-        if channel_id_num < 100:
-            channel_element = ET.SubElement(root, 'channel')
-        else:
-            channel_element = ET.SubElement(root, 'bs_channel')
+async def GetChannelResponsesPatchResponse(since: int) -> Response:
+    """
+    指定されたリビジョンから最新のリビジョンまでに変化した、スレッドの統計情報だけを返す HTTP レスポンスを生成する
+    統計情報以外の内容が変わった場合や、指定されたリビジョンの情報が残っていない場合は、最新のチャンネル情報リストをそのまま返す
 
-        ET.SubElement(channel_element, 'id').text = str(channel_id_num)
-        if channel_id_num < 100:
-            ET.SubElement(channel_element, 'no').text = str(channel_id_num)
-        ET.SubElement(channel_element, 'name').text = channel.name
-        ET.SubElement(channel_element, 'video').text = channel.id
+    Args:
+        since (int): クライアントが保持しているチャンネル情報のリビジョン
 
-        # アクティブな最初のスレッドの情報のみを返す
-        # 通常アクティブなスレッドは1つだけのはずだが…
-        active_threads = [thread for thread in channel.threads if thread.status == 'ACTIVE']
-        if active_threads:
-            thread = active_threads[0]
-            thread_element = ET.SubElement(channel_element, 'thread')
-            ET.SubElement(thread_element, 'id').text = str(thread.id)
-            ET.SubElement(thread_element, 'last_res').text = ''  # 常に空文字列
-            ET.SubElement(thread_element, 'force').text = str(thread.jikkyo_force)
-            ET.SubElement(thread_element, 'viewers').text = str(thread.viewers)
-            ET.SubElement(thread_element, 'comments').text = str(thread.comments)
+    Returns:
+        Response: チャンネル情報の差分の HTTP レスポンス
+    """
 
-    xml_str = ET.tostring(root, encoding='utf-8', method='xml')
-    return Response(content=xml_str, media_type='application/xml; charset=UTF-8')
+    snapshot = await GetChannelResponsesSnapshot()
+
+    patch: ChannelsPatchResponse | None = None
+    if snapshot.meta is not None:
+        since_meta = snapshot.meta if since == snapshot.meta.revision else await GetChannelInfosMetaByRevision(since)
+        if since_meta is not None and since_meta.structure_hash == snapshot.meta.structure_hash:
+            # 統計情報が変化したスレッドだけを返す
+            ## スレッド ID 単位で返すため、jk263 のように複数のチャンネルに含まれるスレッドは、クライアント側で該当する全てのスレッドに適用する
+            patch = ChannelsPatchResponse(
+                revision = snapshot.meta.revision,
+                reset = False,
+                threads = [
+                    ChannelThreadCountersResponse(
+                        id = thread_id,
+                        jikkyo_force = counters[0],
+                        viewers = counters[1],
+                        comments = counters[2],
+                    )
+                    for thread_id, counters in snapshot.meta.counters.items()
+                    if since_meta.counters.get(thread_id) != counters
+                ],
+            )
+
+    # 差分を返せない場合は、最新のチャンネル情報リストをそのまま返す
+    if patch is None:
+        patch = ChannelsPatchResponse(
+            revision = snapshot.meta.revision if snapshot.meta is not None else 0,
+            reset = True,
+            threads = [],
+            channels = await GetRedisCachedChannelResponses(),
+        )
+
+    headers = {CHANNEL_INFOS_REVISION_HEADER: str(patch.revision)}
+    return Response(content=patch.model_dump_json(), media_type='application/json', headers=headers)
 
 
 @router.get(
@@ -379,14 +862,22 @@ async def HealthCheckAPI():
 async def ChannelsAPI(
     request: Request,
     full: Annotated[bool, Query(description='チャンネルに紐づく全スレッドの情報を取得するかどうか。省略時は最新4日分のスレッドだけ取得する。')] = False,
+    since: Annotated[int | None, Query(ge=0, description='前回取得したチャンネル情報のリビジョン (X-Channels-Revision ヘッダーの値) 。指定すると、そのリビジョンから変化したスレッドの統計情報だけを返す。')] = None,
 ):
     """
-    全チャンネルの情報と、各チャンネルごとの全スレッドの情報を一括で取得する。
+    全チャンネルの情報と、各チャンネルごとの全スレッドの情報を一括で取得する。<br>
+    レスポンスの ETag を If-None-Match に指定すると、内容が変わっていない場合は 304 を返す。<br>
+    since に前回取得したリビジョンを指定すると、実況勢い・同時接続数・コメント数が変化したスレッドだけを ChannelsPatchResponse 形式で返す。
+    スレッドの追加などで差分を返せない場合は、reset を true にした上で channels に最新のチャンネル情報を格納して返す。
     """
 
     # 全チャンネルの情報を取得する場合のみ、キャッシュを使わずデータベースから直接取得する
     if full is True:
-        return await GetChannelResponses(full=True)
+        return Response(content=await GetChannelResponsesJSON(full=True), media_type='application/json')
+
+    # リビジョンが指定された場合は、そのリビジョンからの差分を返す
+    if since is not None:
+        return await GetChannelResponsesPatchResponse(since)
 
     # それ以外の場合はメモリ (メモリに存在しない場合は Redis) からチャンネル情報 JSON を取得する
     return await GetRedisCachedChannelResponsesJSONResponse(request)
@@ -403,14 +894,14 @@ async def ChannelsAPI(
         }
     }
 )
-async def ChannelsXMLAPI():
+async def ChannelsXMLAPI(request: Request):
     """
     namami・旧ニコニコ実況互換用のチャンネル情報を XML 形式で返す。<br>
     NicoJK.ini の channelsUri= に指定する用途を想定。
     """
 
-    # メモリから XML 形式のチャンネル情報リストを取得する
-    return await GetRedisCachedChannelResponsesXML()
+    # メモリ (メモリに存在しない場合は Redis) から XML 形式のチャンネル情報リストを取得する
+    return await GetRedisCachedChannelResponsesXMLResponse(request)
 
 
 @router.get(
@@ -0,0 +1,228 @@
+import asyncio
+import ipaddress
+from typing import Annotated, Any, Literal
+
+import httpx
+from fastapi import (
+    APIRouter,
+    HTTPException,
+    Path,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import JSONResponse
+
+from app import logging
+from app.config import CONFIG
+from app.constants import HTTPX_CLIENT
+from app.routers import threads
+from app.utils.comment_trace import GetCommentTraceStats
+from app.utils.comment_write_behind import GetCommentWriteBehindDeadLetterThreadIds
+from app.utils.metrics import (
+    METRICS,
+    MergeWorkerMetricFamilies,
+    MetricFamily,
+    MetricSample,
+    RenderPrometheusText,
+)
+from app.utils.thread_archive import (
+    DeleteThreadArchive,
+    PublishThreadArchiveInvalidation,
+)
+from app.utils.thread_cache import GetThread
+
+
+# ルーター
+router = APIRouter(
+    tags = ['Internal'],
+    prefix = '/api/v1',
+)
+
+# リバースプロキシを経由したリクエストに付与されるヘッダー
+## 内部向け API はサーバーと同じホスト・ネットワークから直接アクセスされることを前提としており、
+## これらのヘッダーが付与されている場合はインターネットから到達したリクエストとみなして拒否する
+PROXY_HEADERS = ('x-forwarded-for', 'x-forwarded-proto', 'forwarded', 'via')
+
+# Prometheus のテキスト形式の Content-Type
+PROMETHEUS_TEXT_MEDIA_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def IsInternalRequest(request: Request) -> bool:
+    """
+    リクエストがリバースプロキシを経由せず、ループバックまたはプライベートネットワークから直接送られたかどうかを判定する
+
+    Args:
+        request (Request): リクエスト
+
+    Returns:
+        bool: 内部からの直接のリクエストなら True
+    """
+
+    if any(header in request.headers for header in PROXY_HEADERS):
+        return False
+    if request.client is None:
+        return False
+    try:
+        client_address = ipaddress.ip_address(request.client.host)
+    except ValueError:
+        return False
+    return client_address.is_loopback or client_address.is_private
+
+
+def RequireInternalRequest(request: Request) -> None:
+    """
+    内部からの直接のリクエストでなければ、API の存在自体を隠すため 404 を返す
+
+    Args:
+        request (Request): リクエスト
+    """
+
+    if IsInternalRequest(request) is False:
+        raise HTTPException(
+            status_code = status.HTTP_404_NOT_FOUND,
+            detail = 'Not Found',
+        )
+
+
+@router.get(
+    '/internal/comment-latency',
+    summary = 'コメント遅延の計測結果取得 API (内部向け)',
+    response_description = 'このサーバープロセスで計測した、コメント投稿から各接続への書き込みまでの遅延の計測区間ごとの集計結果。',
+    include_in_schema = False,
+)
+async def CommentLatencyAPI(request: Request) -> dict[str, Any]:
+    """
+    このサーバープロセスで計測した、コメント投稿から各接続への書き込みまでの遅延を計測区間ごとに集計した結果を取得する。<br>
+    遅延の計測対象は COMMENT_TRACE_SAMPLE_RATE の割合でサンプリングされたコメントのみ。<br>
+    各計測区間の buckets はサーバープロセス間で共通の境界を持つため、全サーバープロセスの結果を足し合わせて集約できる。<br>
+    リバースプロキシを経由したリクエストは拒否される。
+    """
+
+    RequireInternalRequest(request)
+    return GetCommentTraceStats()
+
+
+@router.delete(
+    '/internal/thread-archives/{thread_id}',
+    summary = 'スレッドアーカイブ無効化 API (内部向け)',
+    response_description = 'スレッドアーカイブを削除・再作成したかどうか。',
+    include_in_schema = False,
+)
+async def ThreadArchiveInvalidateAPI(
+    request: Request,
+    thread_id: Annotated[int, Path(description='スレッド ID 。')],
+    rebuild: Annotated[bool, Query(description='削除した後に、現在の DB の内容からスレッドアーカイブを作成し直すかどうか。')] = True,
+) -> dict[str, Any]:
+    """
+    コメントが欠けているなど内容に問題があるスレッドアーカイブを削除し、全サーバープロセスに ETag のキャッシュを破棄させる。<br>
+    rebuild=true (デフォルト) の場合は、write-behind モードでの DB への保存が追いついていれば、現在の DB の内容からアーカイブを作成し直す。<br>
+    作成し直さなかった場合、スレッド取得 API は DB から取得したコメントを返す。<br>
+    リバースプロキシを経由したリクエストは拒否される。
+    """
+
+    RequireInternalRequest(request)
+
+    thread = await GetThread(thread_id)
+    if thread is None:
+        raise HTTPException(
+            status_code = status.HTTP_404_NOT_FOUND,
+            detail = 'Specified thread_id was not found',
+        )
+
+    is_deleted = await DeleteThreadArchive(thread_id)
+
+    # 定期的なアーカイブの作成と同じ条件を満たす場合のみ作成し直す
+    is_rebuilt = False
+    if rebuild is True:
+        archivable_before = await threads.GetThreadArchivableBefore()
+        dead_letter_thread_ids = await GetCommentWriteBehindDeadLetterThreadIds()
+        if thread.end_at <= archivable_before and thread.id not in dead_letter_thread_ids:
+            await threads.ArchiveThread(thread)
+            # 削除の通知を受け取った後に新しいアーカイブを読み込ませるため、作成し直した後にも通知する
+            await PublishThreadArchiveInvalidation(thread_id)
+            is_rebuilt = True
+
+    logging.info(f'ThreadArchiveInvalidateAPI: Thread {thread_id} archive has been invalidated. (deleted: {is_deleted}, rebuilt: {is_rebuilt})')
+    return {
+        'thread_id': thread_id,
+        'is_deleted': is_deleted,
+        'is_rebuilt': is_rebuilt,
+    }
+
+
+async def FetchWorkerMetricFamilies(port: int) -> list[MetricFamily] | None:
+    """
+    サブサーバープロセスから、そのサーバープロセスのメトリクスを取得する
+
+    Args:
+        port (int): サブサーバープロセスのポート番号
+
+    Returns:
+        list[MetricFamily] | None: サブサーバープロセスのメトリクス (取得できなかった場合は None)
+    """
+
+    try:
+        async with HTTPX_CLIENT() as httpx_client:
+            response = await httpx_client.get(
+                f'http://127.0.0.1:{port}/api/v1/metrics',
+                params = {'scope': 'worker', 'format': 'json'},
+            )
+            response.raise_for_status()
+        return [MetricFamily.fromJSON(family) for family in response.json()]
+    except (httpx.HTTPError, ValueError, KeyError, TypeError) as ex:
+        logging.warning(f'MetricsAPI: Failed to fetch metrics from the server process on port {port}.', exc_info = ex)
+        return None
+
+
+@router.get(
+    '/metrics',
+    summary = 'メトリクス取得 API (内部向け)',
+    response_description = 'Prometheus のテキスト形式のメトリクス。',
+    include_in_schema = False,
+)
+async def MetricsAPI(
+    request: Request,
+    scope: Annotated[Literal['all', 'worker'], Query(description='all ならメインサーバープロセスで全サーバープロセスのメトリクスをまとめて返す。worker ならリクエストを受けたサーバープロセスのメトリクスだけを返す。')] = 'all',
+    format: Annotated[Literal['prometheus', 'json'], Query(description='レスポンスの形式。json はメインサーバープロセスがメトリクスをまとめる際に使う。')] = 'prometheus',
+) -> Response:
+    """
+    WebSocket の接続数・Broadcaster の購読者数・読み飛ばされたコメント数・ドロップしたログの件数・DB 接続プールの使用状況・
+    トランザクションの再試行回数・Redis コマンドの応答時間などのメトリクスを Prometheus のテキスト形式で取得する。<br>
+    メインサーバープロセスに scope=all (デフォルト) でリクエストすると、全てのサブサーバープロセスのメトリクスも取得し、
+    サーバープロセスのポート番号を port ラベルとして付与した 1 つのメトリクスにまとめて返す。<br>
+    リバースプロキシを経由したリクエストは拒否される。
+    """
+
+    RequireInternalRequest(request)
+
+    # このサーバープロセスのメトリクスだけを返す
+    ## メインサーバープロセスがメトリクスをまとめる際は、ポート番号のラベルをメインサーバープロセス側で付与するため、ここでは付与しない
+    if scope == 'worker':
+        families = METRICS.collect()
+        if format == 'json':
+            return JSONResponse([family.toJSON() for family in families])
+        return Response(content=RenderPrometheusText(families), media_type=PROMETHEUS_TEXT_MEDIA_TYPE)
+
+    worker_families: dict[int, list[MetricFamily]] = {CONFIG.SPECIFIED_SERVER_PORT: METRICS.collect()}
+    up_family = MetricFamily(
+        name = 'nx_jikkyo_worker_up',
+        type = 'gauge',
+        help = 'Whether the metrics of the server process could be collected (1) or not (0).',
+        samples = [MetricSample(name='nx_jikkyo_worker_up', labels={'port': str(CONFIG.SPECIFIED_SERVER_PORT)}, value=1)],
+    )
+
+    # メインサーバープロセスの場合のみ、全てのサブサーバープロセスのメトリクスを並行して取得してまとめる
+    if CONFIG.SPECIFIED_SERVER_PORT == CONFIG.SERVER_PORT:
+        sub_server_ports = [CONFIG.SERVER_PORT + count + 1 for count in range(CONFIG.SUB_SERVER_PROCESS_COUNT)]
+        results = await asyncio.gather(*[FetchWorkerMetricFamilies(port) for port in sub_server_ports])
+        for port, families in zip(sub_server_ports, results):
+            up_family.samples.append(MetricSample(name='nx_jikkyo_worker_up', labels={'port': str(port)}, value=1 if families is not None else 0))
+            if families is not None:
+                worker_families[port] = families
+
+    merged_families = [up_family, *MergeWorkerMetricFamilies(worker_families)]
+    if format == 'json':
+        return JSONResponse([family.toJSON() for family in merged_families])
+    return Response(content=RenderPrometheusText(merged_families), media_type=PROMETHEUS_TEXT_MEDIA_TYPE)
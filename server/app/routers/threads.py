@@ -1,19 +1,38 @@
 
-from typing import Annotated, Literal
+import math
+from collections.abc import AsyncGenerator
+from datetime import datetime, timedelta
+from typing import Annotated, Any, Literal
 
 from fastapi import (
     APIRouter,
     HTTPException,
     Path,
+    Query,
+    Request,
+    Response,
 )
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import TypeAdapter
 from tortoise import timezone
 
+from app.constants import JST
 from app.models.comment import (
     Comment,
     CommentResponse,
     Thread,
+    ThreadCommentsResponse,
     ThreadWithCommentsResponse,
 )
+from app.utils.comment_write_behind import GetCommentWriteBehindFlushedBefore
+from app.utils.content_negotiation import IsETagMatched, IsGzipAcceptable
+from app.utils.thread_archive import (
+    GetThreadArchiveETag,
+    GetThreadArchivePath,
+    ReadThreadArchiveDecompressed,
+    WriteThreadArchive,
+)
+from app.utils.thread_cache import GetThread
 
 
 # ルーター
@@ -22,22 +41,47 @@ router = APIRouter(
     prefix = '/api/v1',
 )
 
+# スレッド取得 API で 1 回の DB クエリで取得するコメントの件数
+THREAD_COMMENTS_CHUNK_SIZE = 5000
 
-@router.get(
-    '/threads/{thread_id}',
-    summary = 'スレッド取得 API',
-    response_description = 'スレッド情報とスレッド内の全コメント。',
-    response_model = ThreadWithCommentsResponse,
-)
-async def ThreadAPI(thread_id: Annotated[int, Path(description='スレッド ID 。')]):
-    """
-    指定されたスレッドの情報と、スレッド内の全コメントを取得する。
+# スレッドコメント取得 API で 1 回に取得できるコメントの最大件数
+THREAD_COMMENTS_MAX_LIMIT = 10000
+
+# スレッドコメント取得 API の start / end に指定できる値の範囲
+## vpos はコメントの vpos カラム (INT) の範囲、日時は datetime で扱える範囲 (9999-12-30T00:00:00Z まで) を両方含むようにする
+THREAD_COMMENTS_RANGE_MIN = -(2 ** 31)
+THREAD_COMMENTS_RANGE_MAX = 253402128000
+
+# UNIX タイムスタンプの起点
+## datetime.fromtimestamp() は環境によって負のタイムスタンプを扱えないため、起点からの差分で日時に変換する
+UNIX_EPOCH = datetime.fromtimestamp(0, JST)
+
+# コメント情報のリストを JSON にシリアライズするための TypeAdapter
+__comment_responses_adapter = TypeAdapter(list[CommentResponse])
+
+# スレッドアーカイブを配信する際の Cache-Control ヘッダー
+## 終了したスレッドの内容は変化しないため、ブラウザや CDN にも 1 日キャッシュさせる
+THREAD_ARCHIVE_CACHE_CONTROL = 'public, max-age=86400'
+
+# スレッドの終了から、スレッドアーカイブを作成できるようになるまでの猶予
+## 放送終了時刻の直前に投稿されたコメントが、DB への保存や配信の途中である可能性があるため
+THREAD_ARCHIVE_DELAY = timedelta(minutes=10)
+
+# 定期的にスレッドアーカイブを作成する対象とする、終了済みスレッドの期間
+THREAD_ARCHIVE_WINDOW = timedelta(days=7)
+
+
+def ConvertThreadToThreadWithCommentsResponse(thread: Thread) -> ThreadWithCommentsResponse:
     """
+    スレッドを、コメントを空にした ThreadWithCommentsResponse に変換する
+    スレッドのステータスは現在時刻から算出する
 
-    # スレッドが存在するか確認
-    thread = await Thread.filter(id=thread_id).first()
-    if not thread:
-        raise HTTPException(status_code=404, detail='Thread not found.')
+    Args:
+        thread (Thread): スレッド
+
+    Returns:
+        ThreadWithCommentsResponse: コメントを空にしたスレッド情報
+    """
 
     # スレッドの現在のステータスを算出する
     now = timezone.now()
@@ -49,29 +93,7 @@ async def ThreadAPI(thread_id: Annotated[int, Path(description='スレッド ID
     else:
         status = 'PAST'
 
-    # スレッドの全コメントをコメ番順に取得
-    # no はほぼ id と同順（逆転ゼロ・重複 0.001%）のため、idx_thread_id_id インデックスが効く
-    # ORDER BY id に変えることで filesort が不要になり、9300 万行規模でのクエリが大幅に高速化する
-    comments = await Comment.filter(thread_id=thread.id).order_by('id').all()
-
-    # コメントを変換
-    comment_responses: list[CommentResponse] = []
-    for comment in comments:
-        comment_responses.append(CommentResponse(
-            id = comment.id,
-            thread_id = comment.thread_id,
-            no = comment.no,
-            vpos = comment.vpos,
-            date = comment.date,
-            mail = comment.mail,
-            user_id = comment.user_id,
-            premium = comment.premium,
-            anonymity = comment.anonymity,
-            content = comment.content,
-        ))
-
-    # スレッド情報とコメント情報を返す
-    thread_response = ThreadWithCommentsResponse(
+    return ThreadWithCommentsResponse(
         id = thread.id,
         channel_id = f'jk{thread.channel_id}',
         start_at = thread.start_at,
@@ -80,7 +102,179 @@ async def ThreadAPI(thread_id: Annotated[int, Path(description='スレッド ID
         title = thread.title,
         description = thread.description,
         status = status,
-        comments = comment_responses,
+        comments = [],
+    )
+
+
+async def StreamThreadWithCommentsResponse(thread_response: ThreadWithCommentsResponse) -> AsyncGenerator[bytes]:
+    """
+    スレッド情報とスレッド内の全コメントを、ThreadWithCommentsResponse と同じ形式の JSON として少しずつ生成する
+    コメントは (thread_id, id) のキーセットページネーションで THREAD_COMMENTS_CHUNK_SIZE 件ずつ取得し、取得した分だけ JSON に変換して送出する
+
+    Args:
+        thread_response (ThreadWithCommentsResponse): コメントを空にしたスレッド情報
+
+    Yields:
+        bytes: JSON の断片
+    """
+
+    # コメント以外のスレッド情報を JSON にシリアライズし、末尾の "comments":[]} を "comments":[ までに切り詰めて送出する
+    ## comments はモデルの最後のフィールドなので、シリアライズ結果は必ず ]} で終わる
+    thread_json = thread_response.model_dump_json()
+    yield thread_json[:-2].encode('utf-8')
+
+    # スレッドのコメントをコメ番順に少しずつ取得して送出する
+    ## no はほぼ id と同順（逆転ゼロ・重複 0.001%）のため、idx_thread_id_id インデックスが効く
+    ## OFFSET を使うと後半ほど読み飛ばす行数が増えるため、前回取得した最後の id より大きいものを取得するキーセットページネーションにする
+    ## Tortoise ORM のモデルインスタンスを生成するコストも大きいため、辞書として取得する
+    last_comment_id = 0
+    is_first_chunk = True
+    while True:
+        comments = await Comment.filter(thread_id=thread_response.id, id__gt=last_comment_id).order_by('id').limit(THREAD_COMMENTS_CHUNK_SIZE).values(
+            'id', 'thread_id', 'no', 'vpos', 'date', 'mail', 'user_id', 'premium', 'anonymity', 'content',
+        )
+        if len(comments) == 0:
+            break
+        last_comment_id = comments[-1]['id']
+
+        # 取得したコメントを JSON 配列としてシリアライズし、前後の [ ] を取り除いて送出する
+        comments_json = __comment_responses_adapter.dump_json(__comment_responses_adapter.validate_python(comments))
+        yield (b'' if is_first_chunk is True else b',') + comments_json[1:-1]
+        is_first_chunk = False
+
+        if len(comments) < THREAD_COMMENTS_CHUNK_SIZE:
+            break
+
+    yield b']}'
+
+
+async def GetThreadArchivableBefore() -> datetime:
+    """
+    スレッドアーカイブを作成してよいスレッドの、終了日時の上限を取得する
+    write-behind モードで DB への保存が遅れている場合 (DB 障害中など) は、保存が追いつくまで上限を過去にずらし、
+    コメントが欠けたアーカイブを作成しないようにする
+
+    Returns:
+        datetime: この日時以前に終了したスレッドのみアーカイブを作成してよい
+    """
+
+    flushed_before = datetime.fromtimestamp(await GetCommentWriteBehindFlushedBefore(), tz=JST)
+    return min(timezone.now(), flushed_before) - THREAD_ARCHIVE_DELAY
+
+
+async def ArchiveThread(thread: Thread) -> str:
+    """
+    終了したスレッドの情報と全コメントを、スレッド取得 API のレスポンスと同じ JSON として gzip で圧縮したスレッドアーカイブに書き出す
+    終了したスレッドにはコメントが追加されないため、一度書き出したアーカイブは以降変更されない
+
+    Args:
+        thread (Thread): 終了したスレッド
+
+    Returns:
+        str: 作成したスレッドアーカイブの ETag
+    """
+
+    thread_response = ConvertThreadToThreadWithCommentsResponse(thread)
+    assert thread_response.status == 'PAST', 'Only ended threads can be archived.'
+    return await WriteThreadArchive(thread.id, StreamThreadWithCommentsResponse(thread_response))
+
+
+@router.get(
+    '/threads/{thread_id}',
+    summary = 'スレッド取得 API',
+    response_description = 'スレッド情報とスレッド内の全コメント。',
+    response_model = ThreadWithCommentsResponse,
+)
+async def ThreadAPI(
+    request: Request,
+    thread_id: Annotated[int, Path(description='スレッド ID 。')],
+):
+    """
+    指定されたスレッドの情報と、スレッド内の全コメントを取得する。
+    """
+
+    # 終了したスレッドのアーカイブが作成済みなら、DB を参照せずにアーカイブをそのまま配信する
+    ## gzip に対応したクライアントには圧縮済みのファイルを Content-Encoding: gzip としてそのまま返し、
+    ## 対応していないクライアントには展開しながら返す
+    ## ETag はエンコーディングごとに別の値とし、If-None-Match に一致すれば本文を返さずに 304 を返す
+    etag = GetThreadArchiveETag(thread_id)
+    if etag is not None:
+        is_gzip_acceptable = IsGzipAcceptable(request.headers.get('Accept-Encoding', ''))
+        gzip_etag = f'"{etag}-gzip"'
+        identity_etag = f'"{etag}"'
+        headers = {
+            'Cache-Control': THREAD_ARCHIVE_CACHE_CONTROL,
+            'ETag': gzip_etag if is_gzip_acceptable is True else identity_etag,
+            'Vary': 'Accept-Encoding',
+        }
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None and IsETagMatched(if_none_match, {gzip_etag, identity_etag}) is True:
+            return Response(status_code=304, headers=headers)
+        if is_gzip_acceptable is True:
+            headers['Content-Encoding'] = 'gzip'
+            return FileResponse(GetThreadArchivePath(thread_id), media_type='application/json', headers=headers)
+        return StreamingResponse(ReadThreadArchiveDecompressed(thread_id), media_type='application/json', headers=headers)
+
+    # スレッドが存在するか確認
+    thread = await GetThread(thread_id)
+    if not thread:
+        raise HTTPException(status_code=404, detail='Thread not found.')
+
+    # スレッド情報とコメント情報を返す
+    ## スレッド内の全コメントを一度にメモリに載せないよう、コメントは取得した分から少しずつ JSON にして送出する
+    ## コメント数が数十万件あるスレッドでも、ピーク時のメモリ使用量は THREAD_COMMENTS_CHUNK_SIZE 件分程度に収まる
+    thread_response = ConvertThreadToThreadWithCommentsResponse(thread)
+    return StreamingResponse(StreamThreadWithCommentsResponse(thread_response), media_type='application/json')
+
+
+@router.get(
+    '/threads/{thread_id}/comments',
+    summary = 'スレッドコメント取得 API',
+    response_description = 'スレッド内のコメントの一部と、続きを取得するためのカーソル。',
+    response_model = ThreadCommentsResponse,
+)
+async def ThreadCommentsAPI(
+    thread_id: Annotated[int, Path(description='スレッド ID 。')],
+    from_id: Annotated[int, Query(description='この ID より後のコメントを取得する。前回のレスポンスの next_from_id を指定すると続きを取得できる。省略時は最初のコメントから取得する。', ge=0)] = 0,
+    limit: Annotated[int, Query(description=f'取得するコメントの最大件数 (最大 {THREAD_COMMENTS_MAX_LIMIT} 件) 。', ge=1, le=THREAD_COMMENTS_MAX_LIMIT)] = 1000,
+    range_type: Annotated[Literal['date', 'vpos'], Query(description='start / end で指定する範囲の種類。date ならコメント投稿日時の UNIX タイムスタンプ (秒) 、vpos ならスレッド開始からの再生位置 (10ミリ秒単位) で指定する。')] = 'date',
+    start: Annotated[float | None, Query(description='取得するコメントの範囲の開始 (この値を含む) 。省略時は範囲の開始を指定しない。', ge=THREAD_COMMENTS_RANGE_MIN, le=THREAD_COMMENTS_RANGE_MAX, allow_inf_nan=False)] = None,
+    end: Annotated[float | None, Query(description='取得するコメントの範囲の終了 (この値を含まない) 。省略時は範囲の終了を指定しない。', ge=THREAD_COMMENTS_RANGE_MIN, le=THREAD_COMMENTS_RANGE_MAX, allow_inf_nan=False)] = None,
+):
+    """
+    指定されたスレッド内のコメントを、ID 順に指定された件数ずつ取得する。<br>
+    start / end を指定すると、その範囲に投稿された (または再生位置がその範囲にある) コメントのみを取得する。<br>
+    レスポンスの next_from_id が null でなければ、その値を from_id に指定してリクエストすることで続きのコメントを取得できる。
+    """
+
+    # スレッドが存在するか確認
+    if await GetThread(thread_id) is None:
+        raise HTTPException(status_code=404, detail='Thread not found.')
+
+    # 範囲の条件を組み立てる
+    filters: dict[str, Any] = {}
+    if range_type == 'date':
+        if start is not None:
+            filters['date__gte'] = UNIX_EPOCH + timedelta(seconds=start)
+        if end is not None:
+            filters['date__lt'] = UNIX_EPOCH + timedelta(seconds=end)
+    else:
+        # vpos は整数のため、小数の境界は切り上げる (vpos >= 1.5 は vpos >= 2 、vpos < 1.5 は vpos < 2 と同じ)
+        if start is not None:
+            filters['vpos__gte'] = math.ceil(start)
+        if end is not None:
+            filters['vpos__lt'] = math.ceil(end)
+
+    # 前回取得した最後の id より大きいものを取得するキーセットページネーションで、idx_thread_id_id インデックスを使って取得する
+    ## OFFSET を使うと後半ほど読み飛ばす行数が増えるため使わない
+    ## 範囲の条件はインデックスを辿りながら適用され、limit 件に達した時点で読み取りが終わる
+    comments = await Comment.filter(thread_id=thread_id, id__gt=from_id, **filters).order_by('id').limit(limit).values(
+        'id', 'thread_id', 'no', 'vpos', 'date', 'mail', 'user_id', 'premium', 'anonymity', 'content',
     )
 
-    return thread_response
+    # limit 件ちょうど取得できた場合は続きがある可能性があるため、最後の id を次のカーソルとして返す
+    return ThreadCommentsResponse(
+        thread_id = thread_id,
+        comments = __comment_responses_adapter.validate_python(comments),
+        next_from_id = comments[-1]['id'] if len(comments) == limit else None,
+    )
@@ -3,8 +3,8 @@ import asyncio
 import json
 import random
 import time
-from dataclasses import dataclass
-from datetime import datetime
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
 from typing import Annotated, Any, cast
 
 import websockets.exceptions
@@ -19,11 +19,12 @@ from tortoise.backends.base.client import TransactionalDBClient
 from tortoise.exceptions import DoesNotExist
 
 from app import logging
+from app.config import CONFIG
 from app.constants import (
     KNOWN_JIKKYO_CHANNEL_IDS,
     REDIS_CHANNEL_THREAD_COMMENTS_PREFIX,
     REDIS_CLIENT,
-    REDIS_KEY_JIKKYO_FORCE_COUNT,
+    REDIS_KEY_THREAD_COMMENT_COUNTER,
     REDIS_KEY_VIEWER_COUNT,
 )
 from app.models.comment import (
@@ -31,13 +32,39 @@ from app.models.comment import (
     CommentCounter,
     Thread,
     XMLCompatibleCommentResponse,
-    XMLCompatibleCommentResponseChat,
 )
 from app.utils import GenerateClientID
+from app.utils.comment_binary_codec import (
+    COMMENT_BINARY_SUBPROTOCOL,
+    BuildCommentBinaryParts,
+    CommentBinaryEncoder,
+    CommentBinaryParts,
+)
 from app.utils.comment_counter_cache import (
-    GetThreadCommentCounterCache,
+    AllocateThreadCommentNumbers,
     UpdateThreadCommentCounterCache,
 )
+from app.utils.comment_post_effects import (
+    ApplyCommentPostEffects,
+    CommentPostEffectsResult,
+)
+from app.utils.comment_trace import (
+    CommentTrace,
+    DecodeCommentTraceMessage,
+    EncodeCommentTraceMessage,
+    IsCommentTraceEnabled,
+    RecordCommentTraceEnqueued,
+    RecordCommentTraceWritten,
+    StartCommentTrace,
+)
+from app.utils.comment_write_behind import (
+    ConvertCommentToWriteBehindStreamEntry,
+    GetCommentWriteBehindBacklogComments,
+)
+from app.utils.metrics import METRICS, MetricFamily, MetricSample
+from app.utils.pubsub_hub import REDIS_PUBSUB_HUB
+from app.utils.thread_cache import GetActiveThread, GetThread
+from app.utils.timer_wheel import TIMER_WHEEL
 from app.utils.transaction import (
     IsDatabaseConnectionUnavailableError,
     RunTransactionWithReconnectRetry,
@@ -50,11 +77,20 @@ router = APIRouter(
     prefix = '/api/v1',
 )
 
-# 現在アクティブなスレッドの情報を保存する辞書
-__active_threads: dict[int, Thread] = {}
+# 放送終了時に接続を切断するタイミングを分散させる幅 (秒)
+## 毎日 04:00 のスレッド切り替え時に全ての接続を一斉に切断すると、全クライアントが同時に再接続して DB に負荷が集中するため、
+## 接続ごとに 0 〜 この秒数の範囲でランダムに切断を遅らせる
+THREAD_ROLLOVER_DISCONNECT_SPREAD_SECONDS = 30.0
 
-# 接続ごとのコメント送信キューの最大サイズ
+# 接続ごとに溜めておける未送信コメントの最大数
+## これを超えて送信が遅れている接続は、古いコメントを読み飛ばして最新のコメントに追いつく
 COMMENT_QUEUE_MAX_SIZE = 200
+# スレッドごとのコメント配信用リングバッファのサイズ
+COMMENT_RING_BUFFER_SIZE = 1000
+# コメント投稿を 1 つの書き込みバッチにまとめるために待機する時間 (秒)
+COMMENT_WRITE_BATCH_WINDOW_SECONDS = 0.005
+# 1 つの書き込みバッチにまとめるコメントの最大件数
+COMMENT_WRITE_BATCH_MAX_SIZE = 100
 # unknown channel の拒否ログを集約して出力する間隔 (秒)
 UNKNOWN_CHANNEL_LOG_INTERVAL_SECONDS = 60.0
 # unknown channel ごとの拒否回数
@@ -65,113 +101,246 @@ last_unknown_channel_summary_log_time = 0.0
 unknown_channel_summary_lock = asyncio.Lock()
 
 @dataclass(slots=True)
-class CommentBroadcastMessage:
+class CommentFrame:
     """
-    Redis Pub/Sub から受信したコメントを接続ごとの送信キューに流すためのメッセージ
+    Redis Pub/Sub から受信したコメントを、全接続で共有する送信用フレームとして保持する
+    コメント 1 件ごとに 1 度だけ生成し、以降は接続数にかかわらずシリアライズし直さずにそのまま送信する
 
     Attributes:
-        raw_json (str): Redis Pub/Sub から受信した生の JSON 文字列
-        base_comment (XMLCompatibleCommentResponse): JSON をデコードしたコメントデータ
+        text (str): yourpost フラグなしのコメント JSON
+        yourpost_text (str): yourpost フラグ付きのコメント JSON (投稿者本人の接続にのみ送信する)
         user_id (str): コメント投稿者のユーザー ID
+        no (int): コメ番
+        binary_parts (CommentBinaryParts | None): バイナリ形式で送信する際の共通部分 (バイナリ形式の接続に初めて送信する際に生成される)
+        trace (CommentTrace | None): コメント遅延の計測対象としてサンプリングされたコメントの時刻の記録 (計測対象でない場合は None)
     """
 
-    raw_json: str
-    base_comment: XMLCompatibleCommentResponse
+    text: str
+    yourpost_text: str
     user_id: str
+    no: int
+    binary_parts: CommentBinaryParts | None = field(default=None, compare=False, repr=False)
+    trace: CommentTrace | None = field(default=None, compare=False, repr=False)
 
+    def getText(self, thread_key: str) -> str:
+        """
+        送信先の接続のスレッドキーに応じて、yourpost フラグ付き・なしいずれかのコメント JSON を返す
 
-@dataclass(slots=True)
-class CommentSubscriber:
-    """
-    リアルタイムコメント配信用の接続情報
+        Args:
+            thread_key (str): 送信先の接続のスレッドキー
 
-    Attributes:
-        client_id (str): コメントセッションのクライアント ID
-        thread_key (str): thread コマンドで指定された threadkey
-        queue (asyncio.Queue[CommentBroadcastMessage]): 接続ごとのコメント送信キュー
-    """
+        Returns:
+            str: 送信するコメント JSON
+        """
 
-    client_id: str
-    thread_key: str
-    queue: asyncio.Queue[CommentBroadcastMessage]
+        return self.yourpost_text if thread_key == self.user_id else self.text
+
+    def getBinaryParts(self) -> CommentBinaryParts:
+        """
+        バイナリ形式で送信する際の共通部分を返す
+        バイナリ形式の接続がない場合に無駄な処理が発生しないよう、初めて必要になった時点で JSON をデコードして生成する
+
+        Returns:
+            CommentBinaryParts: バイナリ形式で送信する際の共通部分
+        """
+
+        if self.binary_parts is None:
+            comment: XMLCompatibleCommentResponse = json.loads(self.text)
+            self.binary_parts = BuildCommentBinaryParts(comment['chat'])
+        return self.binary_parts
 
 
-def CopyXMLCompatibleCommentResponse(response: XMLCompatibleCommentResponse) -> XMLCompatibleCommentResponse:
+# 高速パスで user_id の値を切り出すための目印
+## JSON 文字列の中の " は必ず \" にエスケープされるため、この並びはコメント本文などの値の中には現れない
+COMMENT_FRAME_USER_ID_TOKEN = '"user_id":"'
+# 高速パスでコメ番を切り出すための目印
+COMMENT_FRAME_NO_TOKEN = ',"no":'
+# 高速パスで yourpost フラグが含まれていないことを確認するための目印
+COMMENT_FRAME_YOURPOST_TOKEN = '"yourpost"'
+# yourpost フラグ付きのコメント JSON を作る際に、末尾の }} の直前に挿入する文字列
+COMMENT_FRAME_YOURPOST_SUFFIX = ',"yourpost":1}}'
+
+
+def BuildCommentFrame(raw_json: str) -> CommentFrame | None:
     """
-    XMLCompatibleCommentResponse を浅くコピーして返す
+    Redis Pub/Sub から受信したコメント JSON から、全接続で共有する送信用フレームを生成する
+
+    ThreadCommentWriter が配信する {"chat":{...,"user_id":"...",...}} 形式 (コンパクトな区切り文字・yourpost フラグなし) の場合は、
+    JSON をデコードせずに文字列の切り出しと連結だけで user_id の抽出と yourpost フラグ付き JSON の生成を行う
+    それ以外の形式の場合のみ JSON をデコードし、yourpost フラグを除去した上でシリアライズし直す
 
     Args:
-        response (XMLCompatibleCommentResponse): コピー対象のコメントデータ
+        raw_json (str): Redis Pub/Sub から受信したコメント JSON
 
     Returns:
-        XMLCompatibleCommentResponse: コピーされたコメントデータ
+        CommentFrame | None: 生成した送信用フレーム (コメント JSON として不正な場合は None)
     """
 
-    copied_response = dict(response)
-    copied_response['chat'] = cast(XMLCompatibleCommentResponseChat, dict(response['chat']))
-    return cast(XMLCompatibleCommentResponse, copied_response)
+    # 高速パス: 想定どおりの形式であれば JSON をデコードしない
+    if raw_json.startswith('{"chat":{') and raw_json.endswith('}}') and COMMENT_FRAME_YOURPOST_TOKEN not in raw_json:
+        user_id_start = raw_json.find(COMMENT_FRAME_USER_ID_TOKEN)
+        no_start = raw_json.find(COMMENT_FRAME_NO_TOKEN)
+        if user_id_start != -1 and no_start != -1:
+            user_id_start += len(COMMENT_FRAME_USER_ID_TOKEN)
+            user_id_end = raw_json.find('"', user_id_start)
+            user_id = raw_json[user_id_start:user_id_end]
+            no_start += len(COMMENT_FRAME_NO_TOKEN)
+            no = raw_json[no_start:raw_json.find(',', no_start)]
+            # エスケープを含む user_id は切り出しただけでは元の値にならないため、低速パスに任せる
+            if user_id_end != -1 and '\\' not in user_id and no.isdigit() is True:
+                return CommentFrame(
+                    text = raw_json,
+                    yourpost_text = raw_json[:-2] + COMMENT_FRAME_YOURPOST_SUFFIX,
+                    user_id = user_id,
+                    no = int(no),
+                )
+
+    # 低速パス: JSON をデコードしてから送信用フレームを生成する
+    ## Redis Pub/Sub には外部から任意のメッセージを送れるため、デコード結果がコメントの形式であるかを確認してから扱う
+    try:
+        decoded_comment: Any = json.loads(raw_json)
+    except json.JSONDecodeError:
+        logging.error('BuildCommentFrame: Failed to decode comment JSON.')
+        return None
+    if not isinstance(decoded_comment, dict) or not isinstance(decoded_comment.get('chat'), dict):
+        logging.error('BuildCommentFrame: Comment JSON does not contain chat data.')
+        return None
+    base_comment = cast(XMLCompatibleCommentResponse, decoded_comment)
+
+    # yourpost が含まれている場合は非 yourpost に流れないように事前に除去する
+    base_comment['chat'].pop('yourpost', None)
+    user_id = str(base_comment['chat'].get('user_id', ''))
+    text = json.dumps(base_comment, ensure_ascii=False, separators=(',', ':'))
+    return CommentFrame(
+        text = text,
+        yourpost_text = json.dumps(SetYourPostFlag(base_comment, user_id), ensure_ascii=False, separators=(',', ':')),
+        user_id = user_id,
+        no = int(base_comment['chat'].get('no', 0)),
+    )
 
 
-def EnqueueBroadcastMessage(
-    subscriber: CommentSubscriber,
-    message: CommentBroadcastMessage,
-) -> None:
+def ConvertCommentToCommentFrame(comment: Comment) -> CommentFrame:
     """
-    接続ごとの送信キューへコメントを追加する
+    DB から取得したコメントを、全接続で共有する送信用フレームに変換する
 
     Args:
-        subscriber (CommentSubscriber): コメント送信先の接続情報
-        message (CommentBroadcastMessage): 配信するコメント
+        comment (Comment): コメント
+
+    Returns:
+        CommentFrame: 送信用フレーム
     """
 
-    if subscriber.queue.full() is True:
-        # キューが溢れそうな場合は古いコメントを捨てる
-        try:
-            subscriber.queue.get_nowait()
-        except asyncio.QueueEmpty:
-            pass
+    frame = BuildCommentFrame(json.dumps(ConvertToXMLCompatibleCommentResponse(comment), ensure_ascii=False, separators=(',', ':')))
+    return cast(CommentFrame, frame)
 
-    try:
-        subscriber.queue.put_nowait(message)
-    except asyncio.QueueFull:
-        # ここに到達するのは非常に稀だが、念のため握りつぶす
-        pass
+
+@dataclass(slots=True)
+class CommentSubscriber:
+    """
+    リアルタイムコメント配信用の接続情報
+
+    Attributes:
+        client_id (str): コメントセッションのクライアント ID
+        thread_key (str): thread コマンドで指定された threadkey
+        cursor (int): 次に送信するコメントの、Broadcaster のリングバッファ上の通し番号
+        dropped_count (int): 送信が追いつかずに読み飛ばしたコメントの数
+    """
+
+    client_id: str
+    thread_key: str
+    cursor: int = 0
+    dropped_count: int = 0
 
 
 class ThreadCommentBroadcaster:
     """
-    スレッド単位で Redis Pub/Sub を購読し、接続ごとの送信キューにコメントを配信する
+    スレッド単位で Redis Pub/Sub から受信したコメントを、全接続で共有するリングバッファ経由で配信する
+    Redis Pub/Sub の購読自体はプロセスごとに 1 つの RedisPubSubHub がまとめて行い、このスレッドのコメントだけが dispatch() に渡される
+
+    接続ごとに送信キューを持つと、コメント 1 件ごとに接続数分のキュー操作が発生してしまう
+    コメントはスレッドごとに 1 つのリングバッファに追記するだけにして、各接続は自分の読み出し位置 (cursor) から
+    リングバッファを読み進めることで、配信側のコストを接続数によらず一定にする
+
+    リングバッファは放送中スレッドの直近のコメントのキャッシュも兼ねており、thread コマンドの res_from に応じた初回取得コメントは
+    (初回のみ DB から直近のコメントを読み込んだ上で) 可能な限りリングバッファから返す
+    そのため、接続がなくなっても放送中のスレッドの Broadcaster は破棄せずに受信を続け、放送終了後に破棄する
     """
 
-    def __init__(self, thread_id: int) -> None:
+    def __init__(self, thread_id: int, end_timestamp: float) -> None:
         """
         Args:
             thread_id (int): コメント配信対象のスレッド ID
+            end_timestamp (float): スレッドの放送終了時刻 (UNIX タイムスタンプ)
         """
 
         self.thread_id = thread_id
+        self.end_timestamp = end_timestamp
+        self.channel = f'{REDIS_CHANNEL_THREAD_COMMENTS_PREFIX}:{thread_id}'
         self.subscribers: dict[str, CommentSubscriber] = {}
         self.lock = asyncio.Lock()
-        self._run_task: asyncio.Task[None] | None = None
+        # コメントの送信用フレームを保持するリングバッファ
+        ## 通し番号 sequence のフレームは ring[sequence % COMMENT_RING_BUFFER_SIZE] に格納される
+        self.ring: list[CommentFrame | None] = [None] * COMMENT_RING_BUFFER_SIZE
+        # 次にリングバッファに追記するフレームの通し番号
+        self.next_sequence = 0
+        # リングバッファに格納されている最も古いフレームの通し番号
+        ## DB から読み込んだ直近のコメントは、受信済みのフレームより前 (負の通し番号を含む) に格納される
+        self.first_sequence = 0
+        # DB から読み込んだ時点で、スレッドの全コメントがリングバッファに収まっていたかどうか
+        self.is_complete = False
+        # DB から読み込んだコメントのコメ番のうち、まだ Redis Pub/Sub から受信していないもの
+        ## DB への保存後・配信前に読み込んだコメントは後から dispatch() にも届くため、二重に格納しないよう除外に使う
+        self.seeded_comment_nos: set[int] = set()
+        # 購読ハブからコメントを受け取っているかどうか
+        self.is_receiving = False
+        # DB から直近のコメントを読み込むタスク (複数の接続から同時に要求されても 1 回だけ実行する)
+        self._seed_task: asyncio.Task[None] | None = None
+        # 送信が追いつかずに読み飛ばされたコメントの延べ数
+        self.dropped_count = 0
+        # 新しいフレームが追記されたことを待機中の全接続に知らせるイベント
+        ## 追記のたびに set() した上で新しいイベントに差し替えることで、clear() のタイミングを気にせずに済むようにする
+        self._new_frame_event = asyncio.Event()
+        # スレッドの放送終了時刻を過ぎたかどうか
+        self.is_ended = False
+        # 放送終了時刻に待機中の全接続を起床させるタイマー
+        ## 接続ごとに定期的に起床して放送終了時刻を確認する代わりに、スレッドごとに 1 つだけタイマーホイールに登録する
+        self._end_timer = TIMER_WHEEL.schedule(end_timestamp, self._end)
+
+    def startReceiving(self) -> None:
+        """
+        このスレッドのコメントを受け取れるよう、購読ハブにハンドラを登録する
+        """
 
-    async def addSubscriber(self, subscriber_id: str, subscriber: CommentSubscriber) -> None:
+        if self.is_receiving is False:
+            REDIS_PUBSUB_HUB.addHandler(self.channel, self.dispatch)
+            self.is_receiving = True
+
+    def stopReceiving(self) -> None:
+        """
+        購読ハブからハンドラを削除し、このスレッドのコメントの受信を停止する
+        """
+
+        if self.is_receiving is True:
+            REDIS_PUBSUB_HUB.removeHandler(self.channel, self.dispatch)
+            self.is_receiving = False
+
+    async def addSubscriber(self, subscriber_id: str, subscriber: CommentSubscriber, start_sequence: int | None = None) -> None:
         """
         コメント配信対象の接続を追加する
 
         Args:
             subscriber_id (str): 接続を識別する ID
             subscriber (CommentSubscriber): 追加する接続情報
+            start_sequence (int | None, optional): 最初に配信するフレームの通し番号 (省略時は登録した時点以降に届いたコメントから配信する). Defaults to None.
         """
 
         # 接続一覧は複数タスクから同時に更新されるためロックで保護する
         async with self.lock:
             # 接続情報を登録する
+            ## getRecentFrames() で初回取得コメントを返した接続は、その続きの通し番号から配信することで取りこぼしをなくす
+            subscriber.cursor = start_sequence if start_sequence is not None else self.next_sequence
             self.subscribers[subscriber_id] = subscriber
-            # 配信タスクが未起動または終了済みなら新しいタスクを開始する
-            # _run_task.done() は正常終了・例外終了・キャンセル済みのいずれも True を返す
-            ## これにより、_run() が予期せぬ例外で終了した場合でも、次の購読者追加時に自動的に再起動される
-            if self._run_task is None or self._run_task.done():
-                self._run_task = asyncio.create_task(self._run())
+            self.startReceiving()
 
     async def removeSubscriber(self, subscriber_id: str, subscriber: CommentSubscriber) -> None:
         """
@@ -183,20 +352,11 @@ class ThreadCommentBroadcaster:
         """
 
         # 接続一覧は複数タスクから同時に更新されるためロックで保護する
-        # タスクのキャンセルと待機もロック内で行い、レースコンディションを防ぐ
-        ## キャンセルされたタスクは即座に終了するため、ロック内での await でもデッドロックは発生しない
         async with self.lock:
             # 接続が登録されている場合のみ削除する
+            ## 接続がなくなってもリングバッファを最新に保つため、コメントの受信は続ける
             if subscriber_id in self.subscribers and self.subscribers[subscriber_id] is subscriber:
                 del self.subscribers[subscriber_id]
-            # 接続が存在しなくなった場合は配信タスクを停止する
-            if len(self.subscribers) == 0 and self._run_task is not None:
-                self._run_task.cancel()
-                try:
-                    await self._run_task
-                except asyncio.CancelledError:
-                    pass
-                self._run_task = None
 
     async def getSubscriberCount(self) -> int:
         """
@@ -210,155 +370,947 @@ class ThreadCommentBroadcaster:
         async with self.lock:
             return len(self.subscribers)
 
-    async def _getSubscriberSnapshot(self) -> list[CommentSubscriber]:
+    def getOldestSequence(self) -> int:
         """
-        コメント配信対象の接続一覧をスナップショットとして取得する
+        リングバッファから読み出せる最も古いフレームの通し番号を取得する
 
         Returns:
-            list[CommentSubscriber]: コメント配信対象の接続一覧
+            int: 読み出せる最も古いフレームの通し番号
         """
 
-        # 配信時は現在の接続一覧のスナップショットを使う
-        ## 配信中に接続一覧が変わっても影響しないようにする
-        async with self.lock:
-            return list(self.subscribers.values())
+        return max(self.first_sequence, self.next_sequence - COMMENT_RING_BUFFER_SIZE)
+
+    async def getRecentFrames(self, count: int) -> tuple[list[CommentFrame], int] | None:
+        """
+        リングバッファから直近 count 件のコメントのフレームを取得する
+        初回のみ DB から直近のコメントをリングバッファに読み込む
+
+        Args:
+            count (int): 取得するコメントの数
+
+        Returns:
+            tuple[list[CommentFrame], int] | None: 取得したフレーム (古い順) と、その続きのフレームの通し番号
+                リングバッファに十分な数のコメントがない場合は None (呼び出し元で DB から取得する)
+        """
+
+        try:
+            await self.ensureSeeded()
+        except Exception as ex:
+            logging.warning(f'ThreadCommentBroadcaster: Failed to load recent comments. thread_id: {self.thread_id}', exc_info=ex)
+            return None
+
+        # ここから先は await を挟まないため、取得したフレームと続きの通し番号の間にコメントが割り込むことはない
+        oldest_sequence = self.getOldestSequence()
+        if count > self.next_sequence - oldest_sequence:
+            # スレッドの全コメントがリングバッファに収まっていて、まだ 1 件も溢れていない場合に限り、
+            # count 件に満たなくてもスレッドの全コメントとしてそのまま返せる
+            if self.is_complete is False or oldest_sequence != self.first_sequence:
+                return None
+
+        frames = [
+            cast(CommentFrame, self.ring[sequence % COMMENT_RING_BUFFER_SIZE])
+            for sequence in range(max(oldest_sequence, self.next_sequence - count), self.next_sequence)
+        ]
+        return frames, self.next_sequence
+
+    async def ensureSeeded(self) -> None:
+        """
+        DB からスレッドの直近のコメントをリングバッファに読み込む (読み込み済みの場合は何もしない)
+        """
+
+        self.startReceiving()
+        # 読み込みに失敗した場合は、次に呼び出されたときに読み込み直す
+        if self._seed_task is None or (self._seed_task.done() is True and (self._seed_task.cancelled() is True or self._seed_task.exception() is not None)):
+            self._seed_task = asyncio.create_task(self._seed())
+        # 呼び出し元の接続が切断されてキャンセルされても、他の接続が待っている読み込みは止めない
+        await asyncio.shield(self._seed_task)
+
+    async def _seed(self) -> None:
+        """
+        DB からスレッドの直近のコメントを取得し、受信済みのフレームより前に格納する
+        write-behind モードでは、配信済みでまだ DB に保存されていないコメントも Redis Stream から取得して合わせて格納する
+        """
+
+        # write-behind モードでは、受信を開始する前に配信されたコメントが DB にもリングバッファにも存在しない場合がある
+        ## Redis Stream のエントリは DB への保存が完了してから削除されるため、先に Redis Stream を読み出してから DB を参照すれば、
+        ## その間に保存されたコメントも DB 側から取得でき、どちらからも漏れるコメントは生じない
+        backlog_comments: list[Comment] = []
+        if CONFIG.COMMENT_WRITE_BEHIND is True:
+            backlog_comments = await GetCommentWriteBehindBacklogComments(self.thread_id, COMMENT_RING_BUFFER_SIZE)
+
+        comments = await Comment.filter(thread_id=self.thread_id).order_by('-id').limit(COMMENT_RING_BUFFER_SIZE)
+        comments.reverse()
+
+        # Redis Stream と DB の両方から取得したコメント (読み出しの間に保存されたもの) は 1 件にまとめ、コメ番順に並べ直す
+        if len(backlog_comments) > 0:
+            comment_map = {comment.no: comment for comment in comments}
+            for backlog_comment in backlog_comments:
+                comment_map.setdefault(backlog_comment.no, backlog_comment)
+            comments = sorted(comment_map.values(), key=lambda comment: comment.no)[-COMMENT_RING_BUFFER_SIZE:]
+
+        # DB からの取得中に受信したフレームと重複するコメントは除外する
+        oldest_sequence = self.getOldestSequence()
+        received_comment_nos = {
+            cast(CommentFrame, self.ring[sequence % COMMENT_RING_BUFFER_SIZE]).no
+            for sequence in range(oldest_sequence, self.next_sequence)
+        }
+        seed_frames = [ConvertCommentToCommentFrame(comment) for comment in comments if comment.no not in received_comment_nos]
+        # まだ受信していないコメントは、この後 dispatch() に届いた時点で除外する
+        self.seeded_comment_nos = {seed_frame.no for seed_frame in seed_frames}
+
+        # 受信済みのフレームを上書きしないよう、リングバッファの空きに収まる分だけ格納する
+        room = COMMENT_RING_BUFFER_SIZE - (self.next_sequence - oldest_sequence)
+        if len(seed_frames) > room:
+            seed_frames = seed_frames[len(seed_frames) - room:] if room > 0 else []
+            self.is_complete = False
+        else:
+            self.is_complete = len(comments) < COMMENT_RING_BUFFER_SIZE
+        self.first_sequence = oldest_sequence - len(seed_frames)
+        for index, seed_frame in enumerate(seed_frames):
+            self.ring[(self.first_sequence + index) % COMMENT_RING_BUFFER_SIZE] = seed_frame
+
+    async def waitForFrames(self, subscriber: CommentSubscriber) -> bool:
+        """
+        接続がまだ読み出していないフレームがリングバッファに追記されるか、スレッドの放送終了時刻を過ぎるまで待機する
+        タイムアウトはなく、コメントが来ない間は放送終了時刻まで一切起床しない
+
+        Args:
+            subscriber (CommentSubscriber): 待機する接続
+
+        Returns:
+            bool: 読み出していないフレームがある場合は True、読み出していないフレームがないまま放送終了時刻を過ぎた場合は False
+        """
+
+        while subscriber.cursor >= self.next_sequence:
+            if self.is_ended is True:
+                return False
+            await self._new_frame_event.wait()
+        return True
+
+    def readFrames(self, subscriber: CommentSubscriber) -> list[CommentFrame]:
+        """
+        接続がまだ読み出していないフレームをリングバッファから全て取り出し、読み出し位置を進める
+        送信が追いつかずに COMMENT_QUEUE_MAX_SIZE 件以上遅れている場合は、古いフレームを読み飛ばして最新のフレームに追いつく
+
+        Args:
+            subscriber (CommentSubscriber): 読み出す接続
+
+        Returns:
+            list[CommentFrame]: 取り出したフレーム (古い順)
+        """
+
+        oldest_readable_sequence = max(self.getOldestSequence(), self.next_sequence - COMMENT_QUEUE_MAX_SIZE)
+        if subscriber.cursor < oldest_readable_sequence:
+            dropped_count = oldest_readable_sequence - subscriber.cursor
+            subscriber.dropped_count += dropped_count
+            self.dropped_count += dropped_count
+            METRICS.increment('nx_jikkyo_comment_ring_dropped_comments_total', dropped_count)
+            subscriber.cursor = oldest_readable_sequence
+
+        frames = [
+            cast(CommentFrame, self.ring[sequence % COMMENT_RING_BUFFER_SIZE])
+            for sequence in range(subscriber.cursor, self.next_sequence)
+        ]
+        subscriber.cursor = self.next_sequence
+        return frames
+
+    def dispatch(self, raw_json: str) -> None:
+        """
+        購読ハブから渡されたコメントをリングバッファに追記し、待機中の全接続に知らせる
+        購読ハブの受信タスク内で同期的に呼び出されるため、await を伴う処理を行ってはならない
+
+        Args:
+            raw_json (str): Redis Pub/Sub から受信したコメント JSON
+        """
+
+        # コメント遅延の計測対象としてサンプリングされたコメントには、各段階の時刻を格納した接頭辞が付いている
+        ## コメント JSON は必ず { から始まるため、それ以外の文字から始まる場合のみ接頭辞を取り除く
+        trace: CommentTrace | None = None
+        if raw_json.startswith('{') is False:
+            trace, raw_json = DecodeCommentTraceMessage(raw_json)
+
+        # 全接続で共有する送信用フレームをコメント 1 件につき 1 度だけ生成する
+        ## yourpost フラグ付き・なしの両方をここで用意しておくことで、接続ごとのシリアライズを不要にする
+        comment_frame = BuildCommentFrame(raw_json)
+        if comment_frame is None:
+            return
+
+        # DB から読み込んでリングバッファに格納済みのコメントは二重に追記しない
+        ## 同じコメントが 2 回配信されることはないため、一度除外したコメ番は以降の比較対象から外す
+        if comment_frame.no in self.seeded_comment_nos:
+            self.seeded_comment_nos.discard(comment_frame.no)
+            return
+
+        # リングバッファに追記し、待機中の全接続を一度に起床させる
+        ## 接続数にかかわらず、ここでの処理は追記 1 回とイベントの差し替え 1 回だけで済む
+        self.ring[self.next_sequence % COMMENT_RING_BUFFER_SIZE] = comment_frame
+        self.next_sequence += 1
+        if trace is not None:
+            comment_frame.trace = trace
+            RecordCommentTraceEnqueued(trace)
+        self._wakeSubscribers()
+
+    def _end(self) -> None:
+        """
+        スレッドの放送終了時刻にタイマーホイールから呼び出され、待機中の全接続を起床させて放送終了を知らせる
+        """
+
+        self.is_ended = True
+        self._wakeSubscribers()
+
+    def _wakeSubscribers(self) -> None:
+        """
+        waitForFrames() で待機中の全接続を一度に起床させる
+        """
+
+        new_frame_event = self._new_frame_event
+        self._new_frame_event = asyncio.Event()
+        new_frame_event.set()
+
+
+# スレッド単位のコメント配信用 Broadcaster を保存する辞書
+__thread_comment_broadcasters: dict[int, ThreadCommentBroadcaster] = {}
+__thread_comment_broadcasters_lock = asyncio.Lock()
+
+
+async def GetThreadCommentBroadcaster(thread: Thread) -> ThreadCommentBroadcaster:
+    """
+    スレッド単位のコメント配信用 Broadcaster を取得する
+
+    Args:
+        thread (Thread): コメント配信対象のスレッド
+
+    Returns:
+        ThreadCommentBroadcaster: スレッド単位のコメント配信用 Broadcaster
+    """
+
+    async with __thread_comment_broadcasters_lock:
+        broadcaster = __thread_comment_broadcasters.get(thread.id)
+        if broadcaster is None:
+            # 放送が終わったスレッドの Broadcaster が溜まり続けないよう、接続がないものは破棄する
+            current_time = time.time()
+            for existing_thread_id, existing_broadcaster in list(__thread_comment_broadcasters.items()):
+                if len(existing_broadcaster.subscribers) == 0 and existing_broadcaster.end_timestamp < current_time:
+                    existing_broadcaster.stopReceiving()
+                    del __thread_comment_broadcasters[existing_thread_id]
+            broadcaster = ThreadCommentBroadcaster(thread.id, thread.end_at.timestamp())
+            __thread_comment_broadcasters[thread.id] = broadcaster
+        return broadcaster
+
+
+async def CleanupThreadCommentBroadcaster(thread_id: int, broadcaster: ThreadCommentBroadcaster) -> None:
+    """
+    接続が存在せず、放送も終了したスレッドの Broadcaster を辞書から削除する
+    放送中のスレッドの Broadcaster は、直近のコメントのキャッシュとして接続がなくても残しておく
+
+    Args:
+        thread_id (int): 対象のスレッド ID
+        broadcaster (ThreadCommentBroadcaster): 対象の Broadcaster
+    """
+
+    # デッドロックを防ぐため、ロック取得順序を固定する
+    # 常に __thread_comment_broadcasters_lock → broadcaster.lock の順で取得する
+    ## getSubscriberCount() は内部で broadcaster.lock を取得するため、
+    ## __thread_comment_broadcasters_lock を保持した状態で呼び出すとネストされたロックになる
+    ## そのため、ここでは直接 subscribers の長さを確認してデッドロックを回避する
+    async with __thread_comment_broadcasters_lock:
+        current_broadcaster = __thread_comment_broadcasters.get(thread_id)
+        if current_broadcaster is not broadcaster:
+            return
+        # broadcaster.lock を取得して購読者数を確認し、0 かつ放送終了後なら削除する
+        async with broadcaster.lock:
+            if len(broadcaster.subscribers) == 0 and broadcaster.end_timestamp < time.time():
+                broadcaster.stopReceiving()
+                del __thread_comment_broadcasters[thread_id]
+
+
+@dataclass(slots=True)
+class PendingComment:
+    """
+    ThreadCommentWriter の書き込み待ちキューに積まれた、投稿待ちのコメント
+
+    Attributes:
+        vpos (int): スレッド開始からのコメントの再生位置 (10ミリ秒単位)
+        mail (str): コメントコマンド (空白区切り)
+        user_id (str): コメント投稿者のユーザー ID
+        premium (bool): コメント投稿者がプレミアム会員かどうか
+        anonymity (bool): 匿名コメントかどうか
+        content (str): コメント本文
+        date (datetime): コメント投稿日時
+        future (asyncio.Future[Comment]): 書き込み完了時に保存済みのコメントがセットされる Future
+        trace (CommentTrace | None): コメント遅延の計測対象としてサンプリングされたコメントの時刻の記録 (計測対象でない場合は None)
+    """
+
+    vpos: int
+    mail: str
+    user_id: str
+    premium: bool
+    anonymity: bool
+    content: str
+    date: datetime
+    future: asyncio.Future[Comment]
+    trace: CommentTrace | None = None
+
+
+class ThreadCommentWriter:
+    """
+    スレッド単位でコメント投稿をまとめ、1 トランザクションで採番と INSERT を行う書き込みパイプライン
+
+    コメントごとに採番テーブルの行ロックを取り合うと、盛り上がっている時間帯ほどロック待ちで投稿が詰まる
+    数ミリ秒以内に届いた投稿を 1 つのバッチにまとめ、max_no = max_no + N の 1 回の UPDATE で N 件分のコメ番を確保し、
+    複数行 INSERT で一括保存することで、負荷が高いほど 1 トランザクションあたりの処理件数が増えるようにする
+    write-behind モード (COMMENT_WRITE_BEHIND) では DB への保存を待たずに配信し、保存は Redis Stream 経由で後から行う
+    """
+
+    def __init__(self, thread_id: int, channel_id: str) -> None:
+        """
+        Args:
+            thread_id (int): コメント投稿対象のスレッド ID
+            channel_id (str): 実況チャンネル ID (ex: jk211 / ログ出力と実況勢いカウントに使う)
+        """
+
+        self.thread_id = thread_id
+        self.channel_id = channel_id
+        self.pending_comments: list[PendingComment] = []
+        self._run_task: asyncio.Task[None] | None = None
+
+    def isRunning(self) -> bool:
+        """
+        書き込みタスクが実行中かどうかを返す
+
+        Returns:
+            bool: 書き込みタスクが実行中なら True
+        """
+
+        return self._run_task is not None and self._run_task.done() is False
+
+    async def postComment(
+        self,
+        vpos: int,
+        mail: str,
+        user_id: str,
+        anonymity: bool,
+        content: str,
+        premium: bool = False,
+        date: datetime | None = None,
+    ) -> Comment:
+        """
+        コメントを書き込み待ちキューに追加し、DB への保存と Redis Pub/Sub への配信が完了するまで待機する
+
+        Args:
+            vpos (int): スレッド開始からのコメントの再生位置 (10ミリ秒単位)
+            mail (str): コメントコマンド (空白区切り)
+            user_id (str): コメント投稿者のユーザー ID
+            anonymity (bool): 匿名コメントかどうか
+            content (str): コメント本文
+            premium (bool, optional): コメント投稿者がプレミアム会員かどうか. Defaults to False.
+            date (datetime | None, optional): コメント投稿日時 (省略時は受け付けた時点の時刻). Defaults to None.
+
+        Returns:
+            Comment: 保存されたコメント
+        """
+
+        pending_comment = PendingComment(
+            vpos = vpos,
+            mail = mail,
+            user_id = user_id,
+            premium = premium,
+            anonymity = anonymity,
+            content = content,
+            # バッチ内の待ち時間でコメント投稿日時がずれないよう、受け付けた時点の時刻を採用する
+            date = date if date is not None else timezone.now(),
+            future = asyncio.get_running_loop().create_future(),
+            # コメント遅延の計測対象に選ばれた場合は、受け付けた時点から時刻の記録を始める
+            trace = StartCommentTrace(),
+        )
+        self.pending_comments.append(pending_comment)
+
+        # 書き込みタスクが未起動または終了済みなら新しいタスクを開始する
+        ## 書き込み待ちのコメントがなくなると書き込みタスクは自動的に終了する
+        if self.isRunning() is False:
+            self._run_task = asyncio.create_task(self._run())
+
+        return await pending_comment.future
+
+    async def _run(self) -> None:
+        """
+        書き込み待ちキューに溜まったコメントを、バッチ単位で DB に保存して Redis Pub/Sub へ配信する
+        """
+
+        while len(self.pending_comments) > 0:
+
+            # 数ミリ秒だけ待ち、その間に届いた他の投稿を同じバッチにまとめる
+            await asyncio.sleep(COMMENT_WRITE_BATCH_WINDOW_SECONDS)
+
+            # 1 トランザクションが長くなりすぎないよう、1 バッチの件数には上限を設ける
+            batch = self.pending_comments[:COMMENT_WRITE_BATCH_MAX_SIZE]
+            del self.pending_comments[:COMMENT_WRITE_BATCH_MAX_SIZE]
+
+            await self._writeBatch(batch)
+
+    async def _writeBatch(self, batch: list[PendingComment], allocated_first_no: int | None = None) -> None:
+        """
+        バッチを DB に保存して Redis Pub/Sub へ配信し、結果を待機中の投稿者に返す
+
+        Args:
+            batch (list[PendingComment]): 保存するコメントのバッチ
+            allocated_first_no (int | None, optional): Redis 採番モードで確保済みの、バッチの先頭のコメントに割り当てるコメ番 (未確保なら None). Defaults to None.
+        """
+
+        # write-behind モードでは DB への保存を待たずにコメ番だけを確保し、すぐに配信する
+        ## DB への保存は Redis Stream 経由でメインサーバープロセスの書き込みタスクが後から行う
+        if CONFIG.COMMENT_WRITE_BEHIND is True:
+            try:
+                first_no = await AllocateThreadCommentNumbers(self.thread_id, len(batch)) - len(batch) + 1
+                comments = self._buildComments(batch, first_no)
+                self._markCommitted(batch)
+                await self._publishBatch(batch, comments)
+            except Exception as ex:
+                self._reject(batch, ex)
+                return
+            self._resolve(batch, comments)
+            return
+
+        # Redis 採番モードでは、トランザクションの外で Redis 上のカウンタからコメ番を確保する
+        ## 採番テーブルの UPDATE / SELECT が不要になり、トランザクション内では INSERT のみを実行する
+        ## 採番テーブルへはメインサーバープロセスがバックグラウンドでまとめて書き戻す
+        if allocated_first_no is None and CONFIG.COMMENT_NO_ALLOCATOR == 'Redis':
+            try:
+                allocated_first_no = await AllocateThreadCommentNumbers(self.thread_id, len(batch)) - len(batch) + 1
+            except Exception as ex:
+                self._reject(batch, ex)
+                return
+
+        try:
+            comments = await self._persistBatch(batch, allocated_first_no)
+        except Exception as ex:
+            # DB ダウン以外の理由でバッチが失敗した場合、不正な投稿 1 件がバッチ全体を巻き込んでいる可能性がある
+            ## トランザクションはロールバック済みなので、1 件ずつ書き込み直して問題のある投稿だけを失敗させる
+            ## Redis 採番モードで確保済みのコメ番は取り消せないため、採番し直さずに同じコメ番で書き込み直し、コメ番の欠番を防ぐ
+            if len(batch) > 1 and IsDatabaseConnectionUnavailableError(ex) is False:
+                for index, pending_comment in enumerate(batch):
+                    await self._writeBatch(
+                        [pending_comment],
+                        allocated_first_no + index if allocated_first_no is not None else None,
+                    )
+                return
+            # バッチ全体が失敗した場合は、待機中の全投稿者に同じ例外を返す
+            ## 投稿者側で従来どおりエラーログの出力とエラーレスポンスの送信が行われる
+            self._reject(batch, ex)
+            return
+        self._markCommitted(batch)
+
+        try:
+            await self._publishBatch(batch, comments)
+        except Exception as ex:
+            # 保存済みのコメントを再度書き込むと重複してしまうため、配信失敗はそのまま投稿者に返す
+            self._reject(batch, ex)
+            return
+
+        self._resolve(batch, comments)
+
+    @staticmethod
+    def _resolve(batch: list[PendingComment], comments: list[Comment]) -> None:
+        """
+        待機中の投稿者それぞれに保存済みのコメントを返す
+
+        Args:
+            batch (list[PendingComment]): 保存したコメントのバッチ
+            comments (list[Comment]): 保存されたコメント (バッチと同じ順序)
+        """
+
+        # 投稿者側のタスクが切断でキャンセルされている場合は Future も done になっているため何もしない
+        for pending_comment, comment in zip(batch, comments):
+            if pending_comment.future.done() is False:
+                pending_comment.future.set_result(comment)
+
+    @staticmethod
+    def _markCommitted(batch: list[PendingComment]) -> None:
+        """
+        コメント遅延の計測対象のコメントに、採番と DB への保存 (write-behind モードでは採番のみ) が完了した時刻を記録する
+
+        Args:
+            batch (list[PendingComment]): 保存したコメントのバッチ
+        """
+
+        committed_at = time.monotonic()
+        for pending_comment in batch:
+            if pending_comment.trace is not None:
+                pending_comment.trace.committed_at = committed_at
+
+    @staticmethod
+    def _reject(batch: list[PendingComment], exception: Exception) -> None:
+        """
+        待機中の投稿者全員に書き込み失敗の例外を返す
+
+        Args:
+            batch (list[PendingComment]): 保存に失敗したコメントのバッチ
+            exception (Exception): 発生した例外
+        """
+
+        for pending_comment in batch:
+            if pending_comment.future.done() is False:
+                pending_comment.future.set_exception(exception)
+
+    def _buildComments(self, batch: list[PendingComment], first_no: int) -> list[Comment]:
+        """
+        バッチ内の順序 (= 受け付け順) どおりにコメ番を割り当て、未保存のコメントを作成する
+
+        Args:
+            batch (list[PendingComment]): コメントのバッチ
+            first_no (int): バッチの先頭のコメントに割り当てるコメ番
+
+        Returns:
+            list[Comment]: 未保存のコメント (バッチと同じ順序)
+        """
+
+        return [
+            Comment(
+                thread_id = self.thread_id,
+                no = first_no + index,
+                vpos = pending_comment.vpos,
+                date = pending_comment.date,
+                mail = pending_comment.mail,
+                user_id = pending_comment.user_id,
+                premium = pending_comment.premium,
+                anonymity = pending_comment.anonymity,
+                content = pending_comment.content,
+            )
+            for index, pending_comment in enumerate(batch)
+        ]
+
+    async def _persistBatch(self, batch: list[PendingComment], allocated_first_no: int | None) -> list[Comment]:
+        """
+        バッチ内のコメントを 1 トランザクションで採番・保存する
+
+        Args:
+            batch (list[PendingComment]): 保存するコメントのバッチ
+            allocated_first_no (int | None): Redis 採番モードで確保済みの、バッチの先頭のコメントに割り当てるコメ番 (None なら採番テーブルで採番する)
+
+        Returns:
+            list[Comment]: 保存されたコメント (バッチと同じ順序)
+        """
+
+        async def CreateCommentsInTransaction(connection: TransactionalDBClient) -> list[Comment]:
+
+            if allocated_first_no is not None:
+                first_no = allocated_first_no
+            else:
+                # 採番テーブルに記録されたコメ番をバッチの件数分だけまとめてインクリメント
+                await connection.execute_query(
+                    'UPDATE comment_counters SET max_no = max_no + %s WHERE thread_id = %s',
+                    [len(batch), self.thread_id]
+                )
+                # インクリメント後のコメ番を取得
+                ## 採番テーブルの行ロックはトランザクション終了まで保持されるため、
+                ## (取得した値 - 件数 + 1) 〜 取得した値 のコメ番はこのバッチが専有できる
+                new_no_result = await connection.execute_query_dict(
+                    'SELECT max_no FROM comment_counters WHERE thread_id = %s',
+                    [self.thread_id]
+                )
+                first_no = new_no_result[0]['max_no'] - len(batch) + 1
+
+            # 新しいコメントを作成し、複数行 INSERT で一括保存する
+            comments = self._buildComments(batch, first_no)
+            await Comment.bulk_create(comments, using_db=connection)
+            return comments
+
+        # コメントを DB に登録
+        return await RunTransactionWithReconnectRetry(
+            operation = CreateCommentsInTransaction,
+            operation_name = f'ThreadCommentWriter [{self.channel_id}]',
+        )
+
+    async def _publishBatch(self, batch: list[PendingComment], comments: list[Comment]) -> CommentPostEffectsResult:
+        """
+        保存済みのコメントを Redis Pub/Sub へ配信し、最新コメ番キャッシュと実況勢いカウントを更新する
+        write-behind モードでは、未保存のコメントを DB 書き込み待ちの Redis Stream にも追加する
+
+        Args:
+            batch (list[PendingComment]): 保存したコメントのバッチ
+            comments (list[Comment]): 保存済み (write-behind モードでは採番済み・未保存) のコメント (バッチと同じ順序 = コメ番順)
+
+        Returns:
+            CommentPostEffectsResult: 更新後の最新コメ番と、配信したメッセージを受信したサーバープロセス数
+        """
+
+        # ニコ生 XML 互換コメント形式に変換した上で、Redis Pub/Sub でコメントを送信
+        ## この段階ではまだ yourpost フラグを設定してはならない
+        ## yourpost フラグはコメントセッション WebSocket 側で設定しないと、意図しないコメントに yourpost フラグが付与されてしまう
+        ## 最新コメ番キャッシュの更新・配信・実況勢いカウントの更新は、Lua script で 1 回の往復にまとめて実行する
+        ## 最新コメ番キャッシュはバッチ内の最大コメ番で 1 回だけ更新すれば十分で、Redis 採番モードでは採番の時点で更新済みなので不要
+        ## 区切り文字をコンパクトにしておくと、受信側の BuildCommentFrame() が JSON をデコードせずに送信用フレームを生成できる
+        messages = [
+            json.dumps(ConvertToXMLCompatibleCommentResponse(comment), ensure_ascii=False, separators=(',', ':'))
+            for comment in comments
+        ]
+
+        # コメント遅延の計測対象のコメントには、受け付け・DB 保存完了・配信の時刻を格納した接頭辞を付けて配信する
+        published_at = time.monotonic()
+        for index, pending_comment in enumerate(batch):
+            if pending_comment.trace is not None:
+                pending_comment.trace.published_at = published_at
+                messages[index] = EncodeCommentTraceMessage(pending_comment.trace, messages[index])
+
+        return await ApplyCommentPostEffects(
+            thread_id = self.thread_id,
+            channel_id = self.channel_id,
+            comment_nos = [comment.no for comment in comments],
+            messages = messages,
+            current_time = time.time(),
+            should_update_counter = CONFIG.COMMENT_NO_ALLOCATOR != 'Redis',
+            write_behind_entries = [
+                ConvertCommentToWriteBehindStreamEntry(comment) for comment in comments
+            ] if CONFIG.COMMENT_WRITE_BEHIND is True else None,
+        )
+
+
+# スレッド単位のコメント書き込みパイプラインを保存する辞書
+## 書き込みパイプラインはスレッドごとに使い回し、新しいスレッドの書き込みパイプラインを作成する際に、
+## 書き込み待ちのコメントがなく書き込みタスクも動作していないもの (放送が終わったスレッドなど) を破棄する
+__thread_comment_writers: dict[int, ThreadCommentWriter] = {}
+
+
+def GetThreadCommentWriter(thread_id: int, channel_id: str) -> ThreadCommentWriter:
+    """
+    スレッド単位のコメント書き込みパイプラインを取得する
+
+    Args:
+        thread_id (int): コメント投稿対象のスレッド ID
+        channel_id (str): 実況チャンネル ID (ex: jk211)
+
+    Returns:
+        ThreadCommentWriter: スレッド単位のコメント書き込みパイプライン
+    """
+
+    writer = __thread_comment_writers.get(thread_id)
+    if writer is None:
+        # 放送が終わったスレッドの書き込みパイプラインが溜まり続けないよう、待機中の書き込みがないものは破棄する
+        for existing_thread_id, existing_writer in list(__thread_comment_writers.items()):
+            if len(existing_writer.pending_comments) == 0 and existing_writer.isRunning() is False:
+                del __thread_comment_writers[existing_thread_id]
+        writer = ThreadCommentWriter(thread_id, channel_id)
+        __thread_comment_writers[thread_id] = writer
+    return writer
+
+
+def CollectCommentPipelineMetrics() -> list[MetricFamily]:
+    """
+    このサーバープロセスのスレッドごとのコメント配信・書き込みの状況をメトリクスとして取得する
+
+    Returns:
+        list[MetricFamily]: Broadcaster の購読者数・読み飛ばされたコメント数と、書き込み待ちのコメント数のメトリクス
+    """
+
+    subscribers_family = MetricFamily(
+        name = 'nx_jikkyo_comment_broadcaster_subscribers',
+        type = 'gauge',
+        help = 'Number of comment session connections subscribed to each ThreadCommentBroadcaster.',
+    )
+    dropped_family = MetricFamily(
+        name = 'nx_jikkyo_comment_broadcaster_dropped_comments',
+        type = 'gauge',
+        help = 'Number of comments skipped by slow subscribers of each live ThreadCommentBroadcaster (reset when the broadcaster is discarded).',
+    )
+    pending_family = MetricFamily(
+        name = 'nx_jikkyo_comment_writer_pending_comments',
+        type = 'gauge',
+        help = 'Number of comments waiting to be written by each ThreadCommentWriter.',
+    )
+    for thread_id, broadcaster in __thread_comment_broadcasters.items():
+        labels = {'thread_id': str(thread_id)}
+        subscribers_family.samples.append(MetricSample(name=subscribers_family.name, labels=labels, value=len(broadcaster.subscribers)))
+        dropped_family.samples.append(MetricSample(name=dropped_family.name, labels=labels, value=broadcaster.dropped_count))
+    for thread_id, writer in __thread_comment_writers.items():
+        labels = {'thread_id': str(thread_id), 'channel': writer.channel_id}
+        pending_family.samples.append(MetricSample(name=pending_family.name, labels=labels, value=len(writer.pending_comments)))
+    return [subscribers_family, dropped_family, pending_family]
+
+
+METRICS.addCollector(CollectCommentPipelineMetrics)
+
+
+# 視聴セッションに最新の視聴統計情報を送信する間隔 (秒)
+WATCH_SESSION_STATISTICS_INTERVAL_SECONDS = 60.0
+# 視聴セッションにサーバー時刻を送信する間隔 (秒)
+WATCH_SESSION_SERVER_TIME_INTERVAL_SECONDS = 45.0
+# 視聴セッションに ping を送信する間隔 (秒)
+WATCH_SESSION_PING_INTERVAL_SECONDS = 30.0
+# 最新コメ番キャッシュの値を DB の採番テーブルと突合する間隔 (秒)
+WATCH_SESSION_COMMENT_COUNTER_VALIDATION_INTERVAL_SECONDS = 600.0
+# DB 接続断時に、DB からのコメント数の取得を再試行するまで待機する時間 (秒)
+WATCH_SESSION_COMMENT_COUNTER_DB_RETRY_SECONDS = 15.0
+# 1 回の定期送信で、送信が終わらない接続を待つ最大時間 (秒)
+## 送信が詰まっている接続があっても、他のチャンネルへの定期送信が遅れないようにする
+WATCH_SESSION_TICK_SEND_TIMEOUT_SECONDS = 5.0
+
+
+@dataclass(slots=True)
+class WatchSessionTickerGroup:
+    """
+    視聴統計情報が同じになる (同じチャンネル・同じスレッドの) 視聴セッションの集まり
+
+    Attributes:
+        channel_id (str): 実況チャンネル ID (ex: jk211)
+        thread_id (int): スレッド ID
+        websockets (set[WebSocket]): 視聴セッションの WebSocket
+        comment_count (int | None): 最後に取得できたコメント数 (一度も取得できていない場合は None)
+    """
+
+    channel_id: str
+    thread_id: int
+    websockets: set[WebSocket] = field(default_factory=set)
+    comment_count: int | None = None
+
+
+class WatchSessionTicker:
+    """
+    サーバープロセス内の全ての視聴セッションに、視聴統計情報・サーバー時刻・ping を定期的にまとめて送信する
+
+    以前は視聴セッションごとの送信タスクが 1 秒ごとに起床し、それぞれが個別に Redis からコメント数と同時接続数を取得していたため、
+    接続数に比例して同じ内容の Redis へのリクエストと起床が発生していた
+    このクラスはサーバープロセスに 1 つだけ存在し、送信時刻になったときだけ起床して、
+    アクティブな全チャンネル・全スレッドのコメント数と同時接続数を 1 回のパイプラインでまとめて取得し、
+    チャンネル・スレッドごとに 1 度だけ生成したメッセージを、そのチャンネル・スレッドの全ての視聴セッションに送信する
+    """
+
+    def __init__(self) -> None:
+
+        # (実況チャンネル ID, スレッド ID) と視聴セッションの集まりの対応表
+        self.groups: dict[tuple[str, int], WatchSessionTickerGroup] = {}
+        # 視聴セッションが登録されたことを定期送信タスクに通知するためのイベント
+        self._registered_event = asyncio.Event()
+        self._run_task: asyncio.Task[None] | None = None
+
+        # スレッド ID と、次に最新コメ番キャッシュの値を DB の採番テーブルと突合する時刻の対応表
+        self._next_validation_times: dict[int, float] = {}
+        # DB 接続断時に、DB からのコメント数の取得を再試行するまで待機する時刻
+        self._next_db_retry_time = 0.0
+
+    def register(self, websocket: WebSocket, channel_id: str, thread_id: int) -> None:
+        """
+        視聴セッションを定期送信の対象に登録する
+
+        Args:
+            websocket (WebSocket): 視聴セッションの WebSocket
+            channel_id (str): 実況チャンネル ID (ex: jk211)
+            thread_id (int): 視聴中のスレッド ID
+        """
+
+        group = self.groups.get((channel_id, thread_id))
+        if group is None:
+            group = WatchSessionTickerGroup(channel_id=channel_id, thread_id=thread_id)
+            self.groups[(channel_id, thread_id)] = group
+        group.websockets.add(websocket)
+        self._registered_event.set()
+
+        # 定期送信タスクが未起動または終了済みなら新しいタスクを開始する
+        if self._run_task is None or self._run_task.done():
+            self._run_task = asyncio.create_task(self._run())
+
+    def unregister(self, websocket: WebSocket, channel_id: str, thread_id: int) -> None:
+        """
+        視聴セッションを定期送信の対象から削除する
+
+        Args:
+            websocket (WebSocket): 視聴セッションの WebSocket
+            channel_id (str): 実況チャンネル ID (ex: jk211)
+            thread_id (int): 視聴中のスレッド ID
+        """
+
+        group = self.groups.get((channel_id, thread_id))
+        if group is None:
+            return
+        group.websockets.discard(websocket)
+        if len(group.websockets) == 0:
+            del self.groups[(channel_id, thread_id)]
+            if not any(other_group.thread_id == thread_id for other_group in self.groups.values()):
+                self._next_validation_times.pop(thread_id, None)
 
     async def _run(self) -> None:
         """
-        Redis Pub/Sub を購読し、接続ごとの送信キューにコメントを配信する
-
-        予期せぬ例外が発生した場合は指数バックオフでリトライし、配信を継続する。
-        CancelledError が発生した場合のみタスクを終了する。
+        送信時刻になるたびに起床し、全ての視聴セッションに視聴統計情報・サーバー時刻・ping を送信する
         """
 
-        # リトライ用のバックオフ設定
-        retry_delay = 1.0  # 初期リトライ間隔 (秒)
-        max_retry_delay = 30.0  # 最大リトライ間隔 (秒)
+        now = time.time()
+        next_statistics_time = now + WATCH_SESSION_STATISTICS_INTERVAL_SECONDS
+        next_server_time_time = now + WATCH_SESSION_SERVER_TIME_INTERVAL_SECONDS
+        next_ping_time = now + WATCH_SESSION_PING_INTERVAL_SECONDS
 
         while True:
-            pubsub = REDIS_CLIENT.pubsub()
-            should_retry = False
-
             try:
-                # スレッド単位の Pub/Sub でコメントを受信する
-                await pubsub.subscribe(f'{REDIS_CHANNEL_THREAD_COMMENTS_PREFIX}:{self.thread_id}')
-
-                # 正常に接続できたらリトライ間隔をリセット
-                retry_delay = 1.0
-
-                while True:
-                    # コメントが来るまで最大 5 秒待機する
-                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=5.0)
-                    if message is None:
-                        continue
-
-                    # Redis から受信したコメントを JSON 文字列として扱う
-                    raw_payload = message['data']
-                    if isinstance(raw_payload, bytes | bytearray | memoryview):
-                        raw_json = bytes(raw_payload).decode('utf-8')
-                    elif isinstance(raw_payload, str):
-                        raw_json = raw_payload
-                    else:
-                        raw_json = json.dumps(raw_payload, ensure_ascii=False, separators=(',', ':'))
 
-                    try:
-                        # Redis から受信した JSON をデコードする
-                        base_comment: XMLCompatibleCommentResponse = json.loads(raw_json)
-                    except json.JSONDecodeError:
-                        logging.error('ThreadCommentBroadcaster: Failed to decode comment JSON.')
-                        continue
-
-                    if 'chat' not in base_comment:
-                        logging.error('ThreadCommentBroadcaster: Comment JSON does not contain chat data.')
+                # 視聴セッションが 1 つもない間は、登録されるまで起床しない
+                if len(self.groups) == 0:
+                    self._registered_event.clear()
+                    await self._registered_event.wait()
+
+                # 次の送信時刻まで待機する
+                ## 放送終了時刻による切断などと同じタイマーホイールで待機し、起床をサーバープロセス全体の tick にまとめる
+                await TIMER_WHEEL.waitUntil(min(next_statistics_time, next_server_time_time, next_ping_time))
+                now = time.time()
+
+                # 送信時刻を過ぎたメッセージを組み立てる
+                ## 1 回の起床で複数のメッセージの送信時刻が重なった場合は、接続ごとに続けて送信する
+                common_texts: list[str] = []
+                texts_by_group: dict[tuple[str, int], list[str]] = {}
+                if now >= next_statistics_time:
+                    texts_by_group = await self._buildStatisticsTexts()
+                    next_statistics_time = now + WATCH_SESSION_STATISTICS_INTERVAL_SECONDS
+                if now >= next_server_time_time:
+                    common_texts.append(json.dumps({
+                        'type': 'serverTime',
+                        'data': {
+                            'serverTime': timezone.now().isoformat(),
+                        },
+                    }, ensure_ascii=False, separators=(',', ':')))
+                    next_server_time_time = now + WATCH_SESSION_SERVER_TIME_INTERVAL_SECONDS
+                if now >= next_ping_time:
+                    common_texts.append('{"type":"ping"}')
+                    next_ping_time = now + WATCH_SESSION_PING_INTERVAL_SECONDS
+
+                # 全ての視聴セッションに並行して送信する
+                send_tasks: list[asyncio.Task[None]] = []
+                for group_key, group in list(self.groups.items()):
+                    texts = texts_by_group.get(group_key, []) + common_texts
+                    if len(texts) == 0:
                         continue
-
-                    # yourpost 判定に必要な情報を先に抽出する
-                    # yourpost が含まれている場合は非 yourpost に流れないように事前に除去する
-                    if 'yourpost' in base_comment['chat']:
-                        del base_comment['chat']['yourpost']
-                        raw_json = json.dumps(base_comment, ensure_ascii=False, separators=(',', ':'))
-
-                    user_id = str(base_comment['chat'].get('user_id', ''))
-                    broadcast_message = CommentBroadcastMessage(
-                        raw_json = raw_json,
-                        base_comment = base_comment,
-                        user_id = user_id,
-                    )
-
-                    # 現在接続中の全クライアントへ同一メッセージを配信する
-                    subscribers = await self._getSubscriberSnapshot()
-                    for subscriber in subscribers:
-                        EnqueueBroadcastMessage(subscriber, broadcast_message)
+                    for websocket in list(group.websockets):
+                        send_tasks.append(asyncio.create_task(self._send(websocket, group.channel_id, texts)))
+                if len(send_tasks) > 0:
+                    # 送信が詰まっている接続は待たずに次の送信時刻の待機に移る (送信タスク自体はそのまま送信を続ける)
+                    await asyncio.wait(send_tasks, timeout=WATCH_SESSION_TICK_SEND_TIMEOUT_SECONDS)
 
             except asyncio.CancelledError:
-                # キャンセルされた場合はタスクを終了する
                 raise
-
             except Exception as ex:
-                # 予期せぬ例外が発生した場合はログを出力してリトライする
-                logging.error(f'ThreadCommentBroadcaster: Unexpected error occurred while broadcasting. Retrying in {retry_delay} seconds...', exc_info=ex)
-                should_retry = True
+                # 予期せぬ例外で全ての視聴セッションへの定期送信が止まらないよう、ログを出力して次の送信時刻まで待つ
+                logging.error('WatchSessionTicker: Unexpected error occurred while sending periodic messages:', exc_info = ex)
+                await asyncio.sleep(1)
 
-            finally:
-                # 各リトライごとに確実に購読解除する
-                try:
-                    await pubsub.unsubscribe(f'{REDIS_CHANNEL_THREAD_COMMENTS_PREFIX}:{self.thread_id}')
-                    await pubsub.close()
-                except Exception as cleanup_ex:
-                    logging.error('ThreadCommentBroadcaster: Failed to cleanup Redis pubsub connection:', exc_info=cleanup_ex)
+    @staticmethod
+    async def _send(websocket: WebSocket, channel_id: str, texts: list[str]) -> None:
+        """
+        1 つの視聴セッションにメッセージを送信する
+        切断済みの接続への送信は何もせずに終了する (接続の終了処理は受信タスク側で行われる)
 
-            if should_retry is True:
-                # 指数バックオフでリトライ間隔を増加させる
-                await asyncio.sleep(retry_delay)
-                retry_delay = min(retry_delay * 2, max_retry_delay)
+        Args:
+            websocket (WebSocket): 送信先の WebSocket
+            channel_id (str): 実況チャンネル ID (ログ出力用)
+            texts (list[str]): 送信するメッセージ
+        """
 
+        try:
+            await SendTextsSafely(websocket, texts)
+        except Exception as ex:
+            logging.warning(f'WatchSessionAPI [{channel_id}]: Failed to send periodic messages.', exc_info = ex)
 
-# スレッド単位のコメント配信用 Broadcaster を保存する辞書
-__thread_comment_broadcasters: dict[int, ThreadCommentBroadcaster] = {}
-__thread_comment_broadcasters_lock = asyncio.Lock()
+    async def _buildStatisticsTexts(self) -> dict[tuple[str, int], list[str]]:
+        """
+        アクティブな全チャンネル・全スレッドのコメント数と同時接続数をまとめて取得し、視聴統計情報のメッセージを組み立てる
+        取得に失敗したコメント数は最後に取得できた値に、同時接続数は 0 にフォールバックする
 
+        Returns:
+            dict[tuple[str, int], list[str]]: (実況チャンネル ID, スレッド ID) と送信するメッセージの対応表
+        """
 
-async def GetThreadCommentBroadcaster(thread_id: int) -> ThreadCommentBroadcaster:
-    """
-    スレッド単位のコメント配信用 Broadcaster を取得する
+        groups = list(self.groups.values())
+        thread_ids = sorted({group.thread_id for group in groups})
+        channel_ids = sorted({group.channel_id for group in groups})
 
-    Args:
-        thread_id (int): コメント配信対象のスレッド ID
+        # 全スレッドの最新コメ番キャッシュと全チャンネルの同時接続数を、1 回のパイプラインでまとめて取得する
+        comment_counts: dict[int, int] = {}
+        viewer_counts: dict[str, int] = {}
+        try:
+            async with REDIS_CLIENT.pipeline(transaction=False) as pipeline:
+                pipeline.hmget(REDIS_KEY_THREAD_COMMENT_COUNTER, [str(thread_id) for thread_id in thread_ids])
+                pipeline.hmget(REDIS_KEY_VIEWER_COUNT, channel_ids)
+                cached_comment_counts, cached_viewer_counts = await pipeline.execute()
+            for thread_id, cached_comment_count in zip(thread_ids, cached_comment_counts):
+                if cached_comment_count is not None and cached_comment_count.isdigit() is True:
+                    comment_counts[thread_id] = int(cached_comment_count)
+            for channel_id, cached_viewer_count in zip(channel_ids, cached_viewer_counts):
+                viewer_counts[channel_id] = int(cached_viewer_count or 0)
+        except Exception as ex:
+            # Redis 障害時でも statistics 送信を継続し、接続体験の劣化を最小限に抑える
+            logging.warning('WatchSessionTicker: Failed to fetch comment counters and viewer counters. Falling back to cached values.', exc_info = ex)
+
+        # キャッシュが欠損しているスレッドと、DB の採番テーブルとの突合の時刻になったスレッドは、DB からまとめて取得する
+        ## キャッシュがあっても無期限に信用せず、一定間隔で DB の採番テーブルと突合してキャッシュの stale 化を防ぐ
+        now = time.time()
+        if now >= self._next_db_retry_time:
+            db_thread_ids = [
+                thread_id for thread_id in thread_ids
+                if thread_id not in comment_counts or now >= self._next_validation_times.get(thread_id, 0.0)
+            ]
+            if len(db_thread_ids) > 0:
+                comment_counts.update(await self._fetchCommentCountsFromDB(db_thread_ids, now))
+
+        texts_by_group: dict[tuple[str, int], list[str]] = {}
+        for group in groups:
+            # 取得できなかった場合は最後に取得できた値を使う
+            comment_count = comment_counts.get(group.thread_id, group.comment_count)
+            group.comment_count = comment_count
+            texts_by_group[(group.channel_id, group.thread_id)] = [json.dumps({
+                'type': 'statistics',
+                'data': {
+                    'viewers': viewer_counts.get(group.channel_id, 0),
+                    'comments': comment_count if comment_count is not None else 0,
+                    'adPoints': 0,  # NX-Jikkyo では常に 0 を返す
+                    'giftPoints': 0,  # NX-Jikkyo では常に 0 を返す
+                },
+            }, ensure_ascii=False, separators=(',', ':'))]
+        return texts_by_group
+
+    async def _fetchCommentCountsFromDB(self, thread_ids: list[int], now: float) -> dict[int, int]:
+        """
+        DB の採番テーブルから複数スレッドのコメント数をまとめて取得し、Redis 上の最新コメ番キャッシュへ反映する
+        採番テーブルのレコードが欠損しているスレッドは、現存するコメントから採番テーブルのレコードを再作成して回復を試みる
 
-    Returns:
-        ThreadCommentBroadcaster: スレッド単位のコメント配信用 Broadcaster
-    """
+        Args:
+            thread_ids (list[int]): スレッド ID のリスト
+            now (float): 現在時刻 (UNIX タイムスタンプ)
 
-    async with __thread_comment_broadcasters_lock:
-        broadcaster = __thread_comment_broadcasters.get(thread_id)
-        if broadcaster is None:
-            broadcaster = ThreadCommentBroadcaster(thread_id)
-            __thread_comment_broadcasters[thread_id] = broadcaster
-        return broadcaster
+        Returns:
+            dict[int, int]: スレッド ID とコメント数の対応表 (取得できなかったスレッドは含まれない)
+        """
 
+        comment_counts: dict[int, int] = {}
+        try:
+            db_comment_counts: dict[int, int] = dict(
+                await CommentCounter.filter(thread_id__in=thread_ids).values_list('thread_id', 'max_no'),  # type: ignore
+            )
+            for thread_id in thread_ids:
+                if thread_id in db_comment_counts:
+                    comment_count = db_comment_counts[thread_id]
+                else:
+                    # 稀に採番テーブルのレコードが欠損している場合は、現存コメント数から再作成して回復を試みる
+                    ## no は採番テーブルで単調増加している前提なので、最新行判定には id を使って負荷を抑える
+                    logging.warning(f'WatchSessionTicker: CommentCounter record is missing. Trying to recover from comments table. thread_id: {thread_id}')
+                    latest_comment = await Comment.filter(thread_id=thread_id).order_by('-id').first()
+                    comment_count = latest_comment.no if latest_comment is not None else 0
+                    await CommentCounter.get_or_create(thread_id=thread_id, defaults={'max_no': comment_count})
+
+                # DB 値とキャッシュの大きい方を正として再同期し、誤ったキャッシュを自己修復する
+                ## Redis 採番モードでは採番テーブルへの書き戻しが遅れるため、キャッシュの方が大きい場合はキャッシュの値を採用する
+                try:
+                    comment_count = await UpdateThreadCommentCounterCache(thread_id, comment_count)
+                except Exception as cache_ex:
+                    logging.warning(f'WatchSessionTicker: Failed to update comment counter cache. thread_id: {thread_id}', exc_info = cache_ex)
+                comment_counts[thread_id] = comment_count
+                self._next_validation_times[thread_id] = now + WATCH_SESSION_COMMENT_COUNTER_VALIDATION_INTERVAL_SECONDS
 
-async def CleanupThreadCommentBroadcaster(thread_id: int, broadcaster: ThreadCommentBroadcaster) -> None:
-    """
-    接続が存在しない Broadcaster を辞書から削除する
+        except Exception as ex:
+            # DB ダウン中に毎回再試行すると負荷が跳ねるため、再試行時刻を先送りする
+            if IsDatabaseConnectionUnavailableError(ex) is True:
+                self._next_db_retry_time = now + WATCH_SESSION_COMMENT_COUNTER_DB_RETRY_SECONDS
+            logging.warning('WatchSessionTicker: Failed to fetch comment counters from DB. Falling back to cached values.', exc_info = ex)
 
-    Args:
-        thread_id (int): 対象のスレッド ID
-        broadcaster (ThreadCommentBroadcaster): 対象の Broadcaster
-    """
+        return comment_counts
 
-    # デッドロックを防ぐため、ロック取得順序を固定する
-    # 常に __thread_comment_broadcasters_lock → broadcaster.lock の順で取得する
-    ## getSubscriberCount() は内部で broadcaster.lock を取得するため、
-    ## __thread_comment_broadcasters_lock を保持した状態で呼び出すとネストされたロックになる
-    ## そのため、ここでは直接 subscribers の長さを確認してデッドロックを回避する
-    async with __thread_comment_broadcasters_lock:
-        current_broadcaster = __thread_comment_broadcasters.get(thread_id)
-        if current_broadcaster is not broadcaster:
-            return
-        # broadcaster.lock を取得して購読者数を確認し、0 なら削除する
-        async with broadcaster.lock:
-            if len(broadcaster.subscribers) == 0:
-                del __thread_comment_broadcasters[thread_id]
+
+# サーバープロセスごとに 1 つだけ存在する、視聴セッションへの定期送信を担うインスタンス
+WATCH_SESSION_TICKER = WatchSessionTicker()
 
 
 async def LogUnknownChannelRejected(channel_id: str) -> None:
@@ -418,41 +1370,6 @@ async def LogUnknownChannelRejected(channel_id: str) -> None:
         )
 
 
-async def GetActiveThread(channel_id_int: int) -> Thread | None:
-    """
-    現在アクティブな (放送されている) スレッド情報を取得する
-
-    Args:
-        channel_id_int (int): 実況チャンネル ID (jk の prefix を取り除いた数値)
-
-    Returns:
-        Thread | None: 現在アクティブなスレッドの情報。見つからない場合は None を返す
-    """
-
-    # 現在のサーバー時刻 (datetime)
-    current_time_datetime = timezone.now()
-
-    # 実況チャンネル ID に対応する現在アクティブなスレッド情報が保存されていないか、キャッシュされたスレッド情報がすでに放送を終了している場合は、
-    # 実況チャンネル ID に対応する現在アクティブなスレッド情報を取得し、__active_threads に保存する
-    if channel_id_int not in __active_threads or __active_threads[channel_id_int].end_at < current_time_datetime:
-        thread = await Thread.filter(
-            channel_id = channel_id_int,
-            start_at__lte = current_time_datetime,
-            end_at__gte = current_time_datetime,
-        ).first()
-
-        # 実況チャンネル ID に対応するスレッドが見つからなかった
-        if not thread:
-            return None
-
-        # キャッシュを新しいスレッド情報で更新
-        __active_threads[channel_id_int] = thread
-        logging.info(f'GetActiveThread [jk{channel_id_int}]: Active thread has been updated.')
-
-    # 現在アクティブなスレッド情報を取得して返す
-    return __active_threads[channel_id_int]
-
-
 def ConvertToXMLCompatibleCommentResponse(comment: Comment) -> XMLCompatibleCommentResponse:
     """
     コメント情報をニコ生 XML 互換の XMLCompatibleCommentResponse 形式に変換する
@@ -595,6 +1512,62 @@ async def SendTextSafely(websocket: WebSocket, text: str) -> bool:
         raise
 
 
+async def SendTextsSafely(websocket: WebSocket, texts: list[str]) -> bool:
+    """
+    切断済みソケットへの送信例外を抑制しつつ、複数のテキストを順番どおりに 1 メッセージずつ連続して送信する
+
+    Args:
+        websocket (WebSocket): 送信先 WebSocket
+        texts (list[str]): 送信するテキスト (1 件が 1 つの WebSocket メッセージになる)
+
+    Returns:
+        bool: 全件の送信成功時は True、切断済みなどで送信不要な場合は False
+    """
+
+    # すでに切断済みなら送信せず即終了する
+    if IsWebSocketDisconnected(websocket) is True:
+        return False
+
+    try:
+        # 切断前であれば通常どおり送信する
+        ## 途中でキューの待機などを挟まずに連続して送信することで、まとめて書き込まれやすくする
+        for text in texts:
+            await websocket.send_text(text)
+        return True
+    except Exception as ex:
+        # 切断済み起因の例外は抑止し、それ以外は上位へ伝搬する
+        if IsWebSocketClosedError(ex) is True:
+            return False
+        raise
+
+
+async def SendBytesSafely(websocket: WebSocket, data: bytes) -> bool:
+    """
+    切断済みソケットへの送信例外を抑制しつつバイナリを送信する
+
+    Args:
+        websocket (WebSocket): 送信先 WebSocket
+        data (bytes): 送信するバイナリ
+
+    Returns:
+        bool: 送信成功時は True、切断済みなどで送信不要な場合は False
+    """
+
+    # すでに切断済みなら送信せず即終了する
+    if IsWebSocketDisconnected(websocket) is True:
+        return False
+
+    try:
+        # 切断前であれば通常どおり送信する
+        await websocket.send_bytes(data)
+        return True
+    except Exception as ex:
+        # 切断済み起因の例外は抑止し、それ以外は上位へ伝搬する
+        if IsWebSocketClosedError(ex) is True:
+            return False
+        raise
+
+
 async def CloseWebSocketSafely(
     websocket: WebSocket,
     code: int = 1000,
@@ -644,7 +1617,7 @@ async def WatchSessionAPI(
     if channel_id == 'jk263':
         # thread_id が指定されている場合は、そのスレッドが jk263 のものかを確認
         if thread_id is not None:
-            thread = await Thread.filter(id=thread_id).first()
+            thread = await GetThread(thread_id)
             if thread and thread.channel_id == 263:
                 # jk263 の過去ログの場合はリダイレクトしない
                 pass
@@ -684,11 +1657,8 @@ async def WatchSessionAPI(
     # スレッド ID が指定されていれば、そのスレッドを取得
     ## 放送開始前のスレッドが指定された場合はエラーを返す
     else:
-        thread = await Thread.filter(
-            id = thread_id,
-            channel_id = channel_id_int,
-        ).first()
-        if not thread:
+        thread = await GetThread(thread_id)
+        if not thread or thread.channel_id != channel_id_int:
             logging.error(f'WatchSessionAPI [{channel_id}]: Thread not found.')
             await CloseWebSocketSafely(websocket, code=1002, reason=f'[{channel_id}]: Thread not found.')
             return
@@ -705,14 +1675,10 @@ async def WatchSessionAPI(
 
     # 接続を受け入れる
     await websocket.accept()
-    # startWatching 時に送信した comments 値を sender task の初期フォールバック値へ引き継ぐ
-    initial_statistics_comment_count: int | None = None
 
     async def RunReceiverTask() -> None:
         """ クライアントからのメッセージを受信するタスク """
 
-        nonlocal initial_statistics_comment_count
-
         # 最後にコメントを投稿した時刻
         last_comment_time: float = 0
 
@@ -821,24 +1787,34 @@ async def WatchSessionAPI(
                     return
 
                 # 視聴の統計情報を送信
+                ## 同時接続数と最新コメ番キャッシュは 1 回のパイプラインでまとめて Redis から取得する
                 initial_viewer_count = 0
+                cached_comment_count: str | None = None
                 try:
-                    initial_viewer_count = int(await REDIS_CLIENT.hget(REDIS_KEY_VIEWER_COUNT, channel_id) or 0)
+                    async with REDIS_CLIENT.pipeline(transaction=False) as pipeline:
+                        pipeline.hget(REDIS_KEY_VIEWER_COUNT, channel_id)
+                        pipeline.hget(REDIS_KEY_THREAD_COMMENT_COUNTER, str(thread.id))
+                        cached_viewer_count, cached_comment_count = await pipeline.execute()
+                    initial_viewer_count = int(cached_viewer_count or 0)
                 except Exception as ex:
                     logging.warning(
                         f'WatchSessionAPI [{channel_id}]: Failed to fetch viewer counter for initial statistics. Falling back to zero.',
                         exc_info = ex,
                     )
                 initial_comment_count = 0
-                try:
-                    initial_comment_count = (await CommentCounter.get(thread_id=thread.id)).max_no
-                except DoesNotExist as ex:
-                    # 稀に採番テーブルのレコードが欠損している場合は、0 にフォールバックして接続を継続する
-                    ## 定期 statistics 送信側の回復ロジック (SyncCommentCounters) で最終的に修復される
-                    logging.warning(
-                        f'WatchSessionAPI [{channel_id}]: CommentCounter record is missing for initial statistics. Falling back to zero.',
-                        exc_info = ex,
-                    )
+                if cached_comment_count is not None and cached_comment_count.isdigit() is True:
+                    initial_comment_count = int(cached_comment_count)
+                else:
+                    # 最新コメ番キャッシュが存在しない場合のみ、DB の採番テーブルから取得する
+                    try:
+                        initial_comment_count = (await CommentCounter.get(thread_id=thread.id)).max_no
+                    except DoesNotExist as ex:
+                        # 稀に採番テーブルのレコードが欠損している場合は、0 にフォールバックして接続を継続する
+                        ## 定期 statistics 送信側の回復ロジック (SyncCommentCounters) で最終的に修復される
+                        logging.warning(
+                            f'WatchSessionAPI [{channel_id}]: CommentCounter record is missing for initial statistics. Falling back to zero.',
+                            exc_info = ex,
+                        )
                 is_sent = await SendJSONSafely(websocket, {
                     'type': 'statistics',
                     'data': {
@@ -850,7 +1826,6 @@ async def WatchSessionAPI(
                 })
                 if is_sent is False:
                     return
-                initial_statistics_comment_count = initial_comment_count
 
             # 座席維持リクエスト
             ## 本家ニコ生では keepSeat メッセージが一定期間の間に送られてこなかった場合に接続を切断するが、モックなので今の所何もしない
@@ -866,17 +1841,29 @@ async def WatchSessionAPI(
             # コメント投稿リクエスト
             elif message_type == 'postComment':
 
+                # コメントを投稿するスレッド
+                post_thread = thread
+
                 # 放送が終了したスレッドにはコメントを投稿できない
                 if thread.end_at < timezone.now():
-                    is_sent = await SendJSONSafely(websocket, {
-                        'type': 'error',
-                        'data': {
-                            'message': 'NOT_ON_AIR',
-                        },
-                    })
-                    if is_sent is False:
-                        return
-                    continue
+
+                    # 放送終了時の切断を分散させている間に投稿されたコメントは、放送を引き継いだ次のスレッドに投稿する
+                    ## 切断を待っている間にコメントを投稿できなくならないようにする
+                    next_thread = None
+                    if timezone.now() <= thread.end_at + timedelta(seconds=THREAD_ROLLOVER_DISCONNECT_SPREAD_SECONDS):
+                        next_thread = await GetActiveThread(channel_id_int)
+                    if next_thread is not None and next_thread.id != thread.id and next_thread.start_at <= thread.end_at:
+                        post_thread = next_thread
+                    else:
+                        is_sent = await SendJSONSafely(websocket, {
+                            'type': 'error',
+                            'data': {
+                                'message': 'NOT_ON_AIR',
+                            },
+                        })
+                        if is_sent is False:
+                            return
+                        continue
 
                 try:
                     # 送られてきたリクエストから mail に相当するコメントコマンドを組み立てる
@@ -940,69 +1927,18 @@ async def WatchSessionAPI(
                     ## これにより、0.5 秒以内の機械的な連投が続く場合に最初の1回以外の全コメントをサイレントに弾ける
                     last_comment_time = current_time
 
-                    async def CreateCommentInTransaction(connection: TransactionalDBClient) -> Comment:
-
-                        # 採番テーブルに記録されたコメ番をインクリメント
-                        await connection.execute_query(
-                            'UPDATE comment_counters SET max_no = max_no + 1 WHERE thread_id = %s',
-                            [thread.id]
-                        )
-                        # インクリメント後のコメ番を取得
-                        ## 採番テーブルを使うことでコメ番の重複を防いでいる
-                        new_no_result = await connection.execute_query_dict(
-                            'SELECT max_no FROM comment_counters WHERE thread_id = %s',
-                            [thread.id]
-                        )
-                        new_no = new_no_result[0]['max_no']
-
-                        # 新しいコメントを作成
-                        return await Comment.create(
-                            thread_id = thread.id,
-                            no = new_no,
-                            vpos = message['data']['vpos'],  # リクエストで与えられた vpos をそのまま入れる
-                            mail = ' '.join(comment_commands),  # コメントコマンド (mail) は空白区切りの文字列として組み立てる
-                            user_id = watch_session_client_id,  # ユーザー ID は視聴セッションのクライアント ID をそのまま入れる
-                            premium = False,  # 簡易実装なのでプレミアム会員判定は省略
-                            anonymity = message['data']['isAnonymous'] is True,
-                            content = message['data']['text'],
-                        )
-
-                    # コメントを DB に登録
-                    comment = await RunTransactionWithReconnectRetry(
-                        operation = CreateCommentInTransaction,
-                        operation_name = f'WatchSessionAPI [{channel_id}]',
-                    )
-
-                    # スレッドごとの最新コメ番キャッシュを更新
-                    ## 投稿成功直後に反映しておくことで、statistics 送信時の DB アクセス頻度を抑える
-                    try:
-                        await UpdateThreadCommentCounterCache(thread.id, comment.no)
-                    except Exception as ex:
-                        # キャッシュ更新はベストエフォートで扱う
-                        ## ここで例外を再送出すると投稿成功レスポンスまで失敗するため、ログのみ残して継続する
-                        logging.warning(
-                            f'WatchSessionAPI [{channel_id}]: Failed to update thread comment counter cache.',
-                            exc_info = ex,
-                        )
-
-                    # ニコ生 XML 互換コメント形式に変換した上で、Redis Pub/Sub でコメントを送信
-                    ## この段階ではまだ yourpost フラグを設定してはならない
-                    ## yourpost フラグはコメントセッション WebSocket 側で設定しないと、意図しないコメントに yourpost フラグが付与されてしまう
-                    await REDIS_CLIENT.publish(
-                        channel = f'{REDIS_CHANNEL_THREAD_COMMENTS_PREFIX}:{thread.id}',
-                        message = json.dumps(ConvertToXMLCompatibleCommentResponse(comment), ensure_ascii=False),
+                    # スレッド単位の書き込みパイプライン経由でコメントを DB に登録し、Redis Pub/Sub で配信する
+                    ## 同じスレッドにほぼ同時に届いた他の投稿とまとめて 1 トランザクションで採番・保存される
+                    comment = await GetThreadCommentWriter(post_thread.id, channel_id).postComment(
+                        # リクエストで与えられた vpos をそのまま入れる
+                        ## 次のスレッドに投稿する場合のみ、次のスレッドの放送開始時刻からの位置に換算する
+                        vpos = int(message['data']['vpos']) - int((post_thread.start_at - thread.start_at).total_seconds() * 100),
+                        mail = ' '.join(comment_commands),  # コメントコマンド (mail) は空白区切りの文字列として組み立てる
+                        user_id = watch_session_client_id,  # ユーザー ID は視聴セッションのクライアント ID をそのまま入れる
+                        anonymity = message['data']['isAnonymous'] is True,
+                        content = str(message['data']['text']),
                     )
 
-                    # 実況勢いカウント用の Redis ソート済みセット型にエントリを追加
-                    ## スコア (UNIX タイムスタンプ) が現在時刻から 60 秒以内の範囲のエントリの数が実況勢いとなる
-                    await REDIS_CLIENT.zadd(f'{REDIS_KEY_JIKKYO_FORCE_COUNT}:{channel_id}', {f'comment:{comment.id}': current_time})
-
-                    # 1/10 の確率で現在時刻から 60 秒以上前のエントリを削除
-                    ## 毎回削除する必要はないが (古いエントリが残ったままでもカウントする上では影響しない) 、
-                    ## メモリ上に古いエントリが残りすぎないように、定期的に削除する
-                    if random.random() < 0.1:
-                        await REDIS_CLIENT.zremrangebyscore(f'{REDIS_KEY_JIKKYO_FORCE_COUNT}:{channel_id}', 0, current_time - 60)
-
                     # 投稿結果を返す
                     is_sent = await SendJSONSafely(websocket, {
                         'type': 'postCommentResult',
@@ -1045,219 +1981,40 @@ async def WatchSessionAPI(
     async def RunSenderTask() -> None:
         """ 定期的にサーバーからクライアントにメッセージを送信するタスク """
 
-        # 最後に視聴統計情報を送信した時刻
-        last_statistics_time = time.time()
-        # 最後にサーバー時刻を送信した時刻
-        last_server_time_time = time.time()
-        # 最後に ping を送信した時刻
-        last_ping_time = time.time()
-        # 最後に送信したコメント数
-        ## startWatching が sender task より後に処理される場合を考慮し、未確定を None で表現する
-        last_statistics_comment_count: int | None = None
-        # 最後にコメント数取得エラーをログ出力した時刻
-        last_comment_counter_error_log_time = 0.0
-        # 最後に視聴者数取得エラーをログ出力した時刻
-        last_viewer_counter_error_log_time = 0.0
-        # DB からのコメント数再取得を再試行するまで待機する時刻
-        next_comment_counter_db_retry_time = 0.0
-        # Redis キャッシュ値を DB で検証する間隔 (秒)
-        comment_counter_db_validation_interval_seconds = 600.0
-        # 次回 Redis キャッシュ値を DB で検証する時刻
-        ## DB 接続断時の再試行抑制時刻とは責務を分離し、意図を明確化する
-        next_comment_counter_validation_time = 0.0
-
-        # 処理開始時点でスレッドが放送中かどうか
-        is_on_air = thread.start_at < timezone.now() < thread.end_at
-
-        while True:
-
-            # 60 秒に 1 回最新の視聴統計情報を送信 (互換性のため)
-            if (time.time() - last_statistics_time) > 60:
-                current_time = time.time()
-                if last_statistics_comment_count is not None:
-                    comment_count = last_statistics_comment_count
-                elif initial_statistics_comment_count is not None:
-                    comment_count = initial_statistics_comment_count
-                else:
-                    comment_count = 0
-                try:
-                    cached_comment_counter: int | None = None
-                    try:
-                        # まず Redis キャッシュを参照し、通常時は DB クエリを避ける
-                        cached_comment_counter = await GetThreadCommentCounterCache(thread.id)
-                    except Exception as cache_ex:
-                        # Redis 読み取り失敗時も DB フォールバックを継続し、コメント数の更新停止を防ぐ
-                        if (current_time - last_comment_counter_error_log_time) > 15:
-                            logging.warning(
-                                f'WatchSessionAPI [{channel_id}]: Failed to fetch comment counter cache. Falling back to DB.',
-                                exc_info = cache_ex,
-                            )
-                            last_comment_counter_error_log_time = current_time
-
-                    if cached_comment_counter is not None:
-                        comment_count = cached_comment_counter
-                        # キャッシュがあっても無期限に信用しない
-                        ## 一定間隔で DB の CommentCounter と突合し、キャッシュの stale 化を防ぐ
-                        should_validate_cached_counter = (
-                            current_time >= next_comment_counter_db_retry_time
-                            and current_time >= next_comment_counter_validation_time
-                        )
-                        if should_validate_cached_counter is True:
-                            # DB 値を正として再同期し、誤ったキャッシュを自己修復する
-                            comment_count = (await CommentCounter.get(thread_id=thread.id)).max_no
-                            try:
-                                await UpdateThreadCommentCounterCache(thread.id, comment_count)
-                            except Exception as cache_ex:
-                                logging.warning(
-                                    f'WatchSessionAPI [{channel_id}]: Failed to update validated comment counter cache.',
-                                    exc_info = cache_ex,
-                                )
-                            next_comment_counter_db_retry_time = 0.0
-                            next_comment_counter_validation_time = current_time + comment_counter_db_validation_interval_seconds
-                    elif current_time >= next_comment_counter_db_retry_time:
-                        # キャッシュ欠損時は DB から復元し、その値を Redis へ戻す
-                        comment_count = (await CommentCounter.get(thread_id=thread.id)).max_no
-                        try:
-                            await UpdateThreadCommentCounterCache(thread.id, comment_count)
-                        except Exception as cache_ex:
-                            logging.warning(
-                                f'WatchSessionAPI [{channel_id}]: Failed to update restored comment counter cache.',
-                                exc_info = cache_ex,
-                            )
-                        next_comment_counter_db_retry_time = 0.0
-                        next_comment_counter_validation_time = current_time + comment_counter_db_validation_interval_seconds
-                except DoesNotExist as ex:
-                    # 稀に採番テーブルのレコードが欠損している場合は、現存コメント数から再作成して回復を試みる
-                    if (current_time - last_comment_counter_error_log_time) > 15:
-                        logging.warning(
-                            f'WatchSessionAPI [{channel_id}]: CommentCounter record is missing. Trying to recover from comments table.',
-                            exc_info = ex,
-                        )
-                        last_comment_counter_error_log_time = current_time
-                    if current_time >= next_comment_counter_db_retry_time:
-                        try:
-                            # no は採番テーブルで単調増加している前提なので、最新行判定には id を使って負荷を抑える
-                            ## 欠損回復時のみ実行される経路のため、ここでは最小コストで復旧を優先する
-                            latest_comment = await Comment.filter(thread_id=thread.id).order_by('-id').first()
-                            comment_count = latest_comment.no if latest_comment is not None else 0
-                            existing_comment_counter = await CommentCounter.filter(thread_id=thread.id).first()
-                            synchronized_comment_count = comment_count
-                            if existing_comment_counter is not None:
-                                synchronized_comment_count = max(existing_comment_counter.max_no, comment_count)
-                                if existing_comment_counter.max_no != synchronized_comment_count:
-                                    existing_comment_counter.max_no = synchronized_comment_count
-                                    await existing_comment_counter.save(update_fields=['max_no'])
-                            else:
-                                await CommentCounter.create(
-                                    thread_id = thread.id,
-                                    max_no = synchronized_comment_count,
-                                )
-                            try:
-                                await UpdateThreadCommentCounterCache(thread.id, synchronized_comment_count)
-                            except Exception as cache_ex:
-                                logging.warning(
-                                    f'WatchSessionAPI [{channel_id}]: Failed to update recovered comment counter cache.',
-                                    exc_info = cache_ex,
-                                )
-                            comment_count = synchronized_comment_count
-                            next_comment_counter_db_retry_time = 0.0
-                            next_comment_counter_validation_time = current_time + comment_counter_db_validation_interval_seconds
-                        except Exception as recovery_ex:
-                            if IsDatabaseConnectionUnavailableError(recovery_ex) is True:
-                                next_comment_counter_db_retry_time = max(next_comment_counter_db_retry_time, current_time + 15)
-                            if (current_time - last_comment_counter_error_log_time) > 15:
-                                logging.warning(
-                                    f'WatchSessionAPI [{channel_id}]: Failed to recover missing CommentCounter. Falling back to cached value.',
-                                    exc_info = recovery_ex,
-                                )
-                                last_comment_counter_error_log_time = current_time
-                except Exception as ex:
-                    if IsDatabaseConnectionUnavailableError(ex) is True:
-                        # DB ダウン中に毎ループで再試行すると負荷が跳ねるため、再試行時刻を先送りする
-                        next_comment_counter_db_retry_time = max(next_comment_counter_db_retry_time, current_time + 15)
-                        # DB 接続断が継続している間は、同一エラーのログ連打を抑止する
-                        if (current_time - last_comment_counter_error_log_time) > 15:
-                            logging.warning(
-                                f'WatchSessionAPI [{channel_id}]: Failed to fetch comment counter. Falling back to cached value.',
-                                exc_info = ex,
-                            )
-                            last_comment_counter_error_log_time = current_time
-                    else:
-                        # Redis 障害など DB 接続断以外の取得失敗時も、接続維持を優先して前回値にフォールバックする
-                        ## 短時間の障害でセッション自体を切断しないことを優先する
-                        if (current_time - last_comment_counter_error_log_time) > 15:
-                            logging.warning(
-                                f'WatchSessionAPI [{channel_id}]: Failed to fetch comment counter by unexpected error. Falling back to cached value.',
-                                exc_info = ex,
-                            )
-                            last_comment_counter_error_log_time = current_time
-
-                # 送信した値を次回フォールバック値として保持する
-                last_statistics_comment_count = comment_count
-                viewer_count = 0
-                try:
-                    viewer_count = int(await REDIS_CLIENT.hget(REDIS_KEY_VIEWER_COUNT, channel_id) or 0)
-                except Exception as ex:
-                    # Redis 障害時でも statistics 送信を継続し、接続体験の劣化を最小限に抑える
-                    if (current_time - last_viewer_counter_error_log_time) > 15:
-                        logging.warning(
-                            f'WatchSessionAPI [{channel_id}]: Failed to fetch viewer counter. Falling back to zero.',
-                            exc_info = ex,
-                        )
-                        last_viewer_counter_error_log_time = current_time
-                is_sent = await SendJSONSafely(websocket, {
-                    'type': 'statistics',
-                    'data': {
-                        'viewers': viewer_count,
-                        'comments': comment_count,
-                        'adPoints': 0,  # NX-Jikkyo では常に 0 を返す
-                        'giftPoints': 0,  # NX-Jikkyo では常に 0 を返す
-                    },
-                })
-                if is_sent is False:
-                    return
-                last_statistics_time = current_time
-
-            # 45 秒に 1 回サーバー時刻を送信 (互換性のため)
-            if (time.time() - last_server_time_time) > 45:
-                is_sent = await SendJSONSafely(websocket, {
-                    'type': 'serverTime',
-                    'data': {
-                        'serverTime': timezone.now().isoformat(),
-                    },
-                })
-                if is_sent is False:
-                    return
-                last_server_time_time = time.time()
+        # 視聴統計情報・サーバー時刻・ping の定期送信は、サーバープロセス全体で 1 つの WATCH_SESSION_TICKER がまとめて行う
+        ## 接続ごとに定期的に起床したり、Redis から同じ値を個別に取得したりしないようにする
+        WATCH_SESSION_TICKER.register(websocket, channel_id, thread.id)
 
-            # 30 秒に 1 回 ping を送信 (互換性のため)
-            if (time.time() - last_ping_time) > 30:
-                is_sent = await SendJSONSafely(websocket, {'type': 'ping'})
-                if is_sent is False:
-                    return
-                last_ping_time = time.time()
+        try:
 
             # 処理開始時点では放送中だった場合のみ、スレッドの放送終了時刻を過ぎたら接続を切断する
-            ## 最初から過去のスレッドだった場合は実行しない
-            if is_on_air is True and timezone.now() > thread.end_at:
-                logging.info(f'WatchSessionAPI [{channel_id}]: Client {watch_session_client_id} disconnected because the thread ended.')
-                is_sent = await SendJSONSafely(websocket, {
-                    'type': 'disconnect',
-                    'data': {
-                        'reason': 'END_PROGRAM',
-                    },
-                })
-                if is_sent is False:
-                    return
-                await CloseWebSocketSafely(websocket, code=1000)  # 正常終了扱い
+            ## 最初から過去のスレッドだった場合は、受信タスク側で接続の切断を検知するまで待機し続ける
+            is_on_air = thread.start_at < timezone.now() < thread.end_at
+            if is_on_air is False:
+                await asyncio.Future()
+
+            # スレッドの放送終了時刻から、接続ごとにランダムに分散させた時間が経過するまで待機する
+            ## 接続ごとに asyncio.sleep() で待機する代わりにタイマーホイールに登録し、同じ時刻に切断する視聴セッションを 1 回の起床でまとめて再開させる
+            ## 全ての視聴セッションを放送終了時刻に一斉に切断すると、全クライアントが同時に次のスレッドに再接続してくるため、切断を分散させる
+            ## 分散させている間に投稿されたコメントは、受信タスク側で次のスレッドに投稿される
+            await TIMER_WHEEL.waitUntil(thread.end_at.timestamp() + random.uniform(0, THREAD_ROLLOVER_DISCONNECT_SPREAD_SECONDS))
+
+            logging.info(f'WatchSessionAPI [{channel_id}]: Client {watch_session_client_id} disconnected because the thread ended.')
+            is_sent = await SendJSONSafely(websocket, {
+                'type': 'disconnect',
+                'data': {
+                    'reason': 'END_PROGRAM',
+                },
+            })
+            if is_sent is False:
                 return
+            await CloseWebSocketSafely(websocket, code=1000)  # 正常終了扱い
 
-            # 次の実行まで1秒待つ
-            await asyncio.sleep(1)
+        finally:
+            WATCH_SESSION_TICKER.unregister(websocket, channel_id, thread.id)
 
-            # 接続が切れたらタスクを終了
-            if IsWebSocketDisconnected(websocket) is True:
-                return
+    # このサーバープロセスの視聴セッションの接続数を 1 増やす
+    METRICS.increment('nx_jikkyo_websocket_connections', 1, kind='watch', channel=channel_id)
 
     try:
 
@@ -1310,6 +2067,8 @@ async def WatchSessionAPI(
             await CloseWebSocketSafely(websocket, code=1011, reason=f'[{channel_id}]: Error during connection.')
 
     finally:
+        METRICS.increment('nx_jikkyo_websocket_connections', -1, kind='watch', channel=channel_id)
+
         # ここまできたら確実に接続が切断されているので同時接続数カウントを 1 減らす
         ## 最低でも 0 未満にはならないようにする
         try:
@@ -1361,8 +2120,12 @@ async def CommentSessionAPI(
     logging.info(f'CommentSessionAPI [{channel_id}]: Client {comment_session_client_id} connected.')
     logging.info(f'CommentSessionAPI [{channel_id}]: User-Agent: {websocket.headers.get("User-Agent", "Unknown")}')
 
+    # クライアントが Sec-WebSocket-Protocol でバイナリ形式のサブプロトコルを要求している場合のみ、chat メッセージをバイナリ形式で送信する
+    ## NicoJK や KonomiTV などの既存のクライアントはサブプロトコルを指定しないため、従来どおり JSON 形式で送信される
+    is_binary_format = COMMENT_BINARY_SUBPROTOCOL in websocket.scope.get('subprotocols', [])
+
     # 接続を受け入れる
-    await websocket.accept()
+    await websocket.accept(subprotocol=COMMENT_BINARY_SUBPROTOCOL if is_binary_format is True else None)
 
     # 指定されたスレッドの新着コメントがあれば随時送信するタスク
     sender_task: asyncio.Task[None] | None = None
@@ -1442,7 +2205,7 @@ async def CommentSessionAPI(
                             thread_id = int(message['thread']['thread'])
                             # jk263 の場合のみ、スレッドの所属チャンネル確認処理を実行
                             if need_check_thread_owner:
-                                thread = await Thread.filter(id=thread_id).first()
+                                thread = await GetThread(thread_id)
                                 if thread and thread.channel_id == 263:
                                     # jk263 の過去ログの場合は channel_id を jk263 に戻す
                                     channel_id = original_channel_id
@@ -1494,24 +2257,51 @@ async def CommentSessionAPI(
                         return
 
                     # ここまできたらスレッド ID と res_from が取得できているので、当該スレッドの情報を取得
-                    thread = await Thread.filter(id=thread_id).first()
+                    thread = await GetThread(thread_id)
                     if not thread:
                         # 指定された ID と一致するスレッドが見つからない
                         logging.error(f'CommentSessionAPI [{channel_id}]: Active thread not found.')
                         await CloseWebSocketSafely(websocket, code=1002, reason=f'[{channel_id}]: Active thread not found.')
                         return
 
-                    # 当該スレッドの最新 res_from 件のコメントを取得
-                    ## when が設定されている場合のみ、when より前のコメントを取得
-                    if when is not None:
-                        comments = await Comment.filter(thread_id=thread.id, date__lt=when).order_by('-id').limit(abs(res_from))  # res_from を正の値に変換
-                    else:
-                        comments = await Comment.filter(thread_id=thread.id).order_by('-id').limit(abs(res_from))  # res_from を正の値に変換
-                    ## コメントを新しい順 (降順) に取得したので、古い順 (昇順) に並べ替える
-                    comments.reverse()
+                    # スレッドが放送中かどうか
+                    is_thread_live = thread.start_at.timestamp() < time.time() < thread.end_at.timestamp()
+
+                    # 放送中のスレッドで when が指定されていない場合は、当該スレッドの最新 res_from 件のコメントを Broadcaster のリングバッファから取得
+                    ## 回線障害などで大量のクライアントが一斉に再接続してきても、同じクエリが DB に殺到しないようにする
+                    ## リングバッファに十分な数のコメントがない場合のみ、従来どおり DB から取得する
+                    broadcaster: ThreadCommentBroadcaster | None = None
+                    recent_frames: tuple[list[CommentFrame], int] | None = None
+                    if when is None and is_thread_live is True:
+                        broadcaster = await GetThreadCommentBroadcaster(thread)
+                        recent_frames = await broadcaster.getRecentFrames(abs(res_from))  # res_from を正の値に変換
+
+                    comments: list[Comment] = []
+                    if recent_frames is None:
+                        # 当該スレッドの最新 res_from 件のコメントを DB から取得
+                        ## when が設定されている場合のみ、when より前のコメントを取得
+                        if when is not None:
+                            comments = await Comment.filter(thread_id=thread.id, date__lt=when).order_by('-id').limit(abs(res_from))  # res_from を正の値に変換
+                        else:
+                            comments = await Comment.filter(thread_id=thread.id).order_by('-id').limit(abs(res_from))  # res_from を正の値に変換
+                        ## コメントを新しい順 (降順) に取得したので、古い順 (昇順) に並べ替える
+                        comments.reverse()
 
                     # 取得したコメントの最後のコメ番を取得 (なければ -1)
-                    last_comment_no = comments[-1].no if len(comments) > 0 else -1
+                    if recent_frames is not None:
+                        last_comment_no = recent_frames[0][-1].no if len(recent_frames[0]) > 0 else -1
+                    else:
+                        last_comment_no = comments[-1].no if len(comments) > 0 else -1
+
+                    # バイナリ形式の接続では、辞書と差分の基準値を thread メッセージごとに初期化する
+                    ## 前のスレッドの新着コメント配信タスクが同じエンコーダーを使って並行して送信しないよう、先に停止させておく
+                    binary_encoder: CommentBinaryEncoder | None = None
+                    if is_binary_format is True:
+                        if sender_task is not None:
+                            sender_task.cancel()
+                            await asyncio.gather(sender_task, return_exceptions=True)
+                            sender_task = None
+                        binary_encoder = CommentBinaryEncoder()
 
                     # スレッド情報を送る
                     ## この辺フォーマットがよくわからないので本家ニコ生と合ってるか微妙…
@@ -1530,14 +2320,30 @@ async def CommentSessionAPI(
                     logging.info(f'CommentSessionAPI [{channel_id}]: Thread info sent. thread: {thread_id} / last_res: {last_comment_no}')
 
                     # 初回取得コメントを連続送信する
-                    ## XML 互換データ形式に変換した後、必要に応じて yourpost フラグを設定してから送信している
-                    for comment in comments:
-                        is_sent = await SendJSONSafely(
-                            websocket,
-                            SetYourPostFlag(ConvertToXMLCompatibleCommentResponse(comment), thread_key),
-                        )
-                        if is_sent is False:
-                            return
+                    ## バイナリ形式の接続では、初回取得コメントを全て 1 つのバイナリメッセージにまとめて送信する
+                    ## リングバッファから取得した場合は、共有の送信用フレームをそのまま送信する
+                    ## DB から取得した場合は、XML 互換データ形式に変換した後、必要に応じて yourpost フラグを設定してから送信している
+                    if binary_encoder is not None:
+                        if recent_frames is not None:
+                            binary_parts_list = [frame.getBinaryParts() for frame in recent_frames[0]]
+                        else:
+                            binary_parts_list = [BuildCommentBinaryParts(ConvertToXMLCompatibleCommentResponse(comment)['chat']) for comment in comments]
+                        if len(binary_parts_list) > 0:
+                            is_sent = await SendBytesSafely(websocket, binary_encoder.encode(binary_parts_list, thread_key))
+                            if is_sent is False:
+                                return
+                    else:
+                        if recent_frames is not None:
+                            is_sent = await SendTextsSafely(websocket, [frame.getText(thread_key) for frame in recent_frames[0]])
+                            if is_sent is False:
+                                return
+                        for comment in comments:
+                            is_sent = await SendJSONSafely(
+                                websocket,
+                                SetYourPostFlag(ConvertToXMLCompatibleCommentResponse(comment), thread_key),
+                            )
+                            if is_sent is False:
+                                return
 
                     # when が指定されている場合は放送中かに関わらずここで終了し、次のコマンドを待ち受ける
                     ## when は取得するコメントの投稿日時の下限を示す UNIX タイムスタンプなので、指定時刻以降のコメントを送信する必要はない
@@ -1547,16 +2353,28 @@ async def CommentSessionAPI(
                     # スレッドが放送中の場合のみ、指定されたスレッドの新着コメントがあれば随時配信するタスクを非同期で実行開始
                     ## このとき、既に他のスレッドの最新コメント配信タスクが起動していた場合はキャンセルして停止させてから実行する
                     ## 過去ログの場合はすでに放送が終わっているのでこの処理は行わない
-                    if thread.start_at.timestamp() < time.time() < thread.end_at.timestamp():
+                    ## リングバッファから初回取得コメントを返した場合は、その続きの通し番号から配信することで、
+                    ## 初回取得コメントの送信中に投稿されたコメントも取りこぼさずに配信する
+                    if is_thread_live is True:
                         if sender_task is not None:
                             sender_task.cancel()
-                        sender_task = asyncio.create_task(RunSenderTask(thread, thread_key))
+                        sender_task = asyncio.create_task(RunSenderTask(
+                            thread,
+                            thread_key,
+                            start_sequence = recent_frames[1] if recent_frames is not None else None,
+                            binary_encoder = binary_encoder,
+                        ))
 
             # 接続が切れたらタスクを終了
             if IsWebSocketDisconnected(websocket) is True:
                 return
 
-    async def RunSenderTask(thread: Thread, thread_key: str) -> None:
+    async def RunSenderTask(
+        thread: Thread,
+        thread_key: str,
+        start_sequence: int | None = None,
+        binary_encoder: CommentBinaryEncoder | None = None,
+    ) -> None:
         """
         指定されたスレッドの新着コメントがあれば随時配信するタスク
         thread コマンドで指定されたスレッドが現在放送中であることを前提に、RunReceiverTask() 側で初回送信した以降のコメントをリアルタイムに配信する
@@ -1564,51 +2382,65 @@ async def CommentSessionAPI(
         Args:
             thread (Thread): 新着コメントの取得対象のスレッド情報
             thread_key (str): スレッドキー (互換性のためにこの名前になっているが、実際には接続先クライアントの watch_session_client_id)
+            start_sequence (int | None, optional): 最初に配信する Broadcaster のリングバッファ上の通し番号. Defaults to None.
+            binary_encoder (CommentBinaryEncoder | None, optional): バイナリ形式の接続で使うエンコーダー (JSON 形式の接続では None). Defaults to None.
         """
 
-        # 接続ごとの送信キューを初期化
-        subscriber_queue: asyncio.Queue[CommentBroadcastMessage] = asyncio.Queue(maxsize=COMMENT_QUEUE_MAX_SIZE)
+        # 接続情報を初期化
         current_sender_task = asyncio.current_task()
         sender_task_id = id(current_sender_task) if current_sender_task is not None else time.time_ns()
         subscriber_id = f'{comment_session_client_id}:{id(websocket)}:{sender_task_id}'
         subscriber = CommentSubscriber(
             client_id = comment_session_client_id,
             thread_key = thread_key,
-            queue = subscriber_queue,
         )
 
         # スレッド単位の Broadcaster に接続を登録する
-        broadcaster = await GetThreadCommentBroadcaster(thread.id)
-        await broadcaster.addSubscriber(subscriber_id, subscriber)
+        broadcaster = await GetThreadCommentBroadcaster(thread)
+        await broadcaster.addSubscriber(subscriber_id, subscriber, start_sequence)
 
-        # スレッドの放送終了時刻の Unix 時間
-        thread_end_time = thread.end_at.timestamp()
+        # 放送終了後に接続を切断する時刻 (放送終了時刻を過ぎるまでは None)
+        disconnect_time: float | None = None
 
         try:
             while True:
 
-                # 送信キューからコメントを取得する
-                ## この待機は最大 5 秒でタイムアウトし、タイムアウト時は接続状態や放送終了判定だけを行う
-                try:
-                    broadcast_message = await asyncio.wait_for(subscriber_queue.get(), timeout=5.0)
-                except TimeoutError:
-                    broadcast_message = None
-
-                if broadcast_message is not None:
-
-                    # 取得したコメントに必要に応じて yourpost フラグを設定してから送信
-                    if subscriber.thread_key == broadcast_message.user_id:
-                        yourpost_response = CopyXMLCompatibleCommentResponse(broadcast_message.base_comment)
-                        is_sent = await SendJSONSafely(
-                            websocket,
-                            SetYourPostFlag(yourpost_response, subscriber.thread_key),
-                        )
-                        if is_sent is False:
-                            return
+                # リングバッファに新しいコメントが追記されるか、スレッドの放送終了時刻を過ぎるまで待機する
+                ## 放送終了時刻はスレッドごとに 1 つのタイマーでまとめて通知されるため、接続ごとに定期的に起床する必要はない
+                ## 接続の切断は Receiver Task 側で検知され、このタスク自体がキャンセルされる
+                has_frames = await broadcaster.waitForFrames(subscriber)
+
+                if has_frames is True:
+
+                    # 送信まとめ待ち時間が設定されている場合は、その間に届いたコメントもまとめて送信する
+                    ## コメントが殺到している時間帯に、コメント 1 件ごとに待機と送信でタスクが切り替わるのを避ける
+                    ## クライアントはコメント 1 件 = WebSocket メッセージ 1 件の形式を前提としているため、フレーム自体は 1 件ずつ分けて送る
+                    if CONFIG.COMMENT_SEND_COALESCE_WINDOW_MS > 0:
+                        await asyncio.sleep(CONFIG.COMMENT_SEND_COALESCE_WINDOW_MS / 1000)
+
+                    # 未送信のコメントをリングバッファから全て取り出す
+                    comment_frames = broadcaster.readFrames(subscriber)
+
+                    # バイナリ形式の接続では、取り出したコメントを 1 つのバイナリメッセージにまとめて送信
+                    if binary_encoder is not None:
+                        is_sent = True
+                        if len(comment_frames) > 0:
+                            is_sent = await SendBytesSafely(
+                                websocket,
+                                binary_encoder.encode([frame.getBinaryParts() for frame in comment_frames], subscriber.thread_key),
+                            )
+                    # 投稿者本人の接続には yourpost フラグ付きの JSON を、それ以外の接続には共有の JSON をそのまま送信
                     else:
-                        is_sent = await SendTextSafely(websocket, broadcast_message.raw_json)
-                        if is_sent is False:
-                            return
+                        is_sent = await SendTextsSafely(websocket, [frame.getText(subscriber.thread_key) for frame in comment_frames])
+                    if is_sent is False:
+                        return
+
+                    # コメント遅延の計測対象のコメントについて、この接続への書き込みが完了した時刻を記録する
+                    if IsCommentTraceEnabled() is True:
+                        written_at = time.monotonic()
+                        for frame in comment_frames:
+                            if frame.trace is not None:
+                                RecordCommentTraceWritten(frame.trace, written_at)
 
                 # 接続が切れたらタスクを終了
                 ## 通常は Receiver Task 側で接続切断を検知した後このタスク自体がキャンセルされるため、ここには到達しないはず
@@ -1616,16 +2448,36 @@ async def CommentSessionAPI(
                     return
 
                 # 最新コメント配信中に当該スレッドの放送終了時刻を過ぎた場合は接続を切断する
-                if time.time() > thread_end_time:
+                ## 放送終了時刻の直前に届いて読み出していなかったコメントは、上で送信し終えている
+                if broadcaster.is_ended is True:
+
+                    # 全ての接続を一斉に切断すると全クライアントが同時に再接続してくるため、接続ごとにランダムに分散させた時刻まで待機する
+                    ## 待機中に届いたコメントを送信してから切断できるよう、待機後はもう一度ループの先頭から処理する
+                    if disconnect_time is None:
+                        disconnect_time = broadcaster.end_timestamp + random.uniform(0, THREAD_ROLLOVER_DISCONNECT_SPREAD_SECONDS)
+                        await TIMER_WHEEL.waitUntil(disconnect_time)
+                        continue
+
                     logging.info(f'CommentSessionAPI [{channel_id}]: Client {comment_session_client_id} disconnected because the thread ended.')
                     await CloseWebSocketSafely(websocket, code=1000)  # 正常終了扱い
                     return
 
         finally:
+            # 送信が追いつかずに読み飛ばしたコメントがあれば記録する
+            if subscriber.dropped_count > 0:
+                logging.warning(
+                    f'CommentSessionAPI [{channel_id}]: Client {comment_session_client_id} skipped {subscriber.dropped_count} comments '
+                    f'because sending could not keep up.'
+                )
             # タスク終了時に確実に接続を削除する
             await broadcaster.removeSubscriber(subscriber_id, subscriber)
             await CleanupThreadCommentBroadcaster(thread.id, broadcaster)
 
+    # このサーバープロセスのコメントセッションの接続数を 1 増やす
+    ## jk263 のスレッドを指定された場合などに channel_id が途中で書き換わるため、接続時点のチャンネル ID で数える
+    metrics_channel_id = channel_id
+    METRICS.increment('nx_jikkyo_websocket_connections', 1, kind='comment', channel=metrics_channel_id)
+
     try:
 
         # クライアントからのメッセージを受信するタスクの実行が完了するまで待機
@@ -1653,6 +2505,7 @@ async def CommentSessionAPI(
     # Sender Task を確実に終了する
     ## WebSocket の切断に気づくのは通常 Receiver Task の方が速いので、明示的に実行中の Sender Task をキャンセルする必要がある
     finally:
+        METRICS.increment('nx_jikkyo_websocket_connections', -1, kind='comment', channel=metrics_channel_id)
         if sender_task is not None:
             sender_task = cast(asyncio.Task[None], sender_task)
             sender_task.cancel()
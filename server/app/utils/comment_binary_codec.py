@@ -0,0 +1,240 @@
+from dataclasses import dataclass
+
+from app.models.comment import XMLCompatibleCommentResponseChat
+
+
+# コメントセッション WebSocket でコンパクトなバイナリ形式を使うためのサブプロトコル名
+## クライアントが Sec-WebSocket-Protocol にこの名前を含めた場合のみ、chat メッセージをバイナリ形式で送信する
+## それ以外のメッセージ (thread / ping) とクライアントから送信するメッセージは、従来どおり JSON のテキストメッセージのまま
+COMMENT_BINARY_SUBPROTOCOL = 'nx-jikkyo.comment.v1'
+
+# chat レコードのレコード種別
+COMMENT_BINARY_RECORD_TYPE_CHAT = 0x01
+
+# chat レコードのフラグ
+COMMENT_BINARY_FLAG_YOURPOST = 0x01
+COMMENT_BINARY_FLAG_PREMIUM = 0x02
+COMMENT_BINARY_FLAG_ANONYMITY = 0x04
+## mail / user_id の格納方法 (2 ビット) を置くビット位置
+COMMENT_BINARY_MAIL_MODE_SHIFT = 3
+COMMENT_BINARY_USER_ID_MODE_SHIFT = 5
+
+# mail / user_id の格納方法
+## 辞書に登録済みの文字列の番号だけを格納する
+COMMENT_BINARY_STRING_MODE_REFERENCE = 0
+## 文字列そのものを格納し、次の番号で辞書に登録する
+COMMENT_BINARY_STRING_MODE_DEFINE = 1
+## 文字列そのものを格納し、辞書には登録しない (辞書が上限に達している場合)
+COMMENT_BINARY_STRING_MODE_LITERAL = 2
+
+# 接続ごとの辞書に登録する文字列の最大数
+## 24 時間のスレッドではユーザー ID の種類が数万件に達するため、接続ごとのメモリ使用量に上限を設ける
+## 上限に達した後に初めて現れた文字列は、辞書に登録せずに毎回そのまま格納する
+COMMENT_BINARY_DICTIONARY_MAX_SIZE = 4096
+
+
+def EncodeVarint(buffer: bytearray, value: int) -> None:
+    """
+    0 以上の整数を可変長整数 (LEB128: 下位 7 ビットずつ、続きがあれば最上位ビットを立てる) としてバッファに追記する
+
+    Args:
+        buffer (bytearray): 追記先のバッファ
+        value (int): 0 以上の整数
+    """
+
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def EncodeZigZag(value: int) -> int:
+    """
+    符号付き整数を、絶対値が小さいほど小さな 0 以上の整数になるように変換する (ZigZag 符号化)
+    0, -1, 1, -2, 2 ... が 0, 1, 2, 3, 4 ... になる
+
+    Args:
+        value (int): 符号付き整数
+
+    Returns:
+        int: 変換後の 0 以上の整数
+    """
+
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+@dataclass(frozen=True, slots=True)
+class CommentBinaryParts:
+    """
+    コメント 1 件をバイナリ形式に変換する際に、送信先の接続によらず共通となる部分
+    コメント 1 件ごとに 1 度だけ生成し、各接続のエンコーダーは接続ごとの状態に依存する部分だけを組み立てる
+
+    Attributes:
+        no (int): コメ番
+        vpos (int): スレッド開始からのコメントの再生位置 (10ミリ秒単位)
+        date_usec (int): コメント投稿日時 (UNIX タイムスタンプをマイクロ秒単位にしたもの)
+        mail (bytes): コメントのコマンド (UTF-8)
+        user_id (bytes): ユーザー ID (UTF-8)
+        user_id_text (str): ユーザー ID (yourpost フラグの判定に使う)
+        content (bytes): 長さを前置したコメント本文 (UTF-8)
+        flags (int): yourpost 以外のフラグ
+    """
+
+    no: int
+    vpos: int
+    date_usec: int
+    mail: bytes
+    user_id: bytes
+    user_id_text: str
+    content: bytes
+    flags: int
+
+
+def BuildCommentBinaryParts(chat: XMLCompatibleCommentResponseChat) -> CommentBinaryParts:
+    """
+    XML 互換形式のコメントから、バイナリ形式に変換する際の共通部分を生成する
+
+    Args:
+        chat (XMLCompatibleCommentResponseChat): XML 互換形式のコメント
+
+    Returns:
+        CommentBinaryParts: バイナリ形式に変換する際の共通部分
+    """
+
+    content = chat['content'].encode('utf-8')
+    content_with_length = bytearray()
+    EncodeVarint(content_with_length, len(content))
+    content_with_length += content
+
+    flags = 0
+    if chat.get('premium', 0) == 1:
+        flags |= COMMENT_BINARY_FLAG_PREMIUM
+    if chat.get('anonymity', 0) == 1:
+        flags |= COMMENT_BINARY_FLAG_ANONYMITY
+
+    return CommentBinaryParts(
+        no = int(chat['no']),
+        vpos = int(chat['vpos']),
+        date_usec = int(chat['date']) * 1000000 + int(chat['date_usec']),
+        mail = chat['mail'].encode('utf-8'),
+        user_id = chat['user_id'].encode('utf-8'),
+        user_id_text = chat['user_id'],
+        content = bytes(content_with_length),
+        flags = flags,
+    )
+
+
+class CommentBinaryEncoder:
+    """
+    コメントセッション WebSocket の接続ごとに、コメントをコンパクトなバイナリ形式に変換する
+
+    1 つの WebSocket バイナリメッセージには、以下のレコードが 1 件以上連続して格納される
+    整数はすべて可変長整数 (LEB128) で、「差分」とあるものは直前のレコードの値との差を ZigZag 符号化したもの (最初のレコードは 0 との差)
+    - レコード長 (以降のレコード種別からレコード末尾までのバイト数 / 未知のレコード種別は読み飛ばせる)
+    - レコード種別 (1 バイト / 0x01: chat)
+    - フラグ (1 バイト / bit 0: yourpost, bit 1: premium, bit 2: anonymity, bit 3-4: mail の格納方法, bit 5-6: user_id の格納方法)
+    - コメ番の差分
+    - vpos の差分
+    - 投稿日時 (マイクロ秒単位の UNIX タイムスタンプ) の差分
+    - mail (格納方法が 0 なら辞書の番号、1 / 2 なら長さ + UTF-8 文字列)
+    - user_id (mail と同様)
+    - 長さ + コメント本文 (UTF-8 文字列)
+
+    mail / user_id の格納方法が 1 の場合、その文字列は 0 から始まる次の番号で接続ごとの辞書に登録され、以降は番号だけで参照される
+    辞書と差分の基準値は、thread メッセージを送信するたびに初期化される (クライアント側も thread メッセージを受信したら初期化する)
+    """
+
+    def __init__(self) -> None:
+
+        # 接続ごとの mail / user_id の辞書 (文字列 → 番号)
+        self.mail_indexes: dict[bytes, int] = {}
+        self.user_id_indexes: dict[bytes, int] = {}
+
+        # 差分の基準となる直前のレコードの値
+        self.last_no = 0
+        self.last_vpos = 0
+        self.last_date_usec = 0
+
+    def encode(self, parts_list: list[CommentBinaryParts], thread_key: str) -> bytes:
+        """
+        複数のコメントを、1 つの WebSocket バイナリメッセージとして送信するバイト列に変換する
+
+        Args:
+            parts_list (list[CommentBinaryParts]): 変換するコメントの共通部分 (送信する順序)
+            thread_key (str): 送信先の接続のスレッドキー (yourpost フラグの判定に使う)
+
+        Returns:
+            bytes: WebSocket バイナリメッセージとして送信するバイト列
+        """
+
+        message = bytearray()
+        record = bytearray()
+        for parts in parts_list:
+            record.clear()
+
+            # mail / user_id を辞書で置き換えられるか判定する
+            mail_index, mail_mode = self._intern(self.mail_indexes, parts.mail)
+            user_id_index, user_id_mode = self._intern(self.user_id_indexes, parts.user_id)
+
+            flags = parts.flags | (mail_mode << COMMENT_BINARY_MAIL_MODE_SHIFT) | (user_id_mode << COMMENT_BINARY_USER_ID_MODE_SHIFT)
+            if thread_key == parts.user_id_text:
+                flags |= COMMENT_BINARY_FLAG_YOURPOST
+            record.append(COMMENT_BINARY_RECORD_TYPE_CHAT)
+            record.append(flags)
+
+            # コメ番・vpos・投稿日時は直前のコメントとの差分にすることで、ほとんどの場合 1 〜 3 バイトに収まる
+            EncodeVarint(record, EncodeZigZag(parts.no - self.last_no))
+            EncodeVarint(record, EncodeZigZag(parts.vpos - self.last_vpos))
+            EncodeVarint(record, EncodeZigZag(parts.date_usec - self.last_date_usec))
+            self.last_no = parts.no
+            self.last_vpos = parts.vpos
+            self.last_date_usec = parts.date_usec
+
+            self._appendString(record, parts.mail, mail_index, mail_mode)
+            self._appendString(record, parts.user_id, user_id_index, user_id_mode)
+            record += parts.content
+
+            EncodeVarint(message, len(record))
+            message += record
+
+        return bytes(message)
+
+    @staticmethod
+    def _intern(indexes: dict[bytes, int], value: bytes) -> tuple[int, int]:
+        """
+        文字列を辞書で置き換えられるか判定し、必要に応じて辞書に登録する
+
+        Args:
+            indexes (dict[bytes, int]): 接続ごとの辞書
+            value (bytes): 文字列
+
+        Returns:
+            tuple[int, int]: 辞書の番号 (辞書を使わない場合は -1) と格納方法
+        """
+
+        index = indexes.get(value)
+        if index is not None:
+            return index, COMMENT_BINARY_STRING_MODE_REFERENCE
+        if len(indexes) >= COMMENT_BINARY_DICTIONARY_MAX_SIZE:
+            return -1, COMMENT_BINARY_STRING_MODE_LITERAL
+        index = len(indexes)
+        indexes[value] = index
+        return index, COMMENT_BINARY_STRING_MODE_DEFINE
+
+    @staticmethod
+    def _appendString(record: bytearray, value: bytes, index: int, mode: int) -> None:
+        """
+        格納方法に応じて、辞書の番号または文字列そのものをレコードに追記する
+
+        Args:
+            record (bytearray): 追記先のレコード
+            value (bytes): 文字列
+            index (int): 辞書の番号
+            mode (int): 格納方法
+        """
+
+        if mode == COMMENT_BINARY_STRING_MODE_REFERENCE:
+            EncodeVarint(record, index)
+        else:
+            EncodeVarint(record, len(value))
+            record += value
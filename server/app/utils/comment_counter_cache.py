@@ -1,8 +1,13 @@
+from tortoise.backends.base.client import TransactionalDBClient
+
 from app import logging
 from app.constants import (
     REDIS_CLIENT,
     REDIS_KEY_THREAD_COMMENT_COUNTER,
+    REDIS_KEY_THREAD_COMMENT_COUNTER_DIRTY_THREADS,
 )
+from app.models.comment import Comment, CommentCounter
+from app.utils.transaction import RunTransactionWithReconnectRetry
 
 
 # Redis への更新は「投稿パス」「インポートパス」「定期同期パス」から同時に到達する
@@ -28,6 +33,45 @@ end
 return current_comment_no
 """
 
+# Redis 採番モードで、最新コメ番キャッシュを採番カウンタとしてそのまま使い、N 件分のコメ番を原子的に確保する
+## キャッシュが存在しない (Redis 再起動直後など) 状態で HINCRBY すると 0 から採番してしまい、既存のコメ番と重複する
+## そのためキャッシュが存在しない場合は採番せずに false を返し、呼び出し元に DB からの復元を促す
+## 採番したスレッド ID は書き戻し待ちの集合に追加し、バックグラウンドで MySQL の採番テーブルへ書き戻す
+THREAD_COMMENT_COUNTER_ALLOCATE_SCRIPT = """
+local cache_key = KEYS[1]
+local dirty_threads_key = KEYS[2]
+local thread_field = ARGV[1]
+local allocate_count = tonumber(ARGV[2])
+
+if redis.call('HEXISTS', cache_key, thread_field) == 0 then
+    return false
+end
+
+local last_comment_no = redis.call('HINCRBY', cache_key, thread_field, allocate_count)
+redis.call('SADD', dirty_threads_key, thread_field)
+return last_comment_no
+"""
+
+# 書き戻し待ちのスレッド ID と、その時点の最新コメ番をまとめて取り出す
+## SMEMBERS と DEL を 1 コマンドで実行し、取り出しと同時に別プロセスが追加したスレッド ID を取りこぼさないようにする
+THREAD_COMMENT_COUNTER_POP_DIRTY_SCRIPT = """
+local cache_key = KEYS[1]
+local dirty_threads_key = KEYS[2]
+
+local thread_fields = redis.call('SMEMBERS', dirty_threads_key)
+redis.call('DEL', dirty_threads_key)
+
+local result = {}
+for _, thread_field in ipairs(thread_fields) do
+    local comment_no = redis.call('HGET', cache_key, thread_field)
+    if comment_no ~= false then
+        table.insert(result, thread_field)
+        table.insert(result, comment_no)
+    end
+end
+return result
+"""
+
 
 async def GetThreadCommentCounterCache(thread_id: int) -> int | None:
     """
@@ -81,3 +125,106 @@ async def UpdateThreadCommentCounterCache(thread_id: int, comment_no: int) -> in
         str(comment_no),
     )
     return int(updated_comment_counter)
+
+
+async def AllocateThreadCommentNumbers(thread_id: int, count: int) -> int:
+    """
+    Redis 上の最新コメ番キャッシュをカウンタとして、N 件分のコメ番を原子的に確保する (Redis 採番モード用)
+    キャッシュが存在しない場合は DB の採番テーブルとコメントから最新コメ番を復元してから採番する
+
+    Args:
+        thread_id (int): スレッド ID
+        count (int): 確保するコメ番の件数
+
+    Returns:
+        int: 確保したコメ番のうち最大のもの (確保したコメ番は (戻り値 - count + 1) 〜 戻り値)
+    """
+
+    for _ in range(2):
+        last_comment_no = await REDIS_CLIENT.eval(
+            THREAD_COMMENT_COUNTER_ALLOCATE_SCRIPT,
+            2,
+            REDIS_KEY_THREAD_COMMENT_COUNTER,
+            REDIS_KEY_THREAD_COMMENT_COUNTER_DIRTY_THREADS,
+            str(thread_id),
+            str(count),
+        )
+        if last_comment_no is not None:
+            return int(last_comment_no)
+
+        # キャッシュが存在しない場合は DB から復元してから採番し直す
+        ## 複数プロセスが同時に復元しても、単調増加更新なので既に採番済みの値を巻き戻すことはない
+        await RestoreThreadCommentCounterCache(thread_id)
+
+    # 復元直後にキャッシュが消えるのは Redis の再起動が続いている場合くらいなので、呼び出し元にエラーとして返す
+    raise RuntimeError(f'AllocateThreadCommentNumbers: Comment counter cache is unavailable. thread_id: {thread_id}')
+
+
+async def RestoreThreadCommentCounterCache(thread_id: int) -> int:
+    """
+    DB の採番テーブルとコメントから最新コメ番を求め、Redis 上の最新コメ番キャッシュへ復元する
+
+    Redis 採番モードでは採番テーブルへの書き戻しが遅れるため、採番テーブルの値だけでは不十分
+    実際に保存されている最新コメントのコメ番とも比較し、大きい方を採用する
+
+    Args:
+        thread_id (int): スレッド ID
+
+    Returns:
+        int: 復元後に Redis に保存されている最新コメ番
+    """
+
+    comment_counter = await CommentCounter.filter(thread_id=thread_id).first()
+    # no は採番で単調増加している前提なので、最新行判定には負荷の軽い id を使う
+    latest_comment = await Comment.filter(thread_id=thread_id).order_by('-id').first()
+    restored_comment_no = max(
+        comment_counter.max_no if comment_counter is not None else 0,
+        latest_comment.no if latest_comment is not None else 0,
+    )
+    logging.info(f'RestoreThreadCommentCounterCache: Comment counter cache has been restored. thread_id: {thread_id}, max_no: {restored_comment_no}')
+    return await UpdateThreadCommentCounterCache(thread_id, restored_comment_no)
+
+
+async def WriteBackThreadCommentCounters() -> int:
+    """
+    Redis 採番モードで採番した最新コメ番を、MySQL の採番テーブルへまとめて書き戻す
+
+    Returns:
+        int: 書き戻したスレッドの数
+    """
+
+    # 書き戻し待ちのスレッド ID と最新コメ番を取り出す
+    raw_result: list[str] = await REDIS_CLIENT.eval(
+        THREAD_COMMENT_COUNTER_POP_DIRTY_SCRIPT,
+        2,
+        REDIS_KEY_THREAD_COMMENT_COUNTER,
+        REDIS_KEY_THREAD_COMMENT_COUNTER_DIRTY_THREADS,
+    )
+    comment_counters = [
+        [int(raw_result[index + 1]), int(raw_result[index])]
+        for index in range(0, len(raw_result), 2)
+    ]
+    if len(comment_counters) == 0:
+        return 0
+
+    async def WriteBackInTransaction(connection: TransactionalDBClient) -> None:
+        # 既に採番テーブルの方が大きい場合 (採番方式の切り替え直後など) は巻き戻さない
+        await connection.execute_many(
+            'UPDATE comment_counters SET max_no = GREATEST(max_no, %s) WHERE thread_id = %s',
+            comment_counters,
+        )
+
+    try:
+        await RunTransactionWithReconnectRetry(
+            operation = WriteBackInTransaction,
+            operation_name = 'WriteBackThreadCommentCounters',
+        )
+    except Exception:
+        # 書き戻せなかったスレッド ID は書き戻し待ちの集合へ戻し、次回の書き戻しで再試行する
+        await REDIS_CLIENT.sadd(
+            REDIS_KEY_THREAD_COMMENT_COUNTER_DIRTY_THREADS,
+            *[str(thread_id) for _, thread_id in comment_counters],
+        )
+        raise
+
+    return len(comment_counters)
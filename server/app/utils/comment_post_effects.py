@@ -0,0 +1,143 @@
+import json
+from dataclasses import dataclass
+
+from app.constants import (
+    REDIS_CHANNEL_THREAD_COMMENTS_PREFIX,
+    REDIS_CLIENT,
+    REDIS_KEY_COMMENT_WRITE_BEHIND_STREAM,
+    REDIS_KEY_JIKKYO_FORCE_COUNT,
+    REDIS_KEY_THREAD_COMMENT_COUNTER,
+)
+
+
+# 実況勢いとして数える期間 (秒)
+## 現在時刻からこの秒数以内に投稿されたコメントの数が実況勢いとなる
+JIKKYO_FORCE_COUNT_WINDOW_SECONDS = 60
+
+# コメント投稿後に必要な Redis 上の処理を 1 回の往復でまとめて実行する
+## 以前は「最新コメ番キャッシュの更新 (EVAL)」「Pub/Sub 配信」「実況勢いカウントへの追加」「古いエントリの削除 (1/10 の確率)」を
+## 個別に呼び出していたため、1 コメントあたり最大 4 回 Redis との往復が発生していた
+## Lua script はアトミックに実行されるため、write-behind モードでの Redis Stream への追加と配信の不可分性もこの script で保証する
+## ARGV[8] 以降には、コメントごとに「配信するメッセージ」「実況勢いカウントのメンバー名」「(write-behind モードのみ) Redis Stream のエントリ (JSON)」を順に並べる
+COMMENT_POST_EFFECTS_SCRIPT = """
+local counter_key = KEYS[1]
+local force_count_key = KEYS[2]
+local write_behind_stream_key = KEYS[3]
+local channel = ARGV[1]
+local thread_field = ARGV[2]
+local last_comment_no = tonumber(ARGV[3])
+local should_update_counter = ARGV[4] == '1'
+local current_time = tonumber(ARGV[5])
+local force_count_window = tonumber(ARGV[6])
+local is_write_behind = ARGV[7] == '1'
+
+-- 最新コメ番キャッシュを単調増加で更新する (MySQL 採番モードのみ)
+-- Redis 採番モードでは採番の時点でキャッシュ自体が更新済みなので、現在値を返すだけでよい
+-- キャッシュの値が数値として解釈できない場合は、未保存として扱う
+local current_comment_no = tonumber(redis.call('HGET', counter_key, thread_field) or '0') or 0
+if should_update_counter and current_comment_no < last_comment_no then
+    redis.call('HSET', counter_key, thread_field, last_comment_no)
+    current_comment_no = last_comment_no
+end
+
+local stride = 2
+if is_write_behind then
+    stride = 3
+end
+
+-- write-behind モードでは、配信したのに DB に保存されないコメントが生じないよう、Redis Stream への追加を先に行う
+if is_write_behind then
+    for index = 8, #ARGV, stride do
+        local entry = cjson.decode(ARGV[index + 2])
+        local fields = {}
+        for field, value in pairs(entry) do
+            table.insert(fields, field)
+            table.insert(fields, value)
+        end
+        redis.call('XADD', write_behind_stream_key, '*', unpack(fields))
+    end
+end
+
+-- コメ番順にコメントを配信し、実況勢いカウントにエントリを追加する
+local receiver_count = 0
+for index = 8, #ARGV, stride do
+    receiver_count = receiver_count + redis.call('PUBLISH', channel, ARGV[index])
+    redis.call('ZADD', force_count_key, current_time, ARGV[index + 1])
+end
+
+-- 実況勢いとして数える期間を過ぎたエントリを毎回削除する
+-- 削除されるのは前回の実行以降に期間を過ぎたエントリだけなので、毎回実行しても負荷はほとんど変わらない
+redis.call('ZREMRANGEBYSCORE', force_count_key, 0, current_time - force_count_window)
+
+return {current_comment_no, receiver_count}
+"""
+__comment_post_effects_script = REDIS_CLIENT.register_script(COMMENT_POST_EFFECTS_SCRIPT)
+
+
+@dataclass(slots=True)
+class CommentPostEffectsResult:
+    """
+    コメント投稿後の Redis 上の処理結果
+
+    Attributes:
+        latest_comment_no (int): 処理後に Redis に保存されているスレッドの最新コメ番
+        receiver_count (int): 配信したメッセージを受信したサーバープロセス数の合計
+    """
+
+    latest_comment_no: int
+    receiver_count: int
+
+
+async def ApplyCommentPostEffects(
+    thread_id: int,
+    channel_id: str,
+    comment_nos: list[int],
+    messages: list[str],
+    current_time: float,
+    should_update_counter: bool,
+    write_behind_entries: list[dict[str, str]] | None = None,
+) -> CommentPostEffectsResult:
+    """
+    コメント投稿後に必要な Redis 上の処理 (最新コメ番キャッシュの更新・Pub/Sub 配信・実況勢いカウントの更新) を 1 回の往復で実行する
+
+    Args:
+        thread_id (int): スレッド ID
+        channel_id (str): 実況チャンネル ID (ex: jk211)
+        comment_nos (list[int]): 投稿されたコメントのコメ番 (コメ番順)
+        messages (list[str]): 配信するメッセージ (comment_nos と同じ順序)
+        current_time (float): 現在のサーバー時刻 (UNIX タイムスタンプ)
+        should_update_counter (bool): 最新コメ番キャッシュを更新するかどうか (Redis 採番モードでは不要)
+        write_behind_entries (list[dict[str, str]] | None, optional): write-behind モードで Redis Stream に追加するエントリ. Defaults to None.
+
+    Returns:
+        CommentPostEffectsResult: 処理結果
+    """
+
+    args: list[str] = [
+        f'{REDIS_CHANNEL_THREAD_COMMENTS_PREFIX}:{thread_id}',
+        str(thread_id),
+        str(comment_nos[-1]),
+        '1' if should_update_counter is True else '0',
+        repr(current_time),
+        str(JIKKYO_FORCE_COUNT_WINDOW_SECONDS),
+        '1' if write_behind_entries is not None else '0',
+    ]
+    for index, (comment_no, message) in enumerate(zip(comment_nos, messages)):
+        args.append(message)
+        # 一括 INSERT では id が確定しないため、メンバーはスレッド ID とコメ番の組で一意にする
+        args.append(f'comment:{thread_id}:{comment_no}')
+        if write_behind_entries is not None:
+            args.append(json.dumps(write_behind_entries[index], ensure_ascii=False))
+
+    result: list[int] = await __comment_post_effects_script(
+        keys = [
+            REDIS_KEY_THREAD_COMMENT_COUNTER,
+            f'{REDIS_KEY_JIKKYO_FORCE_COUNT}:{channel_id}',
+            REDIS_KEY_COMMENT_WRITE_BEHIND_STREAM,
+        ],
+        args = args,
+    )
+    return CommentPostEffectsResult(
+        latest_comment_no = int(result[0]),
+        receiver_count = int(result[1]),
+    )
@@ -0,0 +1,304 @@
+import random
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from app.config import CONFIG
+
+
+# サンプリングしたコメントの Redis Pub/Sub メッセージの先頭に付ける、各段階の時刻を格納する接頭辞
+## コメント JSON は必ず { から始まるため、先頭が # かどうかだけで接頭辞の有無を判定できる
+## 形式: #trace:<受け付け時刻>,<DB 保存完了時刻>,<Redis 配信時刻>#{"chat":{...}}
+COMMENT_TRACE_PREFIX = '#trace:'
+COMMENT_TRACE_SUFFIX = '#'
+
+# コメント遅延の計測区間の名前と説明
+## 時刻はすべて time.monotonic() の値で、Linux では同じホスト上の全サーバープロセスで共通の時計 (CLOCK_MONOTONIC) になる
+## そのため、投稿を受け付けたサーバープロセスと配信したサーバープロセスが異なっていても区間の長さを求められる
+COMMENT_TRACE_STAGES: dict[str, str] = {
+    'accept_to_commit': 'コメント投稿の受け付けから、採番と DB への保存 (write-behind モードでは採番のみ) が完了するまで',
+    'commit_to_publish': 'DB への保存の完了から、Redis Pub/Sub への配信を開始するまで',
+    'publish_to_receive': 'Redis Pub/Sub への配信から、各サーバープロセスの Broadcaster が受信するまで',
+    'receive_to_enqueue': 'Broadcaster での受信から、送信用フレームを生成してリングバッファに追記するまで',
+    'enqueue_to_write': 'リングバッファへの追記から、各接続の WebSocket への書き込みが完了するまで (接続ごと)',
+    'accept_to_write': 'コメント投稿の受け付けから、各接続の WebSocket への書き込みが完了するまで (接続ごと)',
+}
+
+
+@dataclass(slots=True)
+class CommentTrace:
+    """
+    サンプリングしたコメントの、各段階を通過した時刻 (time.monotonic() の値)
+
+    Attributes:
+        accepted_at (float): コメント投稿を受け付けた時刻
+        committed_at (float): 採番と DB への保存が完了した時刻
+        published_at (float): Redis Pub/Sub への配信を開始した時刻
+        received_at (float): Broadcaster が Redis Pub/Sub から受信した時刻
+        enqueued_at (float): 送信用フレームをリングバッファに追記した時刻
+    """
+
+    accepted_at: float
+    committed_at: float = 0.0
+    published_at: float = 0.0
+    received_at: float = 0.0
+    enqueued_at: float = 0.0
+
+
+class LatencyHistogram:
+    """
+    HDR Histogram と同様の対数・線形の 2 段階のバケットで、遅延をマイクロ秒単位で集計するヒストグラム
+    値の大きさによらず相対誤差が約 1.6% (2 の累乗ごとの区間を 64 分割) に収まり、記録数によらずメモリ使用量はほぼ一定
+    バケットの境界は全サーバープロセスで共通のため、複数のヒストグラムのバケットを足し合わせるだけで集約できる
+    """
+
+    # 2 の累乗ごとの区間を分割する数のビット数
+    SUB_BUCKET_BITS = 6
+    SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+
+    def __init__(self) -> None:
+
+        # バケットの番号と記録数の対応表
+        self.counts: dict[int, int] = {}
+        # 記録数と、記録した値の合計・最大値 (マイクロ秒)
+        self.total_count = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    def record(self, seconds: float) -> None:
+        """
+        遅延を記録する
+
+        Args:
+            seconds (float): 遅延 (秒 / 負の値は 0 として記録する)
+        """
+
+        value_us = max(int(seconds * 1000000), 0)
+        index = self.getBucketIndex(value_us)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total_count += 1
+        self.total_us += value_us
+        if value_us > self.max_us:
+            self.max_us = value_us
+
+    def merge(self, counts: dict[int, int], total_us: int, max_us: int) -> None:
+        """
+        他のヒストグラムの記録を足し合わせる
+
+        Args:
+            counts (dict[int, int]): バケットの番号と記録数の対応表
+            total_us (int): 記録した値の合計 (マイクロ秒)
+            max_us (int): 記録した値の最大値 (マイクロ秒)
+        """
+
+        for index, count in counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+            self.total_count += count
+        self.total_us += total_us
+        self.max_us = max(self.max_us, max_us)
+
+    def getPercentile(self, percent: float) -> int:
+        """
+        記録した遅延のパーセンタイルを求める
+
+        Args:
+            percent (float): パーセンタイル (0 〜 100)
+
+        Returns:
+            int: パーセンタイルの値 (マイクロ秒 / バケットの上限値を返すため、実際の値より最大で約 1.6% 大きい)
+        """
+
+        if self.total_count == 0:
+            return 0
+        threshold = max(int(self.total_count * percent / 100 + 0.5), 1)
+        seen_count = 0
+        for index in sorted(self.counts):
+            seen_count += self.counts[index]
+            if seen_count >= threshold:
+                return min(self.getBucketUpperBound(index), self.max_us)
+        return self.max_us
+
+    def toDict(self) -> dict[str, Any]:
+        """
+        集計結果を API のレスポンスとして返す形式に変換する
+
+        Returns:
+            dict[str, Any]: 記録数・平均値・パーセンタイル (ミリ秒) と、集約用のバケットごとの記録数
+        """
+
+        return {
+            'count': self.total_count,
+            'mean_ms': round(self.total_us / self.total_count / 1000, 3) if self.total_count > 0 else 0.0,
+            'p50_ms': round(self.getPercentile(50) / 1000, 3),
+            'p90_ms': round(self.getPercentile(90) / 1000, 3),
+            'p99_ms': round(self.getPercentile(99) / 1000, 3),
+            'p999_ms': round(self.getPercentile(99.9) / 1000, 3),
+            'max_ms': round(self.max_us / 1000, 3),
+            'total_us': self.total_us,
+            'max_us': self.max_us,
+            'buckets': {str(index): count for index, count in sorted(self.counts.items())},
+        }
+
+    @classmethod
+    def getBucketIndex(cls, value_us: int) -> int:
+        """
+        値が属するバケットの番号を求める
+
+        Args:
+            value_us (int): 値 (マイクロ秒)
+
+        Returns:
+            int: バケットの番号
+        """
+
+        # 2 * SUB_BUCKET_COUNT 未満の値は 1 マイクロ秒単位のバケットに入れる
+        if value_us < cls.SUB_BUCKET_COUNT * 2:
+            return value_us
+        # それ以上の値は、2 の累乗ごとの区間を SUB_BUCKET_COUNT 個に分割したバケットに入れる
+        shift = value_us.bit_length() - cls.SUB_BUCKET_BITS - 1
+        return (shift + 1) * cls.SUB_BUCKET_COUNT + (value_us >> shift)
+
+    @classmethod
+    def getBucketUpperBound(cls, index: int) -> int:
+        """
+        バケットに入る値の上限を求める
+
+        Args:
+            index (int): バケットの番号
+
+        Returns:
+            int: バケットに入る値の上限 (マイクロ秒)
+        """
+
+        if index < cls.SUB_BUCKET_COUNT * 2:
+            return index
+        shift = index // cls.SUB_BUCKET_COUNT - 2
+        sub_bucket = index % cls.SUB_BUCKET_COUNT + cls.SUB_BUCKET_COUNT
+        return ((sub_bucket + 1) << shift) - 1
+
+
+# このサーバープロセスで計測したコメント遅延の、計測区間ごとのヒストグラム
+COMMENT_TRACE_HISTOGRAMS: dict[str, LatencyHistogram] = {stage: LatencyHistogram() for stage in COMMENT_TRACE_STAGES}
+
+
+def IsCommentTraceEnabled() -> bool:
+    """
+    コメント遅延の計測が有効かどうかを返す
+
+    Returns:
+        bool: 計測が有効なら True
+    """
+
+    return CONFIG.COMMENT_TRACE_SAMPLE_RATE > 0
+
+
+def StartCommentTrace() -> CommentTrace | None:
+    """
+    コメント投稿の受け付け時に呼び出し、サンプリング対象に選ばれたコメントの計測を開始する
+
+    Returns:
+        CommentTrace | None: 計測を開始したコメントの時刻の記録 (サンプリング対象でない場合は None)
+    """
+
+    if CONFIG.COMMENT_TRACE_SAMPLE_RATE <= 0 or random.random() >= CONFIG.COMMENT_TRACE_SAMPLE_RATE:
+        return None
+    return CommentTrace(accepted_at=time.monotonic())
+
+
+def EncodeCommentTraceMessage(trace: CommentTrace, message: str) -> str:
+    """
+    Redis Pub/Sub で配信するコメント JSON の先頭に、受け付け・DB 保存完了・配信の時刻を格納した接頭辞を付ける
+    配信側のサーバープロセスで計測できる区間 (受け付けから配信まで) もここで記録する
+
+    Args:
+        trace (CommentTrace): コメントの時刻の記録 (published_at まで記録済みであること)
+        message (str): 配信するコメント JSON
+
+    Returns:
+        str: 接頭辞を付けたメッセージ
+    """
+
+    COMMENT_TRACE_HISTOGRAMS['accept_to_commit'].record(trace.committed_at - trace.accepted_at)
+    COMMENT_TRACE_HISTOGRAMS['commit_to_publish'].record(trace.published_at - trace.committed_at)
+    return (
+        f'{COMMENT_TRACE_PREFIX}{trace.accepted_at!r},{trace.committed_at!r},{trace.published_at!r}'
+        f'{COMMENT_TRACE_SUFFIX}{message}'
+    )
+
+
+def DecodeCommentTraceMessage(raw_message: str) -> tuple[CommentTrace | None, str]:
+    """
+    Redis Pub/Sub から受信したメッセージから接頭辞を取り除き、コメントの時刻の記録とコメント JSON に分ける
+    配信から受信までの区間もここで記録する
+
+    Args:
+        raw_message (str): Redis Pub/Sub から受信したメッセージ
+
+    Returns:
+        tuple[CommentTrace | None, str]: コメントの時刻の記録 (接頭辞がない場合は None) とコメント JSON
+    """
+
+    if raw_message.startswith(COMMENT_TRACE_PREFIX) is False:
+        return None, raw_message
+    received_at = time.monotonic()
+    suffix_index = raw_message.find(COMMENT_TRACE_SUFFIX, len(COMMENT_TRACE_PREFIX))
+    if suffix_index == -1:
+        return None, raw_message
+    message = raw_message[suffix_index + len(COMMENT_TRACE_SUFFIX):]
+    try:
+        accepted_at, committed_at, published_at = (float(value) for value in raw_message[len(COMMENT_TRACE_PREFIX):suffix_index].split(','))
+    except ValueError:
+        return None, message
+    COMMENT_TRACE_HISTOGRAMS['publish_to_receive'].record(received_at - published_at)
+    return CommentTrace(
+        accepted_at = accepted_at,
+        committed_at = committed_at,
+        published_at = published_at,
+        received_at = received_at,
+    ), message
+
+
+def RecordCommentTraceEnqueued(trace: CommentTrace) -> None:
+    """
+    送信用フレームをリングバッファに追記した時刻を記録する
+
+    Args:
+        trace (CommentTrace): コメントの時刻の記録
+    """
+
+    trace.enqueued_at = time.monotonic()
+    COMMENT_TRACE_HISTOGRAMS['receive_to_enqueue'].record(trace.enqueued_at - trace.received_at)
+
+
+def RecordCommentTraceWritten(trace: CommentTrace, written_at: float) -> None:
+    """
+    接続の WebSocket への書き込みが完了した時刻を記録する
+
+    Args:
+        trace (CommentTrace): コメントの時刻の記録
+        written_at (float): 書き込みが完了した時刻 (time.monotonic() の値)
+    """
+
+    COMMENT_TRACE_HISTOGRAMS['enqueue_to_write'].record(written_at - trace.enqueued_at)
+    COMMENT_TRACE_HISTOGRAMS['accept_to_write'].record(written_at - trace.accepted_at)
+
+
+def GetCommentTraceStats() -> dict[str, Any]:
+    """
+    このサーバープロセスで計測したコメント遅延の集計結果を取得する
+
+    Returns:
+        dict[str, Any]: サーバープロセスのポート番号・サンプリング率と、計測区間ごとの集計結果
+    """
+
+    return {
+        'server_port': CONFIG.SPECIFIED_SERVER_PORT,
+        'sample_rate': CONFIG.COMMENT_TRACE_SAMPLE_RATE,
+        'stages': {
+            stage: {
+                'description': description,
+                **COMMENT_TRACE_HISTOGRAMS[stage].toDict(),
+            }
+            for stage, description in COMMENT_TRACE_STAGES.items()
+        },
+    }
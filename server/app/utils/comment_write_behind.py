@@ -0,0 +1,515 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+from redis.exceptions import ResponseError
+from tortoise.backends.base.client import TransactionalDBClient
+
+from app import logging
+from app.constants import (
+    REDIS_CLIENT,
+    REDIS_COMMENT_WRITE_BEHIND_CONSUMER_GROUP,
+    REDIS_KEY_COMMENT_WRITE_BEHIND_DEAD_LETTER_STREAM,
+    REDIS_KEY_COMMENT_WRITE_BEHIND_STREAM,
+)
+from app.models.comment import Comment
+from app.utils.metrics import METRICS, MetricFamily, MetricSample, MetricType
+from app.utils.transaction import (
+    IsDatabaseConnectionUnavailableError,
+    RunTransactionWithReconnectRetry,
+)
+
+
+# 1 回の書き込みで Redis Stream から取り出して DB に保存するコメントの最大件数
+COMMENT_WRITE_BEHIND_FLUSH_BATCH_SIZE = 500
+# 新しいコメントが届くまで Redis Stream を待ち受ける最大時間 (ミリ秒)
+COMMENT_WRITE_BEHIND_BLOCK_MILLISECONDS = 1000
+# DB への保存に失敗したときに再試行するまでの待機時間 (秒)
+COMMENT_WRITE_BEHIND_RETRY_INTERVAL_SECONDS = 5
+# 書き込み待ちのコメント数と遅延をログに出力する間隔 (秒)
+COMMENT_WRITE_BEHIND_STATS_LOG_INTERVAL_SECONDS = 60
+# 書き込み待ちのコメント数と遅延を Redis から取得し、メトリクス用に更新する間隔 (秒)
+COMMENT_WRITE_BEHIND_STATS_REFRESH_INTERVAL_SECONDS = 5
+# Consumer Group 内での書き込みタスクの名前
+## 書き込みタスクはメインサーバープロセスでのみ 1 つだけ動作するため、名前は固定でよい
+COMMENT_WRITE_BEHIND_CONSUMER_NAME = 'main'
+
+
+@dataclass(slots=True)
+class CommentWriteBehindStats:
+    """
+    write-behind モードの書き込み状況
+
+    Attributes:
+        backlog (int): Redis Stream に溜まっている、まだ DB に保存されていないコメント数
+        pending (int): 読み出し済みだが、まだ DB への保存が確定していないコメント数
+        lag_seconds (float): まだ DB に保存されていない最も古いコメントが Redis Stream に追加されてからの経過時間 (秒)
+        flushed_total (int): このプロセスの起動後に DB に保存したコメント数
+        replayed_total (int): このプロセスの起動後に、保存が確定していなかったコメントを再処理した件数
+        dead_lettered_total (int): このプロセスの起動後に、保存できずに退避用の Redis Stream へ移動したコメント数
+        last_flushed_at (float | None): 最後に DB に保存した時刻 (UNIX タイムスタンプ)
+    """
+
+    backlog: int
+    pending: int
+    lag_seconds: float
+    flushed_total: int
+    replayed_total: int
+    dead_lettered_total: int
+    last_flushed_at: float | None
+
+
+# このプロセスで DB に保存したコメント数などの累計
+__flushed_total = 0
+__replayed_total = 0
+__dead_lettered_total = 0
+__last_flushed_at: float | None = None
+# 書き込みタスクが最後に取得した書き込み状況 (書き込みタスクが動作していないサーバープロセスでは None)
+## メトリクスの取得は同期的に行われ Redis に問い合わせられないため、書き込みタスクが定期的に更新した値を返す
+__latest_stats: CommentWriteBehindStats | None = None
+
+
+def ConvertCommentToWriteBehindStreamEntry(comment: Comment) -> dict[str, str]:
+    """
+    コメントを Redis Stream に追加するエントリの形式に変換する
+
+    Args:
+        comment (Comment): 採番済み・未保存のコメント
+
+    Returns:
+        dict[str, str]: Redis Stream のエントリのフィールド
+    """
+
+    return {
+        'thread_id': str(comment.thread_id),
+        'no': str(comment.no),
+        'vpos': str(comment.vpos),
+        # タイムゾーン付きの ISO 8601 形式で保存し、マイクロ秒単位の投稿日時を失わないようにする
+        'date': comment.date.isoformat(),
+        'mail': comment.mail,
+        'user_id': comment.user_id,
+        'premium': '1' if comment.premium else '0',
+        'anonymity': '1' if comment.anonymity else '0',
+        'content': comment.content,
+    }
+
+
+def ConvertWriteBehindStreamEntryToComment(entry: dict[str, str]) -> Comment:
+    """
+    Redis Stream のエントリを未保存のコメントに変換する
+
+    Args:
+        entry (dict[str, str]): Redis Stream のエントリのフィールド
+
+    Returns:
+        Comment: 未保存のコメント
+    """
+
+    return Comment(
+        thread_id = int(entry['thread_id']),
+        no = int(entry['no']),
+        vpos = int(entry['vpos']),
+        date = datetime.fromisoformat(entry['date']),
+        mail = entry['mail'],
+        user_id = entry['user_id'],
+        premium = entry['premium'] == '1',
+        anonymity = entry['anonymity'] == '1',
+        content = entry['content'],
+    )
+
+
+async def EnsureCommentWriteBehindConsumerGroup() -> None:
+    """
+    write-behind 用の Redis Stream と Consumer Group がなければ作成する
+    """
+
+    try:
+        # 既に Redis Stream にエントリが溜まっている場合も、先頭から全件を書き込み対象にする
+        await REDIS_CLIENT.xgroup_create(
+            name = REDIS_KEY_COMMENT_WRITE_BEHIND_STREAM,
+            groupname = REDIS_COMMENT_WRITE_BEHIND_CONSUMER_GROUP,
+            id = '0',
+            mkstream = True,
+        )
+    except ResponseError as ex:
+        # 既に作成済みの場合は BUSYGROUP エラーになるので無視する
+        if 'BUSYGROUP' not in str(ex):
+            raise
+
+
+async def SaveWriteBehindComments(comments: list[Comment], is_replay: bool) -> None:
+    """
+    Redis Stream から取り出したコメントを 1 トランザクションで DB に保存する
+
+    Args:
+        comments (list[Comment]): 保存するコメント
+        is_replay (bool): 保存が確定していなかったコメントの再処理かどうか (True なら保存済みのコメントを除外してから保存する)
+    """
+
+    async def CreateCommentsInTransaction(connection: TransactionalDBClient) -> None:
+
+        new_comments = comments
+        if is_replay is True:
+            # 既に保存済みのコメントを除外する
+            ## comments テーブルには (thread_id, no) のユニーク制約がないため、スレッドごとに保存済みのコメ番を確認する
+            saved_comment_nos: set[tuple[int, int]] = set()
+            for thread_id in {comment.thread_id for comment in comments}:
+                nos = [comment.no for comment in comments if comment.thread_id == thread_id]
+                saved_nos = await Comment.filter(thread_id=thread_id, no__in=nos).using_db(connection).values_list('no', flat=True)
+                saved_comment_nos.update((thread_id, int(saved_no)) for saved_no in saved_nos)  # type: ignore
+            new_comments = [comment for comment in comments if (comment.thread_id, comment.no) not in saved_comment_nos]
+
+        if len(new_comments) > 0:
+            await Comment.bulk_create(new_comments, using_db=connection)
+
+    await RunTransactionWithReconnectRetry(
+        operation = CreateCommentsInTransaction,
+        operation_name = 'FlushCommentWriteBehindStream',
+    )
+
+
+async def AcknowledgeWriteBehindEntries(entry_ids: list[str]) -> None:
+    """
+    DB への保存が確定したエントリを ACK し、Redis Stream からも削除する
+    Redis Stream には DB に保存されていないコメントだけが残るため、XLEN がそのまま書き込み待ちのコメント数になる
+
+    Args:
+        entry_ids (list[str]): ACK するエントリの ID
+    """
+
+    if len(entry_ids) == 0:
+        return
+    async with REDIS_CLIENT.pipeline(transaction=True) as pipeline:
+        pipeline.xack(REDIS_KEY_COMMENT_WRITE_BEHIND_STREAM, REDIS_COMMENT_WRITE_BEHIND_CONSUMER_GROUP, *entry_ids)
+        pipeline.xdel(REDIS_KEY_COMMENT_WRITE_BEHIND_STREAM, *entry_ids)
+        await pipeline.execute()
+
+
+async def MoveWriteBehindEntryToDeadLetter(entry_id: str, entry: dict[str, str], exception: Exception) -> None:
+    """
+    DB に保存できないエントリを退避用の Redis Stream へ移動し、書き込み待ちの Redis Stream から取り除く
+    保存できないエントリを書き込み待ちのまま残すと、以降の全スレッドのコメントの保存がそのエントリの後ろで止まり続けてしまう
+    退避したエントリは元のフィールドに加えて、元のエントリ ID と例外の内容を保持するため、原因を取り除いた上で手動で書き戻せる
+
+    Args:
+        entry_id (str): 移動するエントリの ID
+        entry (dict[str, str]): 移動するエントリのフィールド
+        exception (Exception): 保存に失敗した際の例外
+    """
+
+    global __dead_lettered_total
+
+    logging.error(
+        f'FlushCommentWriteBehindStream: Failed to save comment entry {entry_id} '
+        f'(thread_id: {entry.get("thread_id")}, no: {entry.get("no")}). Moved to the dead letter stream.',
+        exc_info = exception,
+    )
+    async with REDIS_CLIENT.pipeline(transaction=True) as pipeline:
+        pipeline.xadd(REDIS_KEY_COMMENT_WRITE_BEHIND_DEAD_LETTER_STREAM, {
+            **entry,
+            'entry_id': entry_id,
+            'error': f'{type(exception).__name__}: {exception}',
+        })
+        pipeline.xack(REDIS_KEY_COMMENT_WRITE_BEHIND_STREAM, REDIS_COMMENT_WRITE_BEHIND_CONSUMER_GROUP, entry_id)
+        pipeline.xdel(REDIS_KEY_COMMENT_WRITE_BEHIND_STREAM, entry_id)
+        await pipeline.execute()
+    __dead_lettered_total += 1
+
+
+async def FlushCommentWriteBehindStream() -> int:
+    """
+    Redis Stream に溜まったコメントを取り出し、DB にまとめて保存する
+
+    前回の書き込みで読み出したまま保存が確定していないコメント (サーバー再起動や DB 障害で中断したもの) があれば、
+    新しいコメントよりも先にそれらを再処理する
+    再処理するコメントは既に DB に保存されている可能性があるため、同じスレッド・同じコメ番のコメントが存在しないかを確認してから保存する
+
+    DB ダウン以外の理由でまとめての保存に失敗した場合は、1 件ずつ保存し直して保存できたものだけを ACK し、
+    保存できないエントリは退避用の Redis Stream へ移動する
+
+    Returns:
+        int: 処理したコメント数 (重複のため保存しなかったもの・退避したものも含む)
+    """
+
+    global __flushed_total, __replayed_total, __last_flushed_at
+
+    # まず保存が確定していないコメントを読み出す (ID に 0 を指定すると、この Consumer に配信済みで未 ACK のエントリが返る)
+    is_replay = True
+    response = await REDIS_CLIENT.xreadgroup(
+        groupname = REDIS_COMMENT_WRITE_BEHIND_CONSUMER_GROUP,
+        consumername = COMMENT_WRITE_BEHIND_CONSUMER_NAME,
+        streams = {REDIS_KEY_COMMENT_WRITE_BEHIND_STREAM: '0'},
+        count = COMMENT_WRITE_BEHIND_FLUSH_BATCH_SIZE,
+    )
+    if len(response) == 0 or len(response[0][1]) == 0:
+        # 保存が確定していないコメントがなければ、新しいコメントが届くまで待ち受ける
+        is_replay = False
+        response = await REDIS_CLIENT.xreadgroup(
+            groupname = REDIS_COMMENT_WRITE_BEHIND_CONSUMER_GROUP,
+            consumername = COMMENT_WRITE_BEHIND_CONSUMER_NAME,
+            streams = {REDIS_KEY_COMMENT_WRITE_BEHIND_STREAM: '>'},
+            count = COMMENT_WRITE_BEHIND_FLUSH_BATCH_SIZE,
+            block = COMMENT_WRITE_BEHIND_BLOCK_MILLISECONDS,
+        )
+    if len(response) == 0 or len(response[0][1]) == 0:
+        return 0
+
+    # 保存するコメントと、保存せずに ACK だけ行うエントリの ID に振り分ける
+    entry_count = len(response[0][1])
+    acknowledged_entry_ids: list[str] = []
+    comment_entries: list[tuple[str, dict[str, str], Comment]] = []
+    for entry_id, entry in response[0][1]:
+        # 配信後に削除されたエントリはフィールドが空で返るため、ACK だけ行う
+        if not entry:
+            acknowledged_entry_ids.append(entry_id)
+            continue
+        # コメントに変換できない壊れたエントリは、保存を試みるまでもなく退避する
+        try:
+            comment_entries.append((entry_id, entry, ConvertWriteBehindStreamEntryToComment(entry)))
+        except (KeyError, ValueError) as ex:
+            await MoveWriteBehindEntryToDeadLetter(entry_id, entry, ex)
+
+    # コメントを DB に登録
+    try:
+        await SaveWriteBehindComments([comment for _, _, comment in comment_entries], is_replay)
+        acknowledged_entry_ids.extend(entry_id for entry_id, _, _ in comment_entries)
+        saved_count = len(comment_entries)
+    except Exception as ex:
+        # DB ダウンの場合は ACK せずに例外を送出し、次回の書き込みで保存が確定していないコメントとして再処理させる
+        if IsDatabaseConnectionUnavailableError(ex) is True:
+            await AcknowledgeWriteBehindEntries(acknowledged_entry_ids)
+            raise
+
+        # DB ダウン以外の理由で失敗した場合、保存できないエントリ 1 件がバッチ全体を巻き込んでいる可能性がある
+        ## トランザクションはロールバック済みなので、1 件ずつ保存し直して問題のあるエントリだけを退避する
+        ## 保存し直す途中で DB がダウンした場合は、それまでに保存できたエントリだけを ACK して例外を送出する
+        saved_count = 0
+        try:
+            for entry_id, entry, comment in comment_entries:
+                try:
+                    await SaveWriteBehindComments([comment], is_replay)
+                except Exception as entry_ex:
+                    if IsDatabaseConnectionUnavailableError(entry_ex) is True:
+                        raise
+                    await MoveWriteBehindEntryToDeadLetter(entry_id, entry, entry_ex)
+                    continue
+                acknowledged_entry_ids.append(entry_id)
+                saved_count += 1
+        finally:
+            await AcknowledgeWriteBehindEntries(acknowledged_entry_ids)
+        acknowledged_entry_ids = []
+
+    await AcknowledgeWriteBehindEntries(acknowledged_entry_ids)
+
+    __flushed_total += saved_count
+    if is_replay is True:
+        __replayed_total += saved_count
+    __last_flushed_at = time.time()
+    return entry_count
+
+
+async def GetCommentWriteBehindStats() -> CommentWriteBehindStats:
+    """
+    write-behind モードの書き込み待ちのコメント数と遅延を取得する
+
+    Returns:
+        CommentWriteBehindStats: write-behind モードの書き込み状況
+    """
+
+    async with REDIS_CLIENT.pipeline(transaction=False) as pipeline:
+        pipeline.xlen(REDIS_KEY_COMMENT_WRITE_BEHIND_STREAM)
+        pipeline.xrange(REDIS_KEY_COMMENT_WRITE_BEHIND_STREAM, count=1)
+        backlog, oldest_entries = await pipeline.execute()
+
+    # Redis Stream のエントリ ID の前半は追加された時刻 (UNIX タイムスタンプのミリ秒) になっている
+    lag_seconds = 0.0
+    if len(oldest_entries) > 0:
+        oldest_entry_added_at = int(oldest_entries[0][0].split('-')[0]) / 1000
+        lag_seconds = max(0.0, time.time() - oldest_entry_added_at)
+
+    pending = 0
+    try:
+        pending_summary = await REDIS_CLIENT.xpending(REDIS_KEY_COMMENT_WRITE_BEHIND_STREAM, REDIS_COMMENT_WRITE_BEHIND_CONSUMER_GROUP)
+        pending = int(pending_summary['pending'])
+    except ResponseError:
+        # Consumer Group がまだ作成されていない場合は NOGROUP エラーになる
+        pass
+
+    return CommentWriteBehindStats(
+        backlog = int(backlog),
+        pending = pending,
+        lag_seconds = lag_seconds,
+        flushed_total = __flushed_total,
+        replayed_total = __replayed_total,
+        dead_lettered_total = __dead_lettered_total,
+        last_flushed_at = __last_flushed_at,
+    )
+
+
+async def GetCommentWriteBehindFlushedBefore() -> float:
+    """
+    この時刻より前に Redis Stream に追加されたコメントは、全て DB への保存 (または退避) が完了していることが保証される時刻を取得する
+    Redis Stream に残っているエントリ (読み出し済みで保存が確定していないものを含む) のうち、最も古いものが追加された時刻になる
+
+    Returns:
+        float: 保存が完了していることが保証される時刻 (UNIX タイムスタンプ / 書き込み待ちのコメントがなければ現在時刻)
+    """
+
+    oldest_entries = await REDIS_CLIENT.xrange(REDIS_KEY_COMMENT_WRITE_BEHIND_STREAM, count=1)
+    if len(oldest_entries) == 0:
+        return time.time()
+    # Redis Stream のエントリ ID の前半は追加された時刻 (UNIX タイムスタンプのミリ秒) になっている
+    return int(oldest_entries[0][0].split('-')[0]) / 1000
+
+
+async def GetCommentWriteBehindBacklogComments(thread_id: int, limit: int) -> list[Comment]:
+    """
+    Redis Stream に残っている (配信済みで、まだ DB への保存が完了していない) スレッドのコメントを、新しいものから最大 limit 件取得する
+    DB から取得したコメントと組み合わせる場合、このコメントを取得してから DB を参照すれば、その間に保存されたコメントも DB 側から取得できる
+
+    Args:
+        thread_id (int): スレッド ID
+        limit (int): 取得するコメントの最大件数
+
+    Returns:
+        list[Comment]: 未保存のコメント (コメ番順)
+    """
+
+    comments: list[Comment] = []
+    max_entry_id = '+'
+    while len(comments) < limit:
+        # 全スレッドのエントリが混在しているため、新しいものから 1 回の読み出しの件数ずつ遡る
+        entries = await REDIS_CLIENT.xrevrange(
+            REDIS_KEY_COMMENT_WRITE_BEHIND_STREAM,
+            max = max_entry_id,
+            count = COMMENT_WRITE_BEHIND_FLUSH_BATCH_SIZE,
+        )
+        for _, entry in entries:
+            if entry.get('thread_id') != str(thread_id):
+                continue
+            try:
+                comments.append(ConvertWriteBehindStreamEntryToComment(entry))
+            except (KeyError, ValueError):
+                # 不正なエントリは書き込みタスクが退避用の Redis Stream へ移動するため、ここでは無視する
+                continue
+            if len(comments) >= limit:
+                break
+        if len(entries) < COMMENT_WRITE_BEHIND_FLUSH_BATCH_SIZE:
+            break
+        # 読み出した最も古いエントリの直前から続きを読み出す
+        max_entry_id = f'({entries[-1][0]}'
+
+    comments.sort(key=lambda comment: comment.no)
+    return comments
+
+
+async def GetCommentWriteBehindDeadLetterThreadIds() -> set[int]:
+    """
+    DB に保存できずに退避用の Redis Stream へ移動したコメントを含むスレッドの ID を取得する
+    退避したコメントは手動で書き戻されるまで DB に存在しないため、これらのスレッドはアーカイブしてはならない
+
+    Returns:
+        set[int]: 退避したコメントを含むスレッドの ID
+    """
+
+    entries = await REDIS_CLIENT.xrange(REDIS_KEY_COMMENT_WRITE_BEHIND_DEAD_LETTER_STREAM)
+    thread_ids: set[int] = set()
+    for _, entry in entries:
+        try:
+            thread_ids.add(int(entry['thread_id']))
+        except (KeyError, ValueError):
+            continue
+    return thread_ids
+
+
+async def RunCommentWriteBehindFlusher() -> None:
+    """
+    Redis Stream に溜まったコメントを DB に保存し続ける (メインサーバープロセスでのみ実行する)
+    起動直後は、前回のプロセスで保存が確定しなかったコメントから順に再処理する
+    """
+
+    # Consumer Group が作成されるまで待つ
+    while True:
+        try:
+            await EnsureCommentWriteBehindConsumerGroup()
+            break
+        except Exception as ex:
+            logging.error('RunCommentWriteBehindFlusher: Failed to create consumer group:', exc_info = ex)
+            await asyncio.sleep(COMMENT_WRITE_BEHIND_RETRY_INTERVAL_SECONDS)
+
+    logging.info('RunCommentWriteBehindFlusher: Comment write-behind flusher started.')
+    global __latest_stats
+    last_stats_refreshed_at = 0.0
+    last_stats_logged_at = time.time()
+    while True:
+        try:
+            await FlushCommentWriteBehindStream()
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            # 保存できなかったコメントは Redis Stream に残っているため、少し待ってから再処理する
+            if IsDatabaseConnectionUnavailableError(ex) is True:
+                logging.warning(
+                    f'RunCommentWriteBehindFlusher: Database is temporarily unavailable. '
+                    f'Retrying in {COMMENT_WRITE_BEHIND_RETRY_INTERVAL_SECONDS} seconds...',
+                    exc_info = ex,
+                )
+            else:
+                logging.error('RunCommentWriteBehindFlusher: Failed to flush comments:', exc_info = ex)
+            await asyncio.sleep(COMMENT_WRITE_BEHIND_RETRY_INTERVAL_SECONDS)
+
+        # 書き込み待ちのコメント数と遅延を定期的に取得し、メトリクスとして公開する
+        if time.time() - last_stats_refreshed_at < COMMENT_WRITE_BEHIND_STATS_REFRESH_INTERVAL_SECONDS:
+            continue
+        last_stats_refreshed_at = time.time()
+        try:
+            stats = await GetCommentWriteBehindStats()
+        except Exception as ex:
+            logging.warning('RunCommentWriteBehindFlusher: Failed to get write-behind stats.', exc_info = ex)
+            continue
+        __latest_stats = stats
+
+        # 定期的にログにも出力する
+        if time.time() - last_stats_logged_at >= COMMENT_WRITE_BEHIND_STATS_LOG_INTERVAL_SECONDS:
+            last_stats_logged_at = time.time()
+            logging.info(
+                f'RunCommentWriteBehindFlusher: backlog: {stats.backlog} / pending: {stats.pending} / '
+                f'lag: {stats.lag_seconds:.3f}s / flushed: {stats.flushed_total} / replayed: {stats.replayed_total} / '
+                f'dead-lettered: {stats.dead_lettered_total}'
+            )
+
+
+def CollectCommentWriteBehindMetrics() -> list[MetricFamily]:
+    """
+    write-behind モードの書き込み待ちのコメント数・遅延と、DB に保存したコメント数の累計をメトリクスとして取得する
+    書き込み待ちのコメント数と遅延は、書き込みタスクが定期的に Redis から取得した値を返す
+
+    Returns:
+        list[MetricFamily]: write-behind モードの書き込み状況のメトリクス (書き込みタスクが動作していないサーバープロセスでは空)
+    """
+
+    stats = __latest_stats
+    if stats is None:
+        return []
+
+    definitions: list[tuple[str, MetricType, str, float]] = [
+        ('nx_jikkyo_comment_write_behind_backlog', 'gauge', 'Number of comments in the write-behind Stream that have not been saved to the database yet.', stats.backlog),
+        ('nx_jikkyo_comment_write_behind_pending', 'gauge', 'Number of write-behind comments read by the flusher but not yet acknowledged.', stats.pending),
+        ('nx_jikkyo_comment_write_behind_lag_seconds', 'gauge', 'Age of the oldest comment in the write-behind Stream.', stats.lag_seconds),
+        ('nx_jikkyo_comment_write_behind_flushed_total', 'counter', 'Number of write-behind comments saved to the database.', __flushed_total),
+        ('nx_jikkyo_comment_write_behind_replayed_total', 'counter', 'Number of unacknowledged write-behind comments replayed after a restart.', __replayed_total),
+        ('nx_jikkyo_comment_write_behind_dead_lettered_total', 'counter', 'Number of write-behind comments moved to the dead-letter Stream.', __dead_lettered_total),
+    ]
+    families: list[MetricFamily] = []
+    for name, type, help, value in definitions:
+        families.append(MetricFamily(
+            name = name,
+            type = type,
+            help = help,
+            samples = [MetricSample(name=name, labels={}, value=value)],
+        ))
+    return families
+
+
+METRICS.addCollector(CollectCommentWriteBehindMetrics)
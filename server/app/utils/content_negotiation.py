@@ -0,0 +1,122 @@
+import gzip
+from collections.abc import Collection
+
+import brotli
+import zstandard
+
+
+# 事前圧縮するレスポンスの圧縮形式 (Content-Encoding の値)
+## クライアントが複数の形式を同じ優先度で受け付ける場合は、この順に圧縮率の高い形式を選ぶ
+CONTENT_ENCODING_PREFERENCE = ('br', 'zstd', 'gzip')
+
+
+def ParseAcceptEncoding(accept_encoding: str) -> dict[str, float]:
+    """
+    Accept-Encoding ヘッダーの値から、圧縮形式ごとの優先度 (q 値) を取り出す
+
+    Args:
+        accept_encoding (str): Accept-Encoding ヘッダーの値
+
+    Returns:
+        dict[str, float]: 小文字にした圧縮形式の名前と q 値の対応表 (q 値が省略された形式は 1.0)
+    """
+
+    qualities: dict[str, float] = {}
+    for coding in accept_encoding.split(','):
+        name, _, params = coding.strip().partition(';')
+        name = name.strip().lower()
+        if name == '':
+            continue
+        quality = 1.0
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[name] = quality
+    return qualities
+
+
+def SelectContentEncoding(accept_encoding: str, available_encodings: Collection[str]) -> str:
+    """
+    Accept-Encoding ヘッダーの値と用意できる圧縮形式から、レスポンスに使う圧縮形式を選ぶ
+
+    Args:
+        accept_encoding (str): Accept-Encoding ヘッダーの値
+        available_encodings (Collection[str]): 用意できる圧縮形式 ('identity' は常に用意できるものとして扱う)
+
+    Returns:
+        str: レスポンスに使う圧縮形式 (圧縮しない場合は 'identity')
+    """
+
+    qualities = ParseAcceptEncoding(accept_encoding)
+    wildcard_quality = qualities.get('*', 0.0)
+
+    selected_encoding = 'identity'
+    selected_quality = 0.0
+    for encoding in CONTENT_ENCODING_PREFERENCE:
+        if encoding not in available_encodings:
+            continue
+        # 明示的に指定された q 値が * より優先される (gzip;q=0 なら * があっても gzip は使わない)
+        quality = qualities.get(encoding, wildcard_quality)
+        if quality > selected_quality:
+            selected_encoding = encoding
+            selected_quality = quality
+    return selected_encoding
+
+
+def CompressContent(content: bytes) -> dict[str, bytes]:
+    """
+    レスポンスの本文を、CONTENT_ENCODING_PREFERENCE の全ての圧縮形式で圧縮する
+    同じ本文を大量に配信するための事前圧縮用で、圧縮にかかる時間より圧縮率を優先する
+
+    Args:
+        content (bytes): 圧縮する本文
+
+    Returns:
+        dict[str, bytes]: 圧縮形式と圧縮後の本文の対応表
+    """
+
+    return {
+        'br': brotli.compress(content, mode=brotli.MODE_TEXT, quality=11),
+        'zstd': zstandard.ZstdCompressor(level=19).compress(content),
+        # gzip は mtime を固定し、内容が同じなら圧縮結果も同じになるようにする
+        'gzip': gzip.compress(content, compresslevel=9, mtime=0),
+    }
+
+
+def IsGzipAcceptable(accept_encoding: str) -> bool:
+    """
+    Accept-Encoding ヘッダーの値から、クライアントが gzip で圧縮されたレスポンスを受け付けるかを判定する
+
+    Args:
+        accept_encoding (str): Accept-Encoding ヘッダーの値
+
+    Returns:
+        bool: gzip で圧縮されたレスポンスを受け付けるなら True
+    """
+
+    return SelectContentEncoding(accept_encoding, ('gzip',)) == 'gzip'
+
+
+def IsETagMatched(if_none_match: str, etags: set[str]) -> bool:
+    """
+    If-None-Match ヘッダーの値に、指定された ETag のいずれかが含まれているかを判定する
+
+    Args:
+        if_none_match (str): If-None-Match ヘッダーの値
+        etags (set[str]): 照合する ETag (引用符を含む)
+
+    Returns:
+        bool: いずれかの ETag が含まれていれば True
+    """
+
+    for etag in if_none_match.split(','):
+        etag = etag.strip()
+        if etag == '*':
+            return True
+        # If-None-Match の比較は弱い比較なので、W/ の有無は区別しない
+        if etag.removeprefix('W/') in etags:
+            return True
+    return False
@@ -0,0 +1,329 @@
+import bisect
+from collections.abc import Callable
+from dataclasses import asdict, dataclass, field
+from typing import Any, Literal
+
+
+# Prometheus のメトリクスの種類
+MetricType = Literal['counter', 'gauge', 'histogram']
+
+# Redis コマンドの応答時間のヒストグラムのバケットの上限値 (秒)
+## 通常はループバック上の Redis で 1ms 未満に収まるため、1ms 未満を細かく刻む
+REDIS_COMMAND_LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+@dataclass(slots=True)
+class MetricSample:
+    """
+    メトリクスの 1 つの値
+
+    Attributes:
+        name (str): サンプル名 (ヒストグラムの場合は _bucket / _sum / _count の接尾辞付き)
+        labels (dict[str, str]): ラベル
+        value (float): 値
+    """
+
+    name: str
+    labels: dict[str, str]
+    value: float
+
+
+@dataclass(slots=True)
+class MetricFamily:
+    """
+    同じ名前のメトリクスの値の集まり
+
+    Attributes:
+        name (str): メトリクス名
+        type (MetricType): メトリクスの種類
+        help (str): メトリクスの説明
+        samples (list[MetricSample]): メトリクスの値
+    """
+
+    name: str
+    type: MetricType
+    help: str
+    samples: list[MetricSample] = field(default_factory=list)
+
+    def toJSON(self) -> dict[str, Any]:
+        """
+        サーバープロセス間で受け渡すための dict に変換する
+
+        Returns:
+            dict[str, Any]: 変換した dict
+        """
+
+        return asdict(self)
+
+    @classmethod
+    def fromJSON(cls, data: dict[str, Any]) -> 'MetricFamily':
+        """
+        toJSON() で変換した dict から復元する
+
+        Args:
+            data (dict[str, Any]): toJSON() で変換した dict
+
+        Returns:
+            MetricFamily: 復元したメトリクス
+        """
+
+        return cls(
+            name = data['name'],
+            type = data['type'],
+            help = data['help'],
+            samples = [MetricSample(**sample) for sample in data['samples']],
+        )
+
+
+@dataclass(slots=True)
+class HistogramValue:
+    """
+    ヒストグラムのラベルごとの集計値
+
+    Attributes:
+        bucket_counts (list[int]): バケットごとの記録数 (累積ではない / 最後の要素は最大のバケットを超えた記録数)
+        total (float): 記録した値の合計
+        count (int): 記録数
+    """
+
+    bucket_counts: list[int]
+    total: float = 0.0
+    count: int = 0
+
+
+class MetricsRegistry:
+    """
+    サーバープロセスごとのメトリクスを保持し、Prometheus のテキスト形式で出力できる形にまとめる
+
+    接続数やドロップ数などイベントのたびに変化する値は、発生箇所から increment() / observe() でこのレジストリに記録する
+    Broadcaster の購読者数や DB 接続プールの使用数など、他のオブジェクトが保持している値は、
+    そのオブジェクトを持つモジュールが addCollector() で登録した関数から、collect() の呼び出し時にだけ読み取る
+    """
+
+    def __init__(self) -> None:
+
+        # メトリクス名と、メトリクスの種類・説明の対応表
+        self.definitions: dict[str, tuple[MetricType, str]] = {}
+        # カウンター・ゲージのメトリクス名と、ラベルの組ごとの値の対応表
+        self.values: dict[str, dict[tuple[tuple[str, str], ...], float]] = {}
+        # ヒストグラムのメトリクス名と、バケットの上限値の対応表
+        self.histogram_buckets: dict[str, tuple[float, ...]] = {}
+        # ヒストグラムのメトリクス名と、ラベルの組ごとの集計値の対応表
+        self.histograms: dict[str, dict[tuple[tuple[str, str], ...], HistogramValue]] = {}
+        # collect() の呼び出し時に、他のオブジェクトが保持している値を読み取る関数
+        self.collectors: list[Callable[[], list[MetricFamily]]] = []
+
+    def define(self, name: str, type: MetricType, help: str, buckets: tuple[float, ...] | None = None) -> None:
+        """
+        メトリクスを定義する
+        値を記録していなくても、定義したメトリクスは collect() の結果に含まれる
+
+        Args:
+            name (str): メトリクス名
+            type (MetricType): メトリクスの種類
+            help (str): メトリクスの説明
+            buckets (tuple[float, ...] | None, optional): ヒストグラムのバケットの上限値 (昇順). Defaults to None.
+        """
+
+        self.definitions[name] = (type, help)
+        if type == 'histogram':
+            assert buckets is not None, f'Histogram {name} requires buckets.'
+            self.histogram_buckets[name] = buckets
+            self.histograms[name] = {}
+        else:
+            self.values[name] = {}
+
+    def increment(self, name: str, value: float = 1.0, **labels: str) -> None:
+        """
+        カウンター・ゲージの値を増減させる
+
+        Args:
+            name (str): メトリクス名 (define() で定義済みであること)
+            value (float, optional): 増減させる値 (ゲージの場合のみ負の値を指定できる). Defaults to 1.0.
+            **labels (str): ラベル
+        """
+
+        label_key = tuple(sorted(labels.items()))
+        values = self.values[name]
+        values[label_key] = values.get(label_key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """
+        ヒストグラムに値を記録する
+
+        Args:
+            name (str): メトリクス名 (define() で定義済みであること)
+            value (float): 記録する値
+            **labels (str): ラベル
+        """
+
+        label_key = tuple(sorted(labels.items()))
+        histograms = self.histograms[name]
+        histogram = histograms.get(label_key)
+        if histogram is None:
+            histogram = HistogramValue(bucket_counts=[0] * (len(self.histogram_buckets[name]) + 1))
+            histograms[label_key] = histogram
+        histogram.bucket_counts[bisect.bisect_left(self.histogram_buckets[name], value)] += 1
+        histogram.total += value
+        histogram.count += 1
+
+    def addCollector(self, collector: Callable[[], list[MetricFamily]]) -> None:
+        """
+        collect() の呼び出し時に、他のオブジェクトが保持している値を読み取る関数を登録する
+
+        Args:
+            collector (Callable[[], list[MetricFamily]]): メトリクスを返す関数 (イベントループ上で同期的に呼び出される)
+        """
+
+        self.collectors.append(collector)
+
+    def collect(self) -> list[MetricFamily]:
+        """
+        このサーバープロセスの全てのメトリクスを取得する
+
+        Returns:
+            list[MetricFamily]: メトリクスのリスト
+        """
+
+        families: list[MetricFamily] = []
+        for name, (metric_type, help) in self.definitions.items():
+            family = MetricFamily(name=name, type=metric_type, help=help)
+            if metric_type == 'histogram':
+                buckets = self.histogram_buckets[name]
+                for label_key, histogram in self.histograms[name].items():
+                    labels = dict(label_key)
+                    cumulative_count = 0
+                    for upper_bound, bucket_count in zip((*buckets, float('inf')), histogram.bucket_counts):
+                        cumulative_count += bucket_count
+                        family.samples.append(MetricSample(
+                            name = f'{name}_bucket',
+                            labels = {**labels, 'le': FormatMetricValue(upper_bound)},
+                            value = cumulative_count,
+                        ))
+                    family.samples.append(MetricSample(name=f'{name}_sum', labels=labels, value=histogram.total))
+                    family.samples.append(MetricSample(name=f'{name}_count', labels=labels, value=histogram.count))
+            else:
+                for label_key, value in self.values[name].items():
+                    family.samples.append(MetricSample(name=name, labels=dict(label_key), value=value))
+            families.append(family)
+
+        for collector in self.collectors:
+            families.extend(collector())
+        return families
+
+
+def FormatMetricValue(value: float) -> str:
+    """
+    メトリクスの値を Prometheus のテキスト形式の表記に変換する
+
+    Args:
+        value (float): 値
+
+    Returns:
+        str: 変換した値
+    """
+
+    if value == float('inf'):
+        return '+Inf'
+    if value == float('-inf'):
+        return '-Inf'
+    if value != value:
+        return 'NaN'
+    if float(value).is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def EscapeMetricLabelValue(value: str) -> str:
+    """
+    ラベルの値を Prometheus のテキスト形式でエスケープする
+
+    Args:
+        value (str): ラベルの値
+
+    Returns:
+        str: エスケープしたラベルの値
+    """
+
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def RenderPrometheusText(families: list[MetricFamily]) -> str:
+    """
+    メトリクスを Prometheus のテキスト形式 (text/plain; version=0.0.4) に変換する
+
+    Args:
+        families (list[MetricFamily]): メトリクスのリスト
+
+    Returns:
+        str: Prometheus のテキスト形式のメトリクス
+    """
+
+    lines: list[str] = []
+    for family in families:
+        help = family.help.replace('\\', '\\\\').replace('\n', '\\n')
+        lines.append(f'# HELP {family.name} {help}')
+        lines.append(f'# TYPE {family.name} {family.type}')
+        for sample in family.samples:
+            if len(sample.labels) > 0:
+                labels = ','.join(f'{key}="{EscapeMetricLabelValue(value)}"' for key, value in sample.labels.items())
+                lines.append(f'{sample.name}{{{labels}}} {FormatMetricValue(sample.value)}')
+            else:
+                lines.append(f'{sample.name} {FormatMetricValue(sample.value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def MergeWorkerMetricFamilies(worker_families: dict[int, list[MetricFamily]]) -> list[MetricFamily]:
+    """
+    各サーバープロセスのメトリクスを、サーバープロセスのポート番号を port ラベルとして付与した上で 1 つにまとめる
+    Prometheus のテキスト形式では同じ名前のメトリクスを 1 か所にまとめて出力する必要があるため、メトリクス名ごとに統合する
+
+    Args:
+        worker_families (dict[int, list[MetricFamily]]): サーバープロセスのポート番号と、そのサーバープロセスのメトリクスの対応表
+
+    Returns:
+        list[MetricFamily]: 1 つにまとめたメトリクスのリスト
+    """
+
+    merged_families: dict[str, MetricFamily] = {}
+    for port, families in worker_families.items():
+        for family in families:
+            merged_family = merged_families.get(family.name)
+            if merged_family is None:
+                merged_family = MetricFamily(name=family.name, type=family.type, help=family.help)
+                merged_families[family.name] = merged_family
+            for sample in family.samples:
+                merged_family.samples.append(MetricSample(
+                    name = sample.name,
+                    labels = {'port': str(port), **sample.labels},
+                    value = sample.value,
+                ))
+    return list(merged_families.values())
+
+
+# サーバープロセスごとに 1 つだけ存在するメトリクスのレジストリ
+METRICS = MetricsRegistry()
+
+# 各モジュールで記録するメトリクスの定義
+## 定義をここに集約し、モジュールの読み込み順によらず同じ順序で出力されるようにする
+METRICS.define(
+    'nx_jikkyo_websocket_connections',
+    'gauge',
+    'Number of active WebSocket connections by session kind (watch / comment) and channel.',
+)
+METRICS.define(
+    'nx_jikkyo_comment_ring_dropped_comments_total',
+    'counter',
+    'Number of comments skipped by comment session senders that could not keep up with the broadcaster ring buffer.',
+)
+METRICS.define(
+    'nx_jikkyo_transaction_retries_total',
+    'counter',
+    'Number of transaction retries in RunTransactionWithReconnectRetry by operation and reason.',
+)
+METRICS.define(
+    'nx_jikkyo_redis_command_duration_seconds',
+    'histogram',
+    'Round-trip duration of Redis commands and pipelines issued by this worker.',
+    buckets = REDIS_COMMAND_LATENCY_BUCKETS,
+)
@@ -0,0 +1,137 @@
+import asyncio
+from collections.abc import Callable
+
+from app import logging
+from app.constants import (
+    REDIS_CHANNEL_CHANNEL_INFOS_UPDATED,
+    REDIS_CHANNEL_THREAD_ARCHIVE_INVALIDATION,
+    REDIS_CHANNEL_THREAD_CACHE_INVALIDATION,
+    REDIS_CHANNEL_THREAD_COMMENTS_PREFIX,
+    REDIS_CLIENT,
+)
+
+
+class RedisPubSubHub:
+    """
+    サーバープロセスごとに 1 本の Redis 接続で Pub/Sub をパターン購読し、受信したメッセージをチャンネル名ごとのハンドラに振り分ける
+
+    購読する単位 (スレッドなど) ごとに Pub/Sub 接続と受信タスクを持つと、アクティブなスレッドの数だけ Redis 接続が増え、
+    コメントが来ないスレッドでもタイムアウトのたびに受信タスクが起床してしまう
+    パターン購読した 1 本の接続で listen() し続け、受信したメッセージをチャンネル名で引いたハンドラに同期的に渡すことで、
+    Redis 接続数をプロセスあたり 1 本に抑え、メッセージが来ない間は一切起床しないようにする
+    """
+
+    def __init__(self, patterns: list[str]) -> None:
+        """
+        Args:
+            patterns (list[str]): 購読するチャンネル名のパターン (ex: nx-jikkyo:thread_comments:*)
+        """
+
+        self.patterns = patterns
+        self.handlers: dict[str, Callable[[str], None]] = {}
+        self._run_task: asyncio.Task[None] | None = None
+
+    def addHandler(self, channel: str, handler: Callable[[str], None]) -> None:
+        """
+        チャンネルにメッセージが届いたときに呼び出すハンドラを登録する
+        ハンドラは受信タスク内で同期的に呼び出されるため、ブロックする処理を行ってはならない
+
+        Args:
+            channel (str): チャンネル名 (購読するパターンのいずれかに一致している必要がある)
+            handler (Callable[[str], None]): 受信したメッセージを受け取るハンドラ
+        """
+
+        self.handlers[channel] = handler
+
+        # イベントループの外 (モジュールの読み込み時など) で登録された場合は、受信タスクの開始を start() の呼び出しまで遅らせる
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.start()
+
+    def start(self) -> None:
+        """
+        受信タスクが未起動または終了済みなら新しいタスクを開始する
+        受信タスクは一度起動したらプロセス終了まで動かし続ける (メッセージが来ない間は起床しないため負荷はない)
+        イベントループ上で呼び出す必要がある
+        """
+
+        if self._run_task is None or self._run_task.done():
+            self._run_task = asyncio.create_task(self._run())
+
+    def removeHandler(self, channel: str, handler: Callable[[str], None]) -> None:
+        """
+        チャンネルに登録したハンドラを削除する
+
+        Args:
+            channel (str): チャンネル名
+            handler (Callable[[str], None]): 削除するハンドラ (別のハンドラに置き換わっている場合は何もしない)
+        """
+
+        if self.handlers.get(channel) == handler:
+            del self.handlers[channel]
+
+    async def _run(self) -> None:
+        """
+        Redis Pub/Sub をパターン購読し、受信したメッセージをハンドラに振り分ける
+
+        予期せぬ例外が発生した場合は指数バックオフでリトライし、受信を継続する。
+        CancelledError が発生した場合のみタスクを終了する。
+        """
+
+        # リトライ用のバックオフ設定
+        retry_delay = 1.0  # 初期リトライ間隔 (秒)
+        max_retry_delay = 30.0  # 最大リトライ間隔 (秒)
+
+        while True:
+            pubsub = REDIS_CLIENT.pubsub()
+
+            try:
+                await pubsub.psubscribe(*self.patterns)
+
+                # 正常に接続できたらリトライ間隔をリセット
+                retry_delay = 1.0
+
+                # メッセージが届くまでブロックして待機する
+                async for message in pubsub.listen():
+                    if message['type'] != 'pmessage':
+                        continue
+                    handler = self.handlers.get(message['channel'])
+                    if handler is None:
+                        continue
+                    # 1 つのハンドラの例外で他のチャンネルの受信が止まらないよう、ハンドラごとに例外を握りつぶす
+                    try:
+                        handler(message['data'])
+                    except Exception as ex:
+                        logging.error(f'RedisPubSubHub: Handler for {message["channel"]} raised an exception:', exc_info=ex)
+
+            except asyncio.CancelledError:
+                # キャンセルされた場合はタスクを終了する
+                raise
+
+            except Exception as ex:
+                # 予期せぬ例外が発生した場合はログを出力してリトライする
+                logging.error(f'RedisPubSubHub: Unexpected error occurred while listening. Retrying in {retry_delay} seconds...', exc_info=ex)
+
+            finally:
+                # 各リトライごとに確実に購読解除する
+                try:
+                    await pubsub.punsubscribe()
+                    await pubsub.close()
+                except Exception as cleanup_ex:
+                    logging.error('RedisPubSubHub: Failed to cleanup Redis pubsub connection:', exc_info=cleanup_ex)
+
+            # 指数バックオフでリトライ間隔を増加させる
+            ## listen() が例外なしに終了するのは購読が外れた場合のみだが、その場合も同様に再接続する
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, max_retry_delay)
+
+
+# サーバープロセスごとに 1 つだけ存在する Redis Pub/Sub の購読ハブ
+REDIS_PUBSUB_HUB = RedisPubSubHub([
+    f'{REDIS_CHANNEL_THREAD_COMMENTS_PREFIX}:*',
+    REDIS_CHANNEL_THREAD_CACHE_INVALIDATION,
+    REDIS_CHANNEL_CHANNEL_INFOS_UPDATED,
+    REDIS_CHANNEL_THREAD_ARCHIVE_INVALIDATION,
+])
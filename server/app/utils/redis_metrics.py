@@ -0,0 +1,56 @@
+import time
+from typing import TYPE_CHECKING, Any
+
+from redis.asyncio.client import Pipeline, Redis
+
+from app.utils.metrics import METRICS
+
+
+# 継承元の Redis クライアント・パイプライン
+## types-redis では応答の型を型引数に取るジェネリッククラスだが、実行時の redis-py のクラスは添字を受け付けないため、型チェック時のみ型引数を付ける
+## 型引数は REDIS_CLIENT (decode_responses=True) に合わせて str とする
+if TYPE_CHECKING:
+    RedisPipelineBase = Pipeline[str]
+    RedisClientBase = Redis[str]
+else:
+    RedisPipelineBase = Pipeline
+    RedisClientBase = Redis
+
+
+class InstrumentedPipeline(RedisPipelineBase):
+    """
+    execute() の応答時間をメトリクスとして記録する Redis のパイプライン
+    パイプラインに積んだコマンドは execute() でまとめて 1 往復で送られるため、コマンドごとではなくパイプライン単位で記録する
+    """
+
+    async def execute(self, raise_on_error: bool = True) -> list[Any]:
+        start_time = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            METRICS.observe(
+                'nx_jikkyo_redis_command_duration_seconds',
+                time.perf_counter() - start_time,
+                command = 'MULTI' if self.is_transaction is True else 'PIPELINE',
+            )
+
+
+class InstrumentedRedis(RedisClientBase):
+    """
+    コマンドの応答時間をコマンド名ごとにメトリクスとして記録する Redis クライアント
+    Lua script の呼び出しも最終的に execute_command() を経由するため、EVALSHA として記録される
+    """
+
+    async def execute_command(self, *args: Any, **options: Any) -> Any:
+        start_time = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            METRICS.observe(
+                'nx_jikkyo_redis_command_duration_seconds',
+                time.perf_counter() - start_time,
+                command = str(args[0]).upper(),
+            )
+
+    def pipeline(self, transaction: bool = True, shard_hint: str | None = None) -> InstrumentedPipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
@@ -0,0 +1,243 @@
+import asyncio
+import hashlib
+import os
+import zlib
+from collections.abc import AsyncGenerator, AsyncIterable
+from pathlib import Path
+
+from app.constants import (
+    REDIS_CHANNEL_THREAD_ARCHIVE_INVALIDATION,
+    REDIS_CLIENT,
+    THREAD_ARCHIVES_DIR,
+)
+from app.utils.pubsub_hub import REDIS_PUBSUB_HUB
+
+
+# スレッドアーカイブの圧縮レベル
+## アーカイブは 1 スレッドにつき 1 回だけ作成し、以降は何度も配信するため、圧縮にかかる時間より圧縮率を優先する
+THREAD_ARCHIVE_COMPRESSION_LEVEL = 9
+
+# スレッドアーカイブを展開しながら配信する際に、1 回で読み込むファイルのサイズ (バイト)
+THREAD_ARCHIVE_READ_CHUNK_SIZE = 64 * 1024
+
+# スレッド ID とスレッドアーカイブの ETag の対応表
+## アーカイブは一度作成したら変更されないため、一度読み込んだ ETag はプロセスが終了するまで使い回せる
+## アーカイブを無効化した場合は、Redis Pub/Sub で全サーバープロセスに通知して破棄させる
+__thread_archive_etags: dict[int, str] = {}
+
+# スレッドアーカイブが作成済みのスレッド ID の集合 (一度も読み込んでいなければ None)
+## アーカイブを作成するスレッドを探す際に、スレッドごとにファイルの有無を確認しなくて済むようにする
+__archived_thread_ids: set[int] | None = None
+
+
+def GetThreadArchivePath(thread_id: int) -> Path:
+    """
+    スレッドアーカイブ (gzip で圧縮済みの JSON) のパスを取得する
+
+    Args:
+        thread_id (int): スレッド ID
+
+    Returns:
+        Path: スレッドアーカイブのパス
+    """
+
+    return THREAD_ARCHIVES_DIR / f'{thread_id}.json.gz'
+
+
+def GetThreadArchiveETagPath(thread_id: int) -> Path:
+    """
+    スレッドアーカイブの ETag (圧縮済みの内容のハッシュ値) を保存するファイルのパスを取得する
+
+    Args:
+        thread_id (int): スレッド ID
+
+    Returns:
+        Path: ETag を保存するファイルのパス
+    """
+
+    return THREAD_ARCHIVES_DIR / f'{thread_id}.etag'
+
+
+def GetThreadArchiveETag(thread_id: int) -> str | None:
+    """
+    スレッドアーカイブの ETag を取得する
+    ETag は引用符を含まないハッシュ値で、HTTP レスポンスの ETag ヘッダーにはエンコーディングごとに別の値として加工してから設定する
+
+    Args:
+        thread_id (int): スレッド ID
+
+    Returns:
+        str | None: スレッドアーカイブの ETag (スレッドアーカイブが存在しない場合は None)
+    """
+
+    etag = __thread_archive_etags.get(thread_id)
+    if etag is not None:
+        return etag
+
+    # 他のサーバープロセスでアーカイブが無効化された際に通知を受け取れるよう、購読ハブの受信タスクを開始する (開始済みなら何もしない)
+    REDIS_PUBSUB_HUB.start()
+
+    # アーカイブ本体は ETag を保存した後にリネームして配置するため、アーカイブ本体が存在すれば ETag も必ず存在する
+    if GetThreadArchivePath(thread_id).exists() is False:
+        return None
+    etag = GetThreadArchiveETagPath(thread_id).read_text(encoding='utf-8').strip()
+    __thread_archive_etags[thread_id] = etag
+    return etag
+
+
+async def WriteThreadArchive(thread_id: int, chunks: AsyncIterable[bytes]) -> str:
+    """
+    JSON の断片を gzip で圧縮しながら書き込み、スレッドアーカイブを作成する
+    書き込み途中のファイルを配信してしまわないよう、一時ファイルに書き込んでからリネームする
+
+    Args:
+        thread_id (int): スレッド ID
+        chunks (AsyncIterable[bytes]): スレッドアーカイブに書き込む JSON の断片
+
+    Returns:
+        str: 作成したスレッドアーカイブの ETag
+    """
+
+    THREAD_ARCHIVES_DIR.mkdir(parents=True, exist_ok=True)
+    archive_path = GetThreadArchivePath(thread_id)
+    etag_path = GetThreadArchiveETagPath(thread_id)
+    temp_archive_path = archive_path.with_name(f'{archive_path.name}.tmp')
+    temp_etag_path = etag_path.with_name(f'{etag_path.name}.tmp')
+
+    # wbits に 16 + 15 を指定すると gzip 形式で圧縮される
+    ## zlib で生成される gzip ヘッダーには更新日時が含まれないため、同じ内容からは常に同じ ETag が得られる
+    compressor = zlib.compressobj(THREAD_ARCHIVE_COMPRESSION_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    content_hash = hashlib.sha256()
+
+    try:
+        with open(temp_archive_path, 'wb') as file:
+
+            def CompressAndWrite(data: bytes | None) -> None:
+                # data が None のときは圧縮器に残っているデータを書き出して gzip を終端する
+                compressed = compressor.compress(data) if data is not None else compressor.flush()
+                content_hash.update(compressed)
+                file.write(compressed)
+
+            # 圧縮とファイルへの書き込みはイベントループをブロックしないよう、別スレッドで実行する
+            async for chunk in chunks:
+                await asyncio.to_thread(CompressAndWrite, chunk)
+            await asyncio.to_thread(CompressAndWrite, None)
+
+        etag = content_hash.hexdigest()[:32]
+        temp_etag_path.write_text(etag, encoding='utf-8')
+        os.replace(temp_etag_path, etag_path)
+        os.replace(temp_archive_path, archive_path)
+
+    except BaseException:
+        temp_archive_path.unlink(missing_ok=True)
+        temp_etag_path.unlink(missing_ok=True)
+        raise
+
+    __thread_archive_etags[thread_id] = etag
+    if __archived_thread_ids is not None:
+        __archived_thread_ids.add(thread_id)
+    return etag
+
+
+async def GetArchivedThreadIds() -> set[int]:
+    """
+    スレッドアーカイブが作成済みのスレッド ID の集合を取得する
+    初回のみアーカイブの保存先ディレクトリを走査し、以降はアーカイブの作成・削除に合わせて更新した集合を返す
+
+    Returns:
+        set[int]: スレッドアーカイブが作成済みのスレッド ID の集合
+    """
+
+    global __archived_thread_ids
+
+    if __archived_thread_ids is None:
+
+        def ScanArchivedThreadIds() -> set[int]:
+            if THREAD_ARCHIVES_DIR.exists() is False:
+                return set()
+            return {
+                int(path.name.removesuffix('.json.gz'))
+                for path in THREAD_ARCHIVES_DIR.iterdir()
+                if path.name.endswith('.json.gz') and path.name.removesuffix('.json.gz').isdigit()
+            }
+
+        # ディレクトリの走査はイベントループをブロックしないよう、別スレッドで実行する
+        __archived_thread_ids = await asyncio.to_thread(ScanArchivedThreadIds)
+    return __archived_thread_ids
+
+
+def InvalidateThreadArchiveCache(message: str) -> None:
+    """
+    RedisPubSubHub から通知を受け取り、無効化されたスレッドアーカイブの ETag のキャッシュを破棄する
+    購読ハブの受信タスク内で同期的に呼び出されるため、await を伴う処理を行ってはならない
+
+    Args:
+        message (str): 無効化されたスレッドアーカイブのスレッド ID
+    """
+
+    try:
+        thread_id = int(message)
+    except ValueError:
+        return
+    __thread_archive_etags.pop(thread_id, None)
+    if __archived_thread_ids is not None:
+        __archived_thread_ids.discard(thread_id)
+
+
+async def DeleteThreadArchive(thread_id: int) -> bool:
+    """
+    スレッドアーカイブを削除し、全サーバープロセスに ETag のキャッシュを破棄するよう通知する
+    アーカイブを削除したスレッドは、再度アーカイブを作成するまでスレッド取得 API で DB から取得したコメントが返される
+
+    Args:
+        thread_id (int): スレッド ID
+
+    Returns:
+        bool: スレッドアーカイブが存在し、削除した場合は True
+    """
+
+    # アーカイブ本体の有無を作成済みかどうかの判定に使っているため、先にアーカイブ本体を削除する
+    archive_path = GetThreadArchivePath(thread_id)
+    is_existed = archive_path.exists()
+    archive_path.unlink(missing_ok=True)
+    GetThreadArchiveETagPath(thread_id).unlink(missing_ok=True)
+
+    InvalidateThreadArchiveCache(str(thread_id))
+    await PublishThreadArchiveInvalidation(thread_id)
+    return is_existed
+
+
+async def PublishThreadArchiveInvalidation(thread_id: int) -> None:
+    """
+    全サーバープロセスに、スレッドアーカイブの ETag のキャッシュを破棄するよう通知する
+
+    Args:
+        thread_id (int): スレッド ID
+    """
+
+    await REDIS_CLIENT.publish(REDIS_CHANNEL_THREAD_ARCHIVE_INVALIDATION, str(thread_id))
+
+
+# 他のサーバープロセスでスレッドアーカイブが無効化された際に、ETag のキャッシュを破棄する
+REDIS_PUBSUB_HUB.addHandler(REDIS_CHANNEL_THREAD_ARCHIVE_INVALIDATION, InvalidateThreadArchiveCache)
+
+
+async def ReadThreadArchiveDecompressed(thread_id: int) -> AsyncGenerator[bytes]:
+    """
+    gzip に対応していないクライアント向けに、スレッドアーカイブを展開しながら少しずつ読み込む
+
+    Args:
+        thread_id (int): スレッド ID
+
+    Yields:
+        bytes: 展開した JSON の断片
+    """
+
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    with open(GetThreadArchivePath(thread_id), 'rb') as file:
+        while True:
+            data = await asyncio.to_thread(file.read, THREAD_ARCHIVE_READ_CHUNK_SIZE)
+            if not data:
+                break
+            yield await asyncio.to_thread(decompressor.decompress, data)
+    yield decompressor.flush()
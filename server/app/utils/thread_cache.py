@@ -0,0 +1,229 @@
+import asyncio
+import time
+
+from tortoise import timezone
+
+from app import logging
+from app.constants import REDIS_CHANNEL_THREAD_CACHE_INVALIDATION, REDIS_CLIENT
+from app.models.comment import Thread
+from app.utils.pubsub_hub import REDIS_PUBSUB_HUB
+
+
+# 放送中・放送予定のスレッドの情報を DB から読み込み直すまでの最大の時間 (秒)
+## 通常は RegisterThreads() からの通知で読み込み直すが、Pub/Sub の再接続中に通知を取りこぼした場合に備える
+THREAD_CACHE_MAX_AGE_SECONDS = 3600 * 2
+# 放送中のスレッドが見つからなかった場合に、DB から読み込み直す最短の間隔 (秒)
+## スレッドが存在しないチャンネルへの接続が続いても、接続ごとに DB に問い合わせないようにする
+THREAD_CACHE_MISS_RELOAD_INTERVAL_SECONDS = 10.0
+# ID 指定で取得した放送終了済みのスレッドの情報を保持する最大件数
+THREAD_CACHE_MAX_ENDED_THREADS = 4096
+
+
+class ThreadCache:
+    """
+    サーバープロセスごとに、全チャンネルの放送中・放送予定のスレッドと、ID 指定で取得したスレッドの情報を保持するキャッシュ
+
+    WebSocket の接続時にスレッドを取得するたびに DB に問い合わせると、接続が集中したときに DB の負荷がそのまま増えてしまう
+    放送中・放送予定のスレッドは 1 回のクエリで全チャンネル分まとめて読み込み、以降は放送中のスレッドの判定も含めてメモリ上で完結させる
+    スレッドの情報は作成後に変更されないため、放送中のスレッドの切り替えも、事前に読み込んでおいた放送予定のスレッドへの切り替えで済む
+
+    メインサーバープロセスの RegisterThreads() が新しいスレッドを登録したら Redis Pub/Sub で全サーバープロセスに通知し、
+    各サーバープロセスは放送中・放送予定のスレッドを DB から読み込み直す
+    """
+
+    def __init__(self) -> None:
+
+        # 実況チャンネル ID (jk の prefix を取り除いた数値) と、そのチャンネルの放送中・放送予定のスレッド (放送開始日時順) の対応表
+        self.live_threads: dict[int, list[Thread]] = {}
+        # スレッド ID とスレッドの対応表
+        ## 放送中・放送予定のスレッドに加えて、ID 指定で取得した放送終了済みのスレッドも保持する
+        self.threads: dict[int, Thread] = {}
+        # ID 指定で取得した放送終了済みのスレッドの ID (古い順)
+        ## dict を挿入順を保持する集合として使い、上限を超えたら古いものから削除する
+        self.ended_thread_ids: dict[int, None] = {}
+        # 放送中・放送予定のスレッドを最後に読み込んだ時刻 (一度も読み込んでいなければ None)
+        self.loaded_at: float | None = None
+        # 放送中・放送予定のスレッドを読み込むタスク (複数の接続から同時に要求されても 1 回だけ実行する)
+        self._load_task: asyncio.Task[None] | None = None
+
+    async def getActiveThread(self, channel_id_int: int) -> Thread | None:
+        """
+        実況チャンネルで現在放送中のスレッドを取得する
+
+        Args:
+            channel_id_int (int): 実況チャンネル ID (jk の prefix を取り除いた数値)
+
+        Returns:
+            Thread | None: 現在放送中のスレッド (見つからない場合は None)
+        """
+
+        await self._ensureLoaded()
+        thread = self._findActiveThread(channel_id_int)
+
+        # 見つからなかった場合、読み込んだ後にスレッドが登録された可能性があるため、間隔を空けて読み込み直す
+        if thread is None and self.loaded_at is not None and time.time() - self.loaded_at >= THREAD_CACHE_MISS_RELOAD_INTERVAL_SECONDS:
+            await self.reload()
+            thread = self._findActiveThread(channel_id_int)
+        return thread
+
+    async def getThread(self, thread_id: int) -> Thread | None:
+        """
+        ID を指定してスレッドを取得する
+
+        Args:
+            thread_id (int): スレッド ID
+
+        Returns:
+            Thread | None: スレッド (見つからない場合は None)
+        """
+
+        await self._ensureLoaded()
+        thread = self.threads.get(thread_id)
+        if thread is not None:
+            return thread
+
+        thread = await Thread.filter(id=thread_id).first()
+        if thread is None:
+            return None
+
+        # 取得したスレッドを保持し、上限を超えたら最も古く取得したスレッドから削除する
+        ## 放送中・放送予定のスレッドは次に読み込み直した時点で live_threads 側から保持される
+        self.threads[thread_id] = thread
+        if thread.end_at < timezone.now():
+            self.ended_thread_ids[thread_id] = None
+            if len(self.ended_thread_ids) > THREAD_CACHE_MAX_ENDED_THREADS:
+                oldest_thread_id = next(iter(self.ended_thread_ids))
+                del self.ended_thread_ids[oldest_thread_id]
+                self.threads.pop(oldest_thread_id, None)
+        return thread
+
+    async def reload(self) -> None:
+        """
+        全チャンネルの放送中・放送予定のスレッドを DB から読み込み直す
+        すでに読み込み中の場合は、その読み込みが終わるのを待つ
+        """
+
+        if self._load_task is None or self._load_task.done():
+            self._load_task = asyncio.create_task(self._load())
+        await asyncio.shield(self._load_task)
+
+    def invalidate(self, message: str = '') -> None:
+        """
+        RedisPubSubHub から通知を受け取り、放送中・放送予定のスレッドをバックグラウンドで読み込み直す
+        購読ハブの受信タスク内で同期的に呼び出されるため、await を伴う処理を行ってはならない
+
+        Args:
+            message (str, optional): 受信したメッセージ (使用しない). Defaults to ''.
+        """
+
+        if self._load_task is None or self._load_task.done():
+            self._load_task = asyncio.create_task(self._load())
+
+    def _findActiveThread(self, channel_id_int: int) -> Thread | None:
+        """
+        読み込み済みのスレッドから、実況チャンネルで現在放送中のスレッドを探す
+
+        Args:
+            channel_id_int (int): 実況チャンネル ID (jk の prefix を取り除いた数値)
+
+        Returns:
+            Thread | None: 現在放送中のスレッド (見つからない場合は None)
+        """
+
+        current_time_datetime = timezone.now()
+        for thread in self.live_threads.get(channel_id_int, []):
+            if thread.start_at <= current_time_datetime <= thread.end_at:
+                return thread
+        return None
+
+    async def _ensureLoaded(self) -> None:
+        """
+        放送中・放送予定のスレッドを一度も読み込んでいなければ読み込む
+        読み込んでから THREAD_CACHE_MAX_AGE_SECONDS 秒以上経過していれば、読み込み済みの情報を返しつつバックグラウンドで読み込み直す
+        """
+
+        if self.loaded_at is None:
+            # 他のサーバープロセスからの通知を受け取れるよう、購読ハブにハンドラを登録する
+            REDIS_PUBSUB_HUB.addHandler(REDIS_CHANNEL_THREAD_CACHE_INVALIDATION, self.invalidate)
+            await self.reload()
+        elif time.time() - self.loaded_at >= THREAD_CACHE_MAX_AGE_SECONDS:
+            self.invalidate()
+
+    async def _load(self) -> None:
+        """
+        全チャンネルの放送中・放送予定のスレッドを 1 回のクエリでまとめて DB から読み込む
+        """
+
+        loaded_at = time.time()
+        try:
+            threads = await Thread.filter(end_at__gte=timezone.now()).order_by('start_at')
+        except Exception as ex:
+            # 一度も読み込めていない場合は、呼び出し元にそのまま例外を送出する
+            if self.loaded_at is None:
+                raise
+            # 読み込み済みの情報がある場合はそのまま使い続け、読み込み直しは次の間隔まで控える
+            ## DB 接続断の間に、スレッドが見つからない接続のたびに DB に問い合わせ続けないようにする
+            logging.warning('ThreadCache: Failed to reload live threads. Keeping the cached threads.', exc_info = ex)
+            self.loaded_at = loaded_at
+            return
+
+        live_threads: dict[int, list[Thread]] = {}
+        for thread in threads:
+            live_threads.setdefault(thread.channel_id, []).append(thread)
+
+        # 放送が終了したスレッドは、ID 指定で取得したスレッドとして上限まで保持し続ける
+        for thread_list in self.live_threads.values():
+            for thread in thread_list:
+                if thread.id not in self.ended_thread_ids:
+                    self.ended_thread_ids[thread.id] = None
+        for thread in threads:
+            self.threads[thread.id] = thread
+            self.ended_thread_ids.pop(thread.id, None)
+        while len(self.ended_thread_ids) > THREAD_CACHE_MAX_ENDED_THREADS:
+            oldest_thread_id = next(iter(self.ended_thread_ids))
+            del self.ended_thread_ids[oldest_thread_id]
+            self.threads.pop(oldest_thread_id, None)
+
+        self.live_threads = live_threads
+        self.loaded_at = loaded_at
+        logging.info(f'ThreadCache: {len(threads)} live threads have been loaded.')
+
+
+# サーバープロセスごとに 1 つだけ存在するスレッド情報のキャッシュ
+THREAD_CACHE = ThreadCache()
+
+
+async def GetActiveThread(channel_id_int: int) -> Thread | None:
+    """
+    現在アクティブな (放送されている) スレッド情報を取得する
+
+    Args:
+        channel_id_int (int): 実況チャンネル ID (jk の prefix を取り除いた数値)
+
+    Returns:
+        Thread | None: 現在アクティブなスレッドの情報。見つからない場合は None を返す
+    """
+
+    return await THREAD_CACHE.getActiveThread(channel_id_int)
+
+
+async def GetThread(thread_id: int) -> Thread | None:
+    """
+    ID を指定してスレッド情報を取得する
+
+    Args:
+        thread_id (int): スレッド ID
+
+    Returns:
+        Thread | None: スレッドの情報。見つからない場合は None を返す
+    """
+
+    return await THREAD_CACHE.getThread(thread_id)
+
+
+async def PublishThreadCacheInvalidation() -> None:
+    """
+    全サーバープロセスに、放送中・放送予定のスレッドを DB から読み込み直すよう通知する
+    """
+
+    await REDIS_CLIENT.publish(REDIS_CHANNEL_THREAD_CACHE_INVALIDATION, str(time.time()))
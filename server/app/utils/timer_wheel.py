@@ -0,0 +1,250 @@
+import asyncio
+import math
+import time
+from collections.abc import Callable
+
+from app import logging
+from app.utils.metrics import METRICS, MetricFamily, MetricSample
+
+
+class TimerHandle:
+    """
+    TimerWheel に登録したタイマーを表すハンドル
+    """
+
+    __slots__ = ('callback', 'is_cancelled', 'is_fired', 'tick', 'wheel')
+
+    def __init__(self, wheel: 'TimerWheel', tick: int, callback: Callable[[], None]) -> None:
+        """
+        Args:
+            wheel (TimerWheel): タイマーを登録した TimerWheel
+            tick (int): タイマーが発火する tick (UNIX タイムスタンプを TimerWheel の分解能で割ったもの)
+            callback (Callable[[], None]): タイマーの発火時に呼び出すコールバック
+        """
+
+        self.wheel = wheel
+        self.tick = tick
+        self.callback = callback
+        self.is_cancelled = False
+        self.is_fired = False
+
+    def cancel(self) -> None:
+        """
+        タイマーをキャンセルする (発火済み・キャンセル済みの場合は何もしない)
+        キャンセルしたタイマーはスロットからすぐには削除されず、発火する時刻になった時点で読み捨てられる
+        """
+
+        if self.is_cancelled is False and self.is_fired is False:
+            self.is_cancelled = True
+            self.wheel.active_count -= 1
+
+
+class TimerWheel:
+    """
+    サーバープロセス内の全ての接続の期限 (放送終了時刻による切断や定期送信の時刻など) を 1 つのタスクでまとめて管理する階層型タイマーホイール
+
+    接続ごとに asyncio.sleep() や wait_for() のタイムアウトで期限を待つと、接続数に比例して起床やタイマーの登録・解除が発生する
+    このクラスでは期限を分解能 (既定では 1 秒) 単位の tick に丸め、tick ごとのスロットに振り分けておき、
+    1 つのタスクが tick ごとに 1 度だけ起床して、その tick に期限を迎えた全てのタイマーのコールバックをまとめて呼び出す
+    登録・キャンセルは O(1) で、起床の回数は接続数によらず、タイマーが 1 つもない間は一切起床しない
+
+    スロットは SLOT_COUNT 個ずつ LEVEL_COUNT 段の階層になっており、下の段ほど近い将来の期限を細かい単位で扱う
+    上の段のスロットに入っているタイマーは、そのスロットの時刻になった時点で下の段のスロットへ振り分け直される
+    どの段にも収まらない遠い将来の期限は、最上段が一周するたびに振り分け直す
+    """
+
+    # 各段のスロットの数
+    SLOT_COUNT = 64
+    # 段の数 (分解能 1 秒なら、64 秒・約 68 分・約 73 時間・約 194 日先までの期限をそれぞれの段で扱える)
+    LEVEL_COUNT = 4
+
+    def __init__(self, resolution: float = 1.0) -> None:
+        """
+        Args:
+            resolution (float, optional): タイマーの分解能 (秒). Defaults to 1.0.
+        """
+
+        self.resolution = resolution
+        self.levels: list[list[list[TimerHandle]]] = [
+            [[] for _ in range(self.SLOT_COUNT)] for _ in range(self.LEVEL_COUNT)
+        ]
+        # どの段にも収まらない遠い将来のタイマー
+        self.overflow: list[TimerHandle] = []
+        # 最後に処理した tick
+        self.current_tick = math.floor(time.time() / resolution)
+        # 発火もキャンセルもされていないタイマーの数
+        self.active_count = 0
+        # 発火したタイマーの延べ数
+        self.fired_count = 0
+        # タイマーが登録されたことを、タイマーが 1 つもない間待機しているタスクに知らせるイベント
+        self._scheduled_event = asyncio.Event()
+        self._run_task: asyncio.Task[None] | None = None
+
+    def schedule(self, deadline: float, callback: Callable[[], None]) -> TimerHandle:
+        """
+        指定した時刻に呼び出されるコールバックを登録する
+        コールバックは TimerWheel のタスク内で同期的に呼び出されるため、ブロックする処理を行ってはならない
+
+        Args:
+            deadline (float): コールバックを呼び出す時刻 (UNIX タイムスタンプ / 過去の時刻なら次の tick で呼び出される)
+            callback (Callable[[], None]): 呼び出すコールバック
+
+        Returns:
+            TimerHandle: 登録したタイマーのハンドル
+        """
+
+        # タイマーが 1 つもない間はタスクが tick を進めないため、スロットを空にして tick を現在時刻に合わせ直す
+        ## この時点でスロットに残っているのは、キャンセル済みで読み捨てられるのを待っているタイマーだけ
+        if self.active_count == 0:
+            for level in self.levels:
+                for slot in level:
+                    slot.clear()
+            self.overflow.clear()
+            self.current_tick = max(self.current_tick, math.floor(time.time() / self.resolution))
+
+        # 期限は分解能の単位で切り上げ、期限より早く発火しないようにする
+        handle = TimerHandle(self, max(math.ceil(deadline / self.resolution), self.current_tick + 1), callback)
+        self._place(handle)
+        self.active_count += 1
+
+        # タスクが未起動または終了済みなら新しいタスクを開始する
+        if self._run_task is None or self._run_task.done():
+            self._run_task = asyncio.create_task(self._run())
+        self._scheduled_event.set()
+        return handle
+
+    async def waitUntil(self, deadline: float) -> None:
+        """
+        指定した時刻になるまで待機する
+        asyncio.sleep() と異なり、同じ tick に期限を迎えた全ての待機がまとめて再開される
+
+        Args:
+            deadline (float): 待機を終える時刻 (UNIX タイムスタンプ)
+        """
+
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+
+        def Wake() -> None:
+            if future.done() is False:
+                future.set_result(None)
+
+        handle = self.schedule(deadline, Wake)
+        try:
+            await future
+        finally:
+            handle.cancel()
+
+    def _place(self, handle: TimerHandle) -> None:
+        """
+        タイマーを、発火する tick までの距離に応じた段のスロットに格納する
+
+        Args:
+            handle (TimerHandle): 格納するタイマー
+        """
+
+        delta = handle.tick - self.current_tick
+        span = self.SLOT_COUNT
+        for level in range(self.LEVEL_COUNT):
+            if delta < span:
+                self.levels[level][(handle.tick // (span // self.SLOT_COUNT)) % self.SLOT_COUNT].append(handle)
+                return
+            span *= self.SLOT_COUNT
+        self.overflow.append(handle)
+
+    def _advance(self, tick: int) -> None:
+        """
+        tick を 1 つ進め、上の段のスロットの振り分け直しと、その tick に期限を迎えたタイマーの発火を行う
+
+        Args:
+            tick (int): 進めた後の tick
+        """
+
+        self.current_tick = tick
+
+        # 段の区切りを迎えた場合は、上の段から順に、この tick から始まるスロットのタイマーを下の段へ振り分け直す
+        span = self.SLOT_COUNT ** self.LEVEL_COUNT
+        if tick % span == 0:
+            overflow = self.overflow
+            self.overflow = []
+            for handle in overflow:
+                if handle.is_cancelled is False:
+                    self._place(handle)
+        for level in range(self.LEVEL_COUNT - 1, 0, -1):
+            span = self.SLOT_COUNT ** level
+            if tick % span != 0:
+                continue
+            slot_index = (tick // span) % self.SLOT_COUNT
+            handles = self.levels[level][slot_index]
+            self.levels[level][slot_index] = []
+            for handle in handles:
+                if handle.is_cancelled is False:
+                    self._place(handle)
+
+        # この tick に期限を迎えたタイマーをまとめて発火させる
+        slot_index = tick % self.SLOT_COUNT
+        handles = self.levels[0][slot_index]
+        self.levels[0][slot_index] = []
+        for handle in handles:
+            if handle.is_cancelled is True:
+                continue
+            handle.is_fired = True
+            self.active_count -= 1
+            self.fired_count += 1
+            # 1 つのコールバックの例外で同じ tick の他のタイマーが発火しなくならないよう、コールバックごとに例外を握りつぶす
+            try:
+                handle.callback()
+            except Exception as ex:
+                logging.error('TimerWheel: Timer callback raised an exception:', exc_info=ex)
+
+    async def _run(self) -> None:
+        """
+        tick ごとに起床し、期限を迎えたタイマーを発火させる
+        """
+
+        while True:
+
+            # タイマーが 1 つもない間は、登録されるまで起床しない
+            if self.active_count == 0:
+                self._scheduled_event.clear()
+                await self._scheduled_event.wait()
+                # 待機中に経過した tick は、schedule() でタイマーを登録する直前に読み飛ばされている
+
+            # 次の tick まで待機する
+            await asyncio.sleep(max((self.current_tick + 1) * self.resolution - time.time(), 0))
+
+            # 待機中に経過した tick を 1 つずつ処理する
+            ## イベントループの遅延やシステム時刻の変更で複数の tick が経過していても、期限を迎えたタイマーを取りこぼさない
+            now_tick = math.floor(time.time() / self.resolution)
+            while self.current_tick < now_tick:
+                self._advance(self.current_tick + 1)
+
+
+# サーバープロセスごとに 1 つだけ存在するタイマーホイール
+TIMER_WHEEL = TimerWheel()
+
+
+def CollectTimerWheelMetrics() -> list[MetricFamily]:
+    """
+    このサーバープロセスのタイマーホイールの状況をメトリクスとして取得する
+
+    Returns:
+        list[MetricFamily]: 登録中のタイマーの数と、発火したタイマーの延べ数のメトリクス
+    """
+
+    return [
+        MetricFamily(
+            name = 'nx_jikkyo_timer_wheel_active_timers',
+            type = 'gauge',
+            help = 'Number of timers registered in the timer wheel that have neither fired nor been cancelled.',
+            samples = [MetricSample(name='nx_jikkyo_timer_wheel_active_timers', labels={}, value=TIMER_WHEEL.active_count)],
+        ),
+        MetricFamily(
+            name = 'nx_jikkyo_timer_wheel_fired_timers_total',
+            type = 'counter',
+            help = 'Number of timers fired by the timer wheel.',
+            samples = [MetricSample(name='nx_jikkyo_timer_wheel_fired_timers_total', labels={}, value=TIMER_WHEEL.fired_count)],
+        ),
+    ]
+
+
+METRICS.addCollector(CollectTimerWheelMetrics)
@@ -6,6 +6,7 @@ from tortoise.backends.base.client import TransactionalDBClient
 from tortoise.transactions import in_transaction
 
 from app import logging
+from app.utils.metrics import METRICS, MetricFamily, MetricSample
 
 
 # DB ダウン時にドライバ層から返る代表的なメッセージ断片を保持する
@@ -90,6 +91,52 @@ def RecoverStaleTransactionConnectionContext() -> bool:
     return True
 
 
+def GetTransactionOperationLabel(operation_name: str) -> str:
+    """
+    ログ出力用の操作名から、メトリクスのラベルに使う操作名を取得する
+    ログ出力用の操作名にはチャンネル ID などが含まれる場合があるため (ex: ThreadCommentWriter [jk211])、先頭の単語だけを使う
+
+    Args:
+        operation_name (str): ログ出力用の操作名
+
+    Returns:
+        str: メトリクスのラベルに使う操作名
+    """
+
+    return operation_name.split(' ', 1)[0]
+
+
+def CollectDatabasePoolMetrics() -> list[MetricFamily]:
+    """
+    このサーバープロセスの DB 接続プールの使用状況をメトリクスとして取得する
+
+    Returns:
+        list[MetricFamily]: DB 接続プールの接続数・使用中の接続数・上限のメトリクス
+    """
+
+    families = [
+        MetricFamily(name='nx_jikkyo_db_pool_connections', type='gauge', help='Number of connections currently opened by the database connection pool.'),
+        MetricFamily(name='nx_jikkyo_db_pool_connections_in_use', type='gauge', help='Number of database connections currently acquired from the pool.'),
+        MetricFamily(name='nx_jikkyo_db_pool_max_connections', type='gauge', help='Maximum number of connections of the database connection pool.'),
+    ]
+
+    # Tortoise ORM の MySQL クライアントは、接続プール (aiomysql.Pool) を _pool に保持している
+    ## 初回のクエリまで接続プールは作成されないため、未作成の場合は何も返さない
+    try:
+        pool = getattr(connections.get('default'), '_pool', None)
+    except Exception:
+        pool = None
+    if pool is None:
+        return families
+    families[0].samples.append(MetricSample(name=families[0].name, labels={}, value=pool.size))
+    families[1].samples.append(MetricSample(name=families[1].name, labels={}, value=pool.size - pool.freesize))
+    families[2].samples.append(MetricSample(name=families[2].name, labels={}, value=pool.maxsize))
+    return families
+
+
+METRICS.addCollector(CollectDatabasePoolMetrics)
+
+
 async def RunTransactionWithReconnectRetry[TransactionResultType](
     operation: Callable[[TransactionalDBClient], Awaitable[TransactionResultType]],
     operation_name: str,
@@ -128,6 +175,12 @@ async def RunTransactionWithReconnectRetry[TransactionResultType](
                 if is_last_retry is True:
                     raise
 
+                METRICS.increment(
+                    'nx_jikkyo_transaction_retries_total',
+                    operation = GetTransactionOperationLabel(operation_name),
+                    reason = 'database_unavailable',
+                )
+
                 # 障害復旧直後の突発負荷を避けるため、試行回数に応じて待機時間をわずかに伸ばす
                 retry_wait_seconds_for_unavailable_db = min(retry_wait_seconds * (retry_count + 1), 1.0)
                 logging.warning(
@@ -149,6 +202,12 @@ async def RunTransactionWithReconnectRetry[TransactionResultType](
                 exc_info = ex,
             )
 
+            METRICS.increment(
+                'nx_jikkyo_transaction_retries_total',
+                operation = GetTransactionOperationLabel(operation_name),
+                reason = 'stale_connection_context',
+            )
+
             # 念のためここでも context 回復を実行してから再試行する
             RecoverStaleTransactionConnectionContext()
             await asyncio.sleep(retry_wait_seconds)
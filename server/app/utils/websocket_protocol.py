@@ -0,0 +1,186 @@
+import time
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Any
+
+from uvicorn.protocols.websockets.websockets_impl import WebSocketProtocol
+from websockets.extensions.base import Extension, ServerExtensionFactory
+from websockets.extensions.permessage_deflate import (
+    PerMessageDeflate,
+    ServerPerMessageDeflateFactory,
+)
+from websockets.frames import CTRL_OPCODES, Frame
+from websockets.typing import ExtensionParameter
+
+from app import logging
+from app.config import CONFIG
+from app.utils.metrics import METRICS, MetricFamily, MetricSample
+
+
+# permessage-deflate 圧縮の統計情報をログに出力する間隔 (秒)
+WEBSOCKET_COMPRESSION_STATS_LOG_INTERVAL_SECONDS = 300.0
+
+
+@dataclass(slots=True)
+class WebSocketCompressionStats:
+    """
+    サーバープロセスごとの WebSocket の permessage-deflate 圧縮の統計情報
+
+    Attributes:
+        message_count (int): 圧縮したメッセージ (フレーム) の数
+        uncompressed_bytes (int): 圧縮前のバイト数の合計
+        compressed_bytes (int): 圧縮後のバイト数の合計
+        compress_seconds (float): 圧縮にかかった時間の合計 (秒)
+    """
+
+    message_count: int = 0
+    uncompressed_bytes: int = 0
+    compressed_bytes: int = 0
+    compress_seconds: float = 0.0
+
+
+# このサーバープロセスの WebSocket の permessage-deflate 圧縮の統計情報
+WEBSOCKET_COMPRESSION_STATS = WebSocketCompressionStats()
+
+# 統計情報を最後にログに出力した時刻
+__last_compression_stats_logged_at = time.monotonic()
+
+
+def CollectWebSocketCompressionMetrics() -> list[MetricFamily]:
+    """
+    このサーバープロセスの WebSocket の permessage-deflate 圧縮の統計情報をメトリクスとして取得する
+
+    Returns:
+        list[MetricFamily]: 圧縮したメッセージ数・圧縮前後のバイト数・圧縮にかかった時間のメトリクス
+    """
+
+    stats = WEBSOCKET_COMPRESSION_STATS
+    families: list[MetricFamily] = []
+    for name, help, value in (
+        ('nx_jikkyo_websocket_compressed_messages_total', 'Number of WebSocket messages compressed with permessage-deflate.', stats.message_count),
+        ('nx_jikkyo_websocket_uncompressed_bytes_total', 'Total size of WebSocket messages before permessage-deflate compression.', stats.uncompressed_bytes),
+        ('nx_jikkyo_websocket_compressed_bytes_total', 'Total size of WebSocket messages after permessage-deflate compression.', stats.compressed_bytes),
+        ('nx_jikkyo_websocket_compress_seconds_total', 'Total CPU time spent on permessage-deflate compression.', stats.compress_seconds),
+    ):
+        families.append(MetricFamily(
+            name = name,
+            type = 'counter',
+            help = help,
+            samples = [MetricSample(name=name, labels={}, value=value)],
+        ))
+    return families
+
+
+METRICS.addCollector(CollectWebSocketCompressionMetrics)
+
+
+def LogWebSocketCompressionStatsIfNeeded(now: float) -> None:
+    """
+    前回の出力から一定時間が経過していれば、permessage-deflate 圧縮の統計情報をログに出力する
+    圧縮を有効にすることで削減できたバイト数と、そのために使った CPU 時間を比較して設定を判断できるようにする
+
+    Args:
+        now (float): 現在の time.monotonic() の値
+    """
+
+    global __last_compression_stats_logged_at
+    if now - __last_compression_stats_logged_at < WEBSOCKET_COMPRESSION_STATS_LOG_INTERVAL_SECONDS:
+        return
+    __last_compression_stats_logged_at = now
+
+    stats = WEBSOCKET_COMPRESSION_STATS
+    if stats.message_count == 0:
+        return
+    saved_bytes = stats.uncompressed_bytes - stats.compressed_bytes
+    logging.info(
+        f'WebSocket compression stats (Port {CONFIG.SPECIFIED_SERVER_PORT}): '
+        f'messages: {stats.message_count}, '
+        f'bytes: {stats.uncompressed_bytes} -> {stats.compressed_bytes} '
+        f'(ratio: {stats.compressed_bytes / max(stats.uncompressed_bytes, 1):.3f}, saved: {saved_bytes}), '
+        f'cpu: {stats.compress_seconds:.3f}s '
+        f'({stats.compress_seconds * 1000000 / stats.message_count:.1f}us/message, '
+        f'{saved_bytes / max(stats.compress_seconds, 1e-9) / 1024 / 1024:.1f}MiB saved/cpu-second)'
+    )
+
+
+class InstrumentedPerMessageDeflate(PerMessageDeflate):
+    """
+    送信するメッセージの圧縮にかかった時間と圧縮前後のバイト数を計測する permessage-deflate 拡張機能
+    """
+
+    def encode(self, frame: Frame) -> Frame:
+
+        # 制御フレームは圧縮されないため計測しない
+        if frame.opcode in CTRL_OPCODES:
+            return super().encode(frame)
+
+        start_time = time.perf_counter()
+        encoded_frame = super().encode(frame)
+        end_time = time.perf_counter()
+
+        stats = WEBSOCKET_COMPRESSION_STATS
+        stats.message_count += 1
+        stats.uncompressed_bytes += len(frame.data)
+        stats.compressed_bytes += len(encoded_frame.data)
+        stats.compress_seconds += end_time - start_time
+        LogWebSocketCompressionStatsIfNeeded(end_time)
+
+        return encoded_frame
+
+
+class InstrumentedServerPerMessageDeflateFactory(ServerPerMessageDeflateFactory):
+    """
+    ネゴシエーションした permessage-deflate 拡張機能を、同じパラメーターの InstrumentedPerMessageDeflate に置き換えて返す ServerPerMessageDeflateFactory
+    """
+
+    def process_request_params(
+        self,
+        params: Sequence[ExtensionParameter],
+        accepted_extensions: Sequence[Extension],
+    ) -> tuple[list[ExtensionParameter], PerMessageDeflate]:
+        response_params, extension = super().process_request_params(params, accepted_extensions)
+        return response_params, InstrumentedPerMessageDeflate(
+            remote_no_context_takeover = extension.remote_no_context_takeover,
+            local_no_context_takeover = extension.local_no_context_takeover,
+            remote_max_window_bits = extension.remote_max_window_bits,
+            local_max_window_bits = extension.local_max_window_bits,
+            compress_settings = extension.compress_settings,
+        )
+
+
+def CreatePerMessageDeflateFactory() -> ServerExtensionFactory:
+    """
+    .env の設定に基づいて、permessage-deflate 拡張機能のネゴシエーションを行う ServerExtensionFactory を生成する
+
+    Returns:
+        ServerExtensionFactory: permessage-deflate 拡張機能の ServerExtensionFactory
+    """
+
+    # 既定の設定 (窓のサイズ 15 ビット・memLevel 8) では、圧縮用の状態だけで接続ごとに 256KB 以上のメモリを使う
+    ## 窓のサイズ 12 ビット・memLevel 5 なら接続ごとに数十 KB に収まり、数百バイト程度のコメントの圧縮率はほとんど変わらない
+    ## クライアントから送られるメッセージはごく僅かなので、クライアント側の窓のサイズも同じ値に制限して展開用のメモリも抑える
+    ## コンテキスト引き継ぎを有効にすると、直前までに送信したコメントのキーやコマンドなどが辞書として働き、1 件ごとの圧縮率が大きく向上する
+    return InstrumentedServerPerMessageDeflateFactory(
+        server_no_context_takeover = CONFIG.WEBSOCKET_DEFLATE_CONTEXT_TAKEOVER is False,
+        server_max_window_bits = CONFIG.WEBSOCKET_DEFLATE_WINDOW_BITS,
+        client_max_window_bits = CONFIG.WEBSOCKET_DEFLATE_WINDOW_BITS,
+        compress_settings = {
+            'level': CONFIG.WEBSOCKET_DEFLATE_COMPRESSION_LEVEL,
+            'memLevel': CONFIG.WEBSOCKET_DEFLATE_MEM_LEVEL,
+        },
+    )
+
+
+class NXJikkyoWebSocketProtocol(WebSocketProtocol):
+    """
+    permessage-deflate 圧縮の設定を .env から調整できるようにした Uvicorn の WebSocket プロトコル実装
+    Uvicorn 標準の実装では permessage-deflate の有効・無効しか指定できず、圧縮の設定は websockets の既定値で固定されている
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+
+        # Uvicorn が設定した既定の設定の permessage-deflate 拡張機能を、調整した設定のものに差し替える
+        ## ネゴシエーションはハンドシェイク時に行われるため、コンストラクタで差し替えれば全ての接続に反映される
+        if self.config.ws_per_message_deflate is True:
+            self.available_extensions = [CreatePerMessageDeflateFactory()]
@@ -0,0 +1,671 @@
+#!/usr/bin/env python3
+
+"""
+Usage: poetry run python misc/LoadTest.py --base-url http://127.0.0.1:5610 --channel jk1 --clients 2000 --output result.json
+
+NX-Jikkyo の視聴セッション・コメントセッション WebSocket に、NicoJK / KonomiTV と同じ手順で大量のクライアントを接続する負荷試験ツールです。
+ローカルで起動した NX-Jikkyo サーバー (docker compose で MySQL・Redis と一緒に起動したもの、または同等の代替環境) に対して実行します。
+本番環境に対しては絶対に実行しないでください。
+
+各クライアントの動作:
+- 視聴セッション WebSocket に接続して startWatching を送信し、room メッセージからコメントセッションの URI・スレッド ID・yourPostKey を取得
+- コメントセッション WebSocket に接続して [ping(rs:0), ping(ps:0), thread(res_from), ping(pf:0), ping(rf:0)] を送信
+- ping(rf:0) が返ってきた時点で接続完了とし、以降は seat メッセージの間隔で keepSeat を、ping メッセージには pong を返す
+- --posters で指定した数のクライアントは、全クライアントの接続完了後に --post-interval 秒ごとに postComment を送信
+
+計測内容:
+- 接続の立ち上がり: 接続完了までの時間のパーセンタイル、実際に達成できた接続レート、失敗数
+- コメントの配信遅延: postComment を送信してから各クライアントのコメントセッションに chat が届くまでの時間のパーセンタイル
+- コメント投稿の応答時間: postComment を送信してから postCommentResult が返るまでの時間のパーセンタイル
+- CPU 使用率: --server-pid で指定したサーバープロセスの CPU 時間 (/proc から取得) を、接続中の WebSocket 1000 本あたりに換算した値
+
+結果は JSON で出力されるため、--compare に以前の結果を指定するとコミット間で主要な指標を比較できます。
+コメントの配信遅延は負荷試験ツール自身の時計で計測するため、負荷試験ツールの CPU が飽和していると遅延が大きく見える点に注意してください。
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+import websockets
+
+
+# 結果の JSON の形式のバージョン (形式を変更したら増やす)
+RESULT_FORMAT_VERSION = 1
+
+# 投稿するコメント本文の先頭に付ける目印
+## 他の利用者のコメントや初回取得コメントと区別し、本文から投稿時刻を取り出すために使う
+COMMENT_MARKER = "nx-loadtest"
+
+# --compare で比較する指標 (結果の JSON 内のパスと、値が小さいほど良いかどうか)
+COMPARE_METRICS: list[tuple[str, bool]] = [
+    ("ramp.achieved_rate_per_second", False),
+    ("ramp.ready_ms.p50", True),
+    ("ramp.ready_ms.p99", True),
+    ("delivery.latency_ms.p50", True),
+    ("delivery.latency_ms.p99", True),
+    ("delivery.latency_ms.p999", True),
+    ("delivery.delivery_ratio", False),
+    ("post_ack.latency_ms.p99", True),
+    ("cpu.server_cores_per_1k_sockets", True),
+]
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    コマンドライン引数を解析します。
+    """
+    parser = argparse.ArgumentParser(
+        description="Simulate NicoJK/KonomiTV WebSocket clients against a local NX-Jikkyo server."
+    )
+    parser.add_argument(
+        "--base-url",
+        default="http://127.0.0.1:5610",
+        help="Base URL of the NX-Jikkyo server (default: http://127.0.0.1:5610).",
+    )
+    parser.add_argument(
+        "--channel",
+        action="append",
+        default=None,
+        help="Channel ID to connect to. Can be given multiple times; clients are spread across channels (default: jk1).",
+    )
+    parser.add_argument(
+        "--clients",
+        type=int,
+        default=1000,
+        help="Number of simulated clients. Each client opens 2 WebSockets (default: 1000).",
+    )
+    parser.add_argument(
+        "--ramp-rate",
+        type=float,
+        default=200.0,
+        help="Target number of new clients per second during ramp-up (default: 200).",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=60.0,
+        help="Seconds to keep all clients connected after ramp-up (default: 60).",
+    )
+    parser.add_argument(
+        "--posters",
+        type=int,
+        default=10,
+        help="Number of clients that post comments during the steady phase (default: 10).",
+    )
+    parser.add_argument(
+        "--post-interval",
+        type=float,
+        default=2.0,
+        help="Seconds between comments for each poster. Must be >= 0.5 to avoid the server's flood guard (default: 2).",
+    )
+    parser.add_argument(
+        "--res-from",
+        type=int,
+        default=-100,
+        help="res_from sent in the thread command (default: -100).",
+    )
+    parser.add_argument(
+        "--connect-timeout",
+        type=float,
+        default=30.0,
+        help="Seconds to wait for a client to become ready (default: 30).",
+    )
+    parser.add_argument(
+        "--server-pid",
+        type=int,
+        action="append",
+        default=[],
+        help="PID of a server process to sample CPU time from. Can be given multiple times (Linux only).",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="Write the JSON result to this file instead of stdout.",
+    )
+    parser.add_argument(
+        "--compare",
+        default=None,
+        help="Previous JSON result to compare against.",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Random seed for reproducible post timing.",
+    )
+    args = parser.parse_args()
+    if args.channel is None:
+        args.channel = ["jk1"]
+    if args.post_interval < 0.5:
+        parser.error("--post-interval must be >= 0.5")
+    return args
+
+
+class Histogram:
+    """
+    対数スケールのバケットで値を集計するヒストグラム。
+    サンプル数によらずメモリ使用量が一定で、相対誤差 1% 程度でパーセンタイルを求められます。
+    """
+
+    # バケットの幅 (隣り合うバケットの境界の比)
+    BUCKET_RATIO = 1.01
+
+    def __init__(self) -> None:
+        self.buckets: dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, value: float) -> None:
+        """
+        値を記録します (0 以下の値は最小のバケットに入ります)。
+        """
+        index = int(math.log(value) / math.log(self.BUCKET_RATIO)) if value > 1e-6 else -1
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def percentile(self, percent: float) -> float | None:
+        """
+        パーセンタイルを求めます (バケットの上端の値を返します)。
+        """
+        if self.count == 0:
+            return None
+        threshold = math.ceil(self.count * percent / 100)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= threshold:
+                if index < 0:
+                    return 0.0
+                return min(self.BUCKET_RATIO ** (index + 1), self.max)
+        return self.max
+
+    def summary(self) -> dict[str, Any]:
+        """
+        結果の JSON に出力する要約を返します。
+        """
+        def rounded(value: float | None) -> float | None:
+            return None if value is None else round(value, 3)
+        return {
+            "count": self.count,
+            "mean": rounded(self.total / self.count) if self.count > 0 else None,
+            "min": rounded(self.min) if self.count > 0 else None,
+            "p50": rounded(self.percentile(50)),
+            "p90": rounded(self.percentile(90)),
+            "p99": rounded(self.percentile(99)),
+            "p999": rounded(self.percentile(99.9)),
+            "max": rounded(self.max) if self.count > 0 else None,
+        }
+
+
+@dataclass
+class Stats:
+    """
+    全クライアントで共有する計測結果を保持するデータクラス。
+    """
+    ready_ms: Histogram = field(default_factory=Histogram)
+    delivery_ms: Histogram = field(default_factory=Histogram)
+    post_ack_ms: Histogram = field(default_factory=Histogram)
+    ready_clients: int = 0
+    open_sockets: int = 0
+    failed_clients: int = 0
+    disconnected_clients: int = 0
+    posted_comments: int = 0
+    post_errors: int = 0
+    delivered_comments: int = 0
+    # 投稿したコメントが届くはずだったクライアント数の合計 (投稿時点で接続完了していたクライアント数の合計)
+    expected_deliveries: int = 0
+    errors: dict[str, int] = field(default_factory=dict)
+    ramp_started_at: float = 0.0
+    ramp_finished_at: float = 0.0
+
+    def add_error(self, kind: str) -> None:
+        """
+        エラーの種類ごとの発生回数を数えます。
+        """
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+
+def to_websocket_url(base_url: str, path: str) -> str:
+    """
+    HTTP のベース URL から WebSocket の URL を組み立てます。
+    """
+    base = base_url.rstrip("/")
+    if base.startswith("https://"):
+        base = "wss://" + base[len("https://"):]
+    elif base.startswith("http://"):
+        base = "ws://" + base[len("http://"):]
+    return base + path
+
+
+def read_process_cpu_seconds(pids: list[int]) -> float | None:
+    """
+    /proc/{pid}/stat から、指定されたプロセスの CPU 時間 (ユーザー + システム) の合計を秒単位で取得します。
+    """
+    if not pids:
+        return None
+    clock_ticks = os.sysconf("SC_CLK_TCK")
+    total = 0
+    for pid in pids:
+        try:
+            stat = Path(f"/proc/{pid}/stat").read_text()
+        except OSError:
+            return None
+        # プロセス名に空白や括弧が含まれる場合に備え、最後の ")" 以降を分割します。
+        fields = stat[stat.rindex(")") + 2:].split()
+        total += int(fields[11]) + int(fields[12])
+    return total / clock_ticks
+
+
+def get_git_commit() -> str | None:
+    """
+    負荷試験を実行したソースコードのコミットハッシュを取得します。
+    """
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip() or None
+
+
+def raise_open_file_limit(required: int) -> None:
+    """
+    同時に開くソケットの数に合わせて、ファイルディスクリプタの上限を可能な範囲で引き上げます。
+    """
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY or soft >= required:
+        return
+    new_soft = required if hard == resource.RLIM_INFINITY else min(required, hard)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (new_soft, hard))
+    if new_soft < required:
+        print(f"Warning: open file limit is {new_soft}, but {required} sockets are needed.", file=sys.stderr)
+
+
+class SimulatedClient:
+    """
+    NicoJK / KonomiTV と同じ手順で視聴セッション・コメントセッションに接続する、1 クライアント分の動作を再現します。
+    """
+
+    def __init__(self, index: int, args: argparse.Namespace, run_id: str, stats: Stats, stop_event: asyncio.Event) -> None:
+        self.index = index
+        self.args = args
+        self.run_id = run_id
+        self.stats = stats
+        self.stop_event = stop_event
+        self.channel_id: str = args.channel[index % len(args.channel)]
+        self.is_poster = index < args.posters
+        # Cookie の NX-User-ID でクライアントごとに別のユーザーとして扱わせます (同じ IP からの接続でも連投扱いにならないようにするため)。
+        self.headers = {
+            "Cookie": f"NX-User-ID=loadtest-{run_id}-{index}",
+            "User-Agent": "NX-Jikkyo-LoadTest/1.0",
+        }
+        self.ready_event = asyncio.Event()
+        self.post_sent_at: dict[int, float] = {}
+        self.keep_interval = 30.0
+        self.watch_ws: Any = None
+
+    async def run(self, post_start_event: asyncio.Event) -> None:
+        """
+        クライアントを接続し、stop_event がセットされるまで接続を維持します。
+        """
+        started_at = time.perf_counter()
+        watch_url = to_websocket_url(self.args.base_url, f"/api/v1/channels/{self.channel_id}/ws/watch")
+        try:
+            async with websockets.connect(watch_url, extra_headers=self.headers, max_size=None, open_timeout=self.args.connect_timeout) as watch_ws:
+                self.stats.open_sockets += 1
+                self.watch_ws = watch_ws
+                try:
+                    await watch_ws.send(json.dumps({"type": "startWatching", "data": {"reconnect": False}}))
+                    room = await asyncio.wait_for(self.wait_for_room(watch_ws), timeout=self.args.connect_timeout)
+                    comment_url = room["messageServer"]["uri"]
+                    async with websockets.connect(comment_url, extra_headers=self.headers, max_size=None, open_timeout=self.args.connect_timeout) as comment_ws:
+                        self.stats.open_sockets += 1
+                        try:
+                            await self.run_connected(watch_ws, comment_ws, room, started_at, post_start_event)
+                        finally:
+                            self.stats.open_sockets -= 1
+                finally:
+                    self.stats.open_sockets -= 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as ex:
+            if self.ready_event.is_set():
+                self.stats.disconnected_clients += 1
+                self.stats.add_error(f"disconnected:{type(ex).__name__}")
+            else:
+                self.stats.failed_clients += 1
+                self.stats.add_error(f"connect:{type(ex).__name__}")
+        finally:
+            if self.ready_event.is_set():
+                self.stats.ready_clients -= 1
+            # 接続に失敗した場合も、立ち上がりの待機が終わるように接続完了扱いにします。
+            self.ready_event.set()
+
+    async def wait_for_room(self, watch_ws: Any) -> dict[str, Any]:
+        """
+        視聴セッションから room メッセージが届くまで待機します。
+        """
+        while True:
+            message = json.loads(await watch_ws.recv())
+            if message.get("type") == "seat":
+                self.keep_interval = float(message["data"].get("keepIntervalSec", 30))
+            elif message.get("type") == "room":
+                return message["data"]
+            elif message.get("type") in ("error", "disconnect"):
+                raise RuntimeError(f"watch session returned {message.get('type')}: {message.get('data')}")
+
+    async def run_connected(self, watch_ws: Any, comment_ws: Any, room: dict[str, Any], started_at: float, post_start_event: asyncio.Event) -> None:
+        """
+        両方のセッションの接続後、コメント受信開始から切断までの処理を行います。
+        """
+        await comment_ws.send(json.dumps([
+            {"ping": {"content": "rs:0"}},
+            {"ping": {"content": "ps:0"}},
+            {
+                "thread": {
+                    "version": "20061206",
+                    "thread": room["threadId"],
+                    "threadkey": room["yourPostKey"],
+                    "user_id": "",
+                    "res_from": self.args.res_from,
+                },
+            },
+            {"ping": {"content": "pf:0"}},
+            {"ping": {"content": "rf:0"}},
+        ]))
+
+        tasks = [
+            asyncio.create_task(self.receive_comments(comment_ws, started_at)),
+            asyncio.create_task(self.receive_watch_messages(watch_ws)),
+            asyncio.create_task(self.keep_seat(watch_ws)),
+        ]
+        if self.is_poster:
+            tasks.append(asyncio.create_task(self.post_comments(watch_ws, room, post_start_event)))
+        stop_task = asyncio.create_task(self.stop_event.wait())
+        try:
+            done, _ = await asyncio.wait([*tasks, stop_task], return_when=asyncio.FIRST_COMPLETED)
+            # stop_event 以外のタスクが先に終了した場合は、サーバー側から切断されたか例外が発生しています。
+            for task in done:
+                if task is not stop_task and task.exception() is not None:
+                    raise task.exception()  # type: ignore[misc]
+            if stop_task not in done:
+                raise ConnectionError("session ended before the test finished")
+        finally:
+            for task in [*tasks, stop_task]:
+                task.cancel()
+            await asyncio.gather(*tasks, stop_task, return_exceptions=True)
+
+    async def receive_comments(self, comment_ws: Any, started_at: float) -> None:
+        """
+        コメントセッションからのメッセージを受信し、接続完了とコメントの配信遅延を記録します。
+        """
+        marker = f"{COMMENT_MARKER}:{self.run_id}:"
+        async for raw_message in comment_ws:
+            received_at = time.time()
+            message = json.loads(raw_message)
+            if "ping" in message:
+                if message["ping"].get("content") == "rf:0" and not self.ready_event.is_set():
+                    self.stats.ready_ms.record((time.perf_counter() - started_at) * 1000)
+                    self.stats.ready_clients += 1
+                    self.ready_event.set()
+                continue
+            chat = message.get("chat")
+            if chat is None or not self.ready_event.is_set():
+                continue
+            content = chat.get("content", "")
+            if not content.startswith(marker):
+                continue
+            # 本文は "{COMMENT_MARKER}:{run_id}:{client}:{seq}:{sent_at}" の形式です。
+            try:
+                sent_at = float(content.rsplit(":", 1)[1])
+            except (IndexError, ValueError):
+                continue
+            self.stats.delivery_ms.record((received_at - sent_at) * 1000)
+            self.stats.delivered_comments += 1
+
+    async def receive_watch_messages(self, watch_ws: Any) -> None:
+        """
+        視聴セッションからのメッセージを受信し、ping への応答と postCommentResult の応答時間の記録を行います。
+        """
+        async for raw_message in watch_ws:
+            message = json.loads(raw_message)
+            message_type = message.get("type")
+            if message_type == "ping":
+                await watch_ws.send(json.dumps({"type": "pong"}))
+            elif message_type == "seat":
+                self.keep_interval = float(message["data"].get("keepIntervalSec", 30))
+            elif message_type == "postCommentResult":
+                # 応答には投稿時刻が含まれないため、最も古い未応答の投稿に対する応答とみなします。
+                if self.post_sent_at:
+                    seq = min(self.post_sent_at)
+                    self.stats.post_ack_ms.record((time.perf_counter() - self.post_sent_at.pop(seq)) * 1000)
+            elif message_type == "error":
+                self.stats.add_error(f"watch_error:{message.get('data', {}).get('message')}")
+                if self.post_sent_at:
+                    self.post_sent_at.pop(min(self.post_sent_at))
+                    self.stats.post_errors += 1
+            elif message_type == "disconnect":
+                raise ConnectionError(f"disconnected by server: {message.get('data')}")
+
+    async def keep_seat(self, watch_ws: Any) -> None:
+        """
+        seat メッセージで指定された間隔で keepSeat を送信します。
+        """
+        while True:
+            await asyncio.sleep(self.keep_interval)
+            await watch_ws.send(json.dumps({"type": "keepSeat"}))
+
+    async def post_comments(self, watch_ws: Any, room: dict[str, Any], post_start_event: asyncio.Event) -> None:
+        """
+        全クライアントの接続完了後、一定間隔でコメントを投稿します。
+        """
+        await post_start_event.wait()
+        vpos_base_time = datetime.fromisoformat(room["vposBaseTime"]).timestamp()
+        # 投稿者ごとに開始時刻をずらし、同じ瞬間に投稿が集中しないようにします。
+        await asyncio.sleep(random.uniform(0, self.args.post_interval))
+        seq = 0
+        while True:
+            sent_at = time.time()
+            self.post_sent_at[seq] = time.perf_counter()
+            await watch_ws.send(json.dumps({
+                "type": "postComment",
+                "data": {
+                    "text": f"{COMMENT_MARKER}:{self.run_id}:{self.index}:{seq}:{sent_at:.6f}",
+                    "vpos": int((sent_at - vpos_base_time) * 100),
+                    "isAnonymous": True,
+                },
+            }))
+            self.stats.posted_comments += 1
+            # 投稿時点で接続完了している全クライアントにコメントが届くはずです。
+            self.stats.expected_deliveries += self.stats.ready_clients
+            seq += 1
+            await asyncio.sleep(self.args.post_interval)
+
+
+async def run_load_test(args: argparse.Namespace) -> dict[str, Any]:
+    """
+    負荷試験を実行し、結果を辞書として返します。
+    """
+    run_id = uuid.uuid4().hex[:8]
+    stats = Stats()
+    stop_event = asyncio.Event()
+    post_start_event = asyncio.Event()
+    clients = [SimulatedClient(index, args, run_id, stats, stop_event) for index in range(args.clients)]
+
+    # 立ち上がり: 目標の接続レートに合わせて順にクライアントを起動します。
+    print(f"Ramping up {args.clients} clients at {args.ramp_rate}/s (run id: {run_id})...", file=sys.stderr)
+    stats.ramp_started_at = time.perf_counter()
+    tasks: list[asyncio.Task[None]] = []
+    for index, client in enumerate(clients):
+        target_at = stats.ramp_started_at + index / args.ramp_rate
+        delay = target_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(client.run(post_start_event)))
+    await asyncio.gather(*(client.ready_event.wait() for client in clients))
+    stats.ramp_finished_at = time.perf_counter()
+    ramp_seconds = stats.ramp_finished_at - stats.ramp_started_at
+    print(f"Ramp-up finished in {ramp_seconds:.2f}s: {stats.ready_clients} ready, {stats.failed_clients} failed.", file=sys.stderr)
+
+    # 定常状態: 全クライアントを接続したまま、投稿者がコメントを投稿します。
+    sockets_at_start = stats.open_sockets
+    cpu_started_at = time.perf_counter()
+    server_cpu_start = read_process_cpu_seconds(args.server_pid)
+    client_cpu_start = time.process_time()
+    post_start_event.set()
+    await asyncio.sleep(args.duration)
+    steady_seconds = time.perf_counter() - cpu_started_at
+    server_cpu_end = read_process_cpu_seconds(args.server_pid)
+    client_cpu_end = time.process_time()
+    sockets_at_end = stats.open_sockets
+
+    # 投稿したコメントが配信されきるまで少し待ってから切断します。
+    await asyncio.sleep(min(args.post_interval, 2.0))
+    stop_event.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    # CPU 使用率は、定常状態の間に接続していた WebSocket の数の平均で 1000 本あたりに換算します。
+    average_sockets = (sockets_at_start + sockets_at_end) / 2
+    server_cores: float | None = None
+    if server_cpu_start is not None and server_cpu_end is not None:
+        server_cores = (server_cpu_end - server_cpu_start) / steady_seconds
+    client_cores = (client_cpu_end - client_cpu_start) / steady_seconds
+
+    def per_1k_sockets(cores: float | None) -> float | None:
+        if cores is None or average_sockets <= 0:
+            return None
+        return round(cores / (average_sockets / 1000), 5)
+
+    return {
+        "format_version": RESULT_FORMAT_VERSION,
+        "run_id": run_id,
+        "started_at": datetime.now(tz=UTC).isoformat(),
+        "git_commit": get_git_commit(),
+        "params": {
+            "base_url": args.base_url,
+            "channels": args.channel,
+            "clients": args.clients,
+            "ramp_rate": args.ramp_rate,
+            "duration": args.duration,
+            "posters": args.posters,
+            "post_interval": args.post_interval,
+            "res_from": args.res_from,
+        },
+        "ramp": {
+            "seconds": round(ramp_seconds, 3),
+            "ready_clients": stats.ready_ms.count,
+            "failed_clients": stats.failed_clients,
+            "achieved_rate_per_second": round((args.clients - stats.failed_clients) / ramp_seconds, 3) if ramp_seconds > 0 else None,
+            "ready_ms": stats.ready_ms.summary(),
+        },
+        "delivery": {
+            "posted_comments": stats.posted_comments,
+            "delivered_comments": stats.delivered_comments,
+            "expected_deliveries": stats.expected_deliveries,
+            "delivery_ratio": round(stats.delivered_comments / stats.expected_deliveries, 5) if stats.expected_deliveries > 0 else None,
+            "latency_ms": stats.delivery_ms.summary(),
+        },
+        "post_ack": {
+            "errors": stats.post_errors,
+            "latency_ms": stats.post_ack_ms.summary(),
+        },
+        "cpu": {
+            "steady_seconds": round(steady_seconds, 3),
+            "average_sockets": average_sockets,
+            "server_pids": args.server_pid,
+            "server_cores": round(server_cores, 5) if server_cores is not None else None,
+            "server_cores_per_1k_sockets": per_1k_sockets(server_cores),
+            "loadtest_cores": round(client_cores, 5),
+            "loadtest_cores_per_1k_sockets": per_1k_sockets(client_cores),
+        },
+        "disconnected_clients": stats.disconnected_clients,
+        "errors": stats.errors,
+    }
+
+
+def get_metric(result: dict[str, Any], path: str) -> float | None:
+    """
+    結果の辞書から、"ramp.ready_ms.p50" のようなパスで指標の値を取得します。
+    """
+    value: Any = result
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value if isinstance(value, int | float) else None
+
+
+def print_comparison(baseline: dict[str, Any], result: dict[str, Any]) -> None:
+    """
+    以前の結果と今回の結果の主要な指標を比較して出力します。
+    """
+    print("", file=sys.stderr)
+    print(f"Comparison with {baseline.get('git_commit') or baseline.get('run_id')} -> {result.get('git_commit') or result.get('run_id')}:", file=sys.stderr)
+    for path, lower_is_better in COMPARE_METRICS:
+        before = get_metric(baseline, path)
+        after = get_metric(result, path)
+        if before is None or after is None:
+            print(f"  {path:40s} {before!s:>12} -> {after!s:>12}", file=sys.stderr)
+            continue
+        change = (after - before) / before * 100 if before != 0 else 0.0
+        is_better = (change < 0) if lower_is_better else (change > 0)
+        verdict = "better" if is_better and abs(change) >= 1 else ("worse" if abs(change) >= 1 else "same")
+        print(f"  {path:40s} {before:12.3f} -> {after:12.3f} ({change:+.1f}%, {verdict})", file=sys.stderr)
+
+
+def main() -> int:
+    """
+    メイン処理を実行します。
+    """
+    args = parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    # 1 クライアントあたり 2 本の WebSocket と、多少の余裕分のファイルディスクリプタを確保します。
+    raise_open_file_limit(args.clients * 2 + 256)
+
+    result = asyncio.run(run_load_test(args))
+
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output is not None:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+        print(f"Result written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+    if args.compare is not None:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        print_comparison(baseline, result)
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())